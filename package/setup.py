@@ -16,10 +16,9 @@ setup(
         'Development Status :: 4 - Beta',
         'License :: OSI Approved :: Apache Software License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
     ],
+    python_requires='>=3.7',
     install_requires=['streamsx>=1.14.6', 'streamsx.toolkits>=1.2.0'],
 
     test_suite='nose.collector',
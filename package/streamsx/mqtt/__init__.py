@@ -43,6 +43,19 @@ A simple example of a Streams application uses the :py:class:`~MQTTSink` and :py
 
 __version__='1.0.3'
 
-__all__ = ['MQTTSink', 'MQTTSource']
-from streamsx.mqtt._mqtt import MQTTSink, MQTTSource
+__all__ = ['BuildProfiler', 'MQTTConnection', 'MQTTSink', 'MQTTSource', 'OperatorMetrics', 'PrometheusExporter', 'coalesce_subscriptions']
+from streamsx.mqtt._mqtt import MQTTConnection, MQTTSink, MQTTSource
+from streamsx.mqtt._build import BuildProfiler
+
+# modules of features that are not used by every application are loaded on first access
+_LAZY_EXPORTS = {'OperatorMetrics': 'streamsx.mqtt._metrics',
+                 'PrometheusExporter': 'streamsx.mqtt._metrics',
+                 'coalesce_subscriptions': 'streamsx.mqtt._subscriptions'}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        import importlib
+        return getattr(importlib.import_module(_LAZY_EXPORTS[name]), name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
 
@@ -0,0 +1,163 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Support for building topologies with many MQTT operators: unique operator names in constant time,
+SPL string literals, operator parameters resolved at SPL generation, and the profiling of the build phases
+of the MQTT composites.
+"""
+
+import collections
+import time
+import weakref
+
+class _UsedNames(object):
+    """
+    The operator and stream names of a graph, updated with the operators added since the last update
+    """
+    def __init__(self):
+        self.names = set()
+        self.counters = dict()
+        self._updated = 0
+
+    def update(self, graph):
+        operators = graph.operators
+        for op in operators[self._updated:]:
+            self.names.add(op.name)
+            self.names.update(port.name for port in op.outputPorts)
+        self._updated = len(operators)
+
+
+_used_names = weakref.WeakKeyDictionary()
+
+
+def unique_name(topology, name):
+    """
+    Returns the name for a new operator of `topology`, which is `name` when it is not used yet,
+    otherwise `name` with the suffix ``_2``, ``_3``, and so on, like ``Topology`` names operators.
+    The used names are collected from the operators added since the previous call, and the next
+    suffix is remembered per name, so that adding n operators with the same name does not probe
+    all previous suffixes for each operator.
+    """
+    graph = topology.graph
+    used = _used_names.get(graph)
+    if used is None:
+        used = _UsedNames()
+        _used_names[graph] = used
+    used.update(graph)
+    if name not in used.names:
+        return name
+    n = used.counters.get(name, 2)
+    while name + '_' + str(n) in used.names:
+        n += 1
+    used.counters[name] = n + 1
+    return name + '_' + str(n)
+
+
+_SPL_STRING_ESCAPES = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+
+def spl_string(value):
+    """
+    Returns `value` as SPL string literal
+    """
+    return '"' + ''.join(_SPL_STRING_ESCAPES.get(c, c) for c in value) + '"'
+
+
+class ResolvedParam(object):
+    """
+    Operator parameter that is resolved when the SPL graph is generated, after all composites were added
+    """
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def spl_json(self):
+        return {'value': self._resolve()}
+
+
+_profilers = []
+
+
+class _Phase(object):
+    def __init__(self, name):
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self._start
+        for profiler in _profilers:
+            profiler._add(self._name, elapsed)
+
+
+class _NoPhase(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def build_phase(name):
+    """
+    Returns the context manager that measures a build phase when a :py:class:`BuildProfiler` is active
+    """
+    return _Phase(name) if _profilers else _NO_PHASE
+
+
+class BuildProfiler(object):
+    """
+    Measures the time spent in the phases of adding MQTT composites to topologies, while the profiler
+    is active as context manager. The phases are
+
+    * ``populate`` - the complete ``populate`` of a composite
+    * ``validate`` - the checks of the composite properties
+    * ``transform`` - the stream transformations in front of a sink or behind a source
+    * ``params`` - the operator parameters, including the creation of truststores and keystores
+    * ``operator`` - the operator invocation, its name and placement
+
+    Example::
+
+        with BuildProfiler() as profiler:
+            for group in device_groups:
+                stream.for_each(template.clone(topic='devices/' + group))
+        print(profiler.report())
+    """
+    def __init__(self):
+        self._phases = collections.OrderedDict()
+
+    def __enter__(self):
+        _profilers.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _profilers.remove(self)
+
+    def _add(self, name, seconds):
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = [0, 0.0]
+            self._phases[name] = phase
+        phase[0] += 1
+        phase[1] += seconds
+
+    def stats(self):
+        """
+        Returns a dict with the measurements by phase name. Each value is a dict
+        with the number of ``calls`` and the total ``seconds``.
+        """
+        return dict((name, {'calls': calls, 'seconds': seconds}) for name, (calls, seconds) in self._phases.items())
+
+    def report(self):
+        """
+        Returns the measurements as text table, ordered by the time spent
+        """
+        lines = ['{:<12}{:>10}{:>14}{:>14}'.format('phase', 'calls', 'seconds', 'us/call')]
+        for name, (calls, seconds) in sorted(self._phases.items(), key=lambda item: -item[1][1]):
+            lines.append('{:<12}{:>10}{:>14.6f}{:>14.1f}'.format(name, calls, seconds, 1e6 * seconds / calls))
+        return '\n'.join(lines)
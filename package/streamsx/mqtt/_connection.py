@@ -0,0 +1,95 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Connection document of the MQTT operators of a topology.
+"""
+
+import hashlib
+import os
+import tempfile
+import weakref
+
+from streamsx.mqtt._build import ResolvedParam
+from streamsx.mqtt._stores import credential_registry
+
+_NAMESPACE = 'http://www.ibm.com/xmlns/prod/streams/adapters'
+
+
+def render(connections):
+    """
+    Returns the connection document for a list of tuples (name, attributes), where attributes
+    is a dict of the parameters of the ``MQTT`` element of the connection specification
+    """
+    # saxutils imports urllib.request, load it only when a connection document is used
+    from xml.sax.saxutils import quoteattr
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<st:connections xmlns:st="' + _NAMESPACE + '" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">',
+             '  <connection_specifications>']
+    for name, attributes in connections:
+        lines.append('    <connection_specification name=' + quoteattr(name) + '>')
+        lines.append('      <MQTT ' + ' '.join(k + '=' + quoteattr(str(v)) for k, v in attributes.items()) + '/>')
+        lines.append('    </connection_specification>')
+    lines.append('  </connection_specifications>')
+    lines.append('</st:connections>')
+    return '\n'.join(lines) + '\n'
+
+
+class ConnectionDocument(object):
+    """
+    Connection document of a topology. All connections of the topology are rendered into a single file named
+    ``connections-<hash>.xml``, where the hash is computed from the content, in the directory ``mqtt-connections``,
+    which is added once as file dependency. The file is replaced when a connection is added, so the operators
+    reference the document with :py:attr:`bundle_path`, which is resolved when the SPL graph is generated.
+    """
+    def __init__(self, topology):
+        self._topology = weakref.ref(topology)
+        self._connections = dict()
+        self._directory = None
+        self._bundle_directory = None
+        self._file_name = None
+        self.bundle_path = ResolvedParam(lambda: self._bundle_directory + '/' + self._file_name)
+
+    def add(self, name, attributes):
+        """
+        Adds a connection specification and returns the path of the document in the bundle
+        """
+        if name in self._connections:
+            if self._connections[name] != attributes:
+                raise ValueError("connection '{}' is defined with different settings".format(name))
+            return self.bundle_path
+        self._connections[name] = attributes
+        content = render(self._connections.items())
+        if self._directory is None:
+            self._directory = os.path.join(tempfile.mkdtemp(prefix='mqtt-'), 'mqtt-connections')
+            os.mkdir(self._directory)
+            self._bundle_directory = credential_registry(self._topology()).file_dependency(self._directory)
+        file_name = 'connections-' + hashlib.sha256(content.encode('utf-8')).hexdigest()[:16] + '.xml'
+        with open(os.path.join(self._directory, file_name), 'w') as f:
+            f.write(content)
+        if self._file_name is not None and self._file_name != file_name:
+            os.remove(os.path.join(self._directory, self._file_name))
+        self._file_name = file_name
+        return self.bundle_path
+
+    @property
+    def path(self):
+        """
+        The path of the document in the local file system
+        """
+        return os.path.join(self._directory, self._file_name)
+
+
+_documents = weakref.WeakKeyDictionary()
+
+
+def connection_document(topology):
+    """
+    Returns the connection document of a topology
+    """
+    document = _documents.get(topology)
+    if document is None:
+        document = ConnectionDocument(topology)
+        _documents[topology] = document
+    return document
@@ -0,0 +1,1032 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Pure Python MQTT 3.1.1 client engine used by the composites when ``backend='python'`` is set.
+
+The engine runs an asyncio event loop in a background thread. The callables
+:py:class:`_EngineSink` and :py:class:`_EngineSource` are used as Python
+``for_each`` and ``source`` callables of the topology.
+"""
+
+import asyncio
+import collections
+import json
+import logging
+import os
+import queue
+import random
+import ssl
+import struct
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+from streamsx.mqtt._functions import TopicFilterTrie, _attribute, _as_payload
+from streamsx.mqtt._subscriptions import minimal_cover
+
+_logger = logging.getLogger(__name__)
+
+# MQTT control packet types
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+_DEFAULT_MAX_INFLIGHT = 100
+_CONNECT_TIMEOUT_SECONDS = 30.0
+_FLUSH_TIMEOUT_SECONDS = 10.0
+
+
+def _encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length > 0:
+            byte |= 0x80
+        encoded.append(byte)
+        if length == 0:
+            return bytes(encoded)
+
+
+def _encode_str(value):
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return struct.pack('!H', len(value)) + value
+
+
+def _decode_str(buf, pos):
+    (length,) = struct.unpack_from('!H', buf, pos)
+    pos += 2
+    return bytes(buf[pos:pos + length]).decode('utf-8'), pos + length
+
+
+def _packet(packet_type, flags, body=b''):
+    return bytes([(packet_type << 4) | flags]) + _encode_length(len(body)) + body
+
+
+async def _read_packet(reader):
+    """
+    Reads a control packet and returns a tuple (packet_type, flags, body)
+    """
+    header = await reader.readexactly(1)
+    length = 0
+    multiplier = 1
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7f) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+        if multiplier > 128 ** 3:
+            raise ConnectionError('malformed remaining length')
+    body = await reader.readexactly(length) if length else b''
+    return header[0] >> 4, header[0] & 0x0f, body
+
+
+def _connect_packet(client_id, keep_alive_seconds, clean_session=True, username=None, password=None):
+    flags = 0x02 if clean_session else 0x00
+    payload = _encode_str(client_id)
+    if username is not None:
+        flags |= 0x80
+        payload += _encode_str(username)
+    if password is not None:
+        flags |= 0x40
+        payload += _encode_str(password)
+    body = _encode_str('MQTT') + bytes([4, flags]) + struct.pack('!H', keep_alive_seconds) + payload
+    return _packet(CONNECT, 0, body)
+
+
+def _publish_packet(topic, payload, qos, retain=False, packet_id=None, dup=False):
+    flags = (qos << 1) | (0x01 if retain else 0) | (0x08 if dup else 0)
+    body = _encode_str(topic)
+    if qos > 0:
+        body += struct.pack('!H', packet_id)
+    return _packet(PUBLISH, flags, body + payload)
+
+
+def _parse_publish(flags, body):
+    """
+    Returns a tuple (topic, payload, qos, packet_id, retain) of a PUBLISH packet
+    """
+    qos = (flags >> 1) & 0x03
+    topic, pos = _decode_str(body, 0)
+    packet_id = None
+    if qos:
+        (packet_id,) = struct.unpack_from('!H', body, pos)
+        pos += 2
+    return topic, bytes(body[pos:]), qos, packet_id, bool(flags & 0x01)
+
+
+def _ack_packet(packet_type, packet_id):
+    flags = 0x02 if packet_type == PUBREL else 0x00
+    return _packet(packet_type, flags, struct.pack('!H', packet_id))
+
+
+def _parse_server_uri(server_uri):
+    """
+    Returns a tuple (host, port, use_ssl) for a ``tcp://`` or ``ssl://`` URI
+    """
+    uri = urlparse(server_uri)
+    if uri.scheme == 'tcp':
+        return uri.hostname, uri.port if uri.port else 1883, False
+    if uri.scheme == 'ssl':
+        return uri.hostname, uri.port if uri.port else 8883, True
+    raise ValueError('server_uri must start with tcp:// or ssl://: ' + str(server_uri))
+
+
+def _pem_file(pem, tmp_files):
+    """
+    Returns a filename for a PEM string or filename. Literal PEM strings are written to a temporary file.
+    """
+    if '-----BEGIN' not in pem:
+        return pem
+    fd, path = tempfile.mkstemp(suffix='.pem')
+    with os.fdopen(fd, 'w') as f:
+        f.write(pem)
+    tmp_files.append(path)
+    return path
+
+
+_SSL_PROTOCOLS = {
+    'TLSv1': ssl.TLSVersion.TLSv1,
+    'TLSv1.1': ssl.TLSVersion.TLSv1_1,
+    'TLSv1.2': ssl.TLSVersion.TLSv1_2,
+    'TLSv1.3': ssl.TLSVersion.TLSv1_3,
+}
+
+
+class _ResumingContext(ssl.SSLContext):
+    """
+    Client SSL context that resumes the TLS session of the last connection, so that a reconnect
+    to the same server saves the full handshake. The server falls back to a full handshake
+    when it does not know the session anymore.
+    """
+    session = None
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self.session
+        return super(_ResumingContext, self).wrap_bio(incoming, outgoing, server_side=server_side,
+                                                      server_hostname=server_hostname, session=session)
+
+
+def _create_ssl_context(params):
+    """
+    Creates the SSL context from the trusted certificates and the client certificate of the engine parameters
+    """
+    # the settings of ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    ctx = _ResumingContext(ssl.PROTOCOL_TLS_CLIENT) if params.get('ssl_session_reuse', True) else ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.load_default_certs(ssl.Purpose.SERVER_AUTH)
+    ssl_protocol = params.get('ssl_protocol')
+    protocols = [ssl_protocol] if ssl_protocol else params.get('ssl_protocols')
+    if protocols:
+        for protocol in protocols:
+            if protocol not in _SSL_PROTOCOLS:
+                raise ValueError('unsupported ssl_protocol: ' + protocol)
+        ctx.minimum_version = min(_SSL_PROTOCOLS[p] for p in protocols)
+        ctx.maximum_version = max(_SSL_PROTOCOLS[p] for p in protocols)
+    ciphers = params.get('ssl_ciphers')
+    if ciphers:
+        try:
+            ctx.set_ciphers(':'.join(ciphers))
+        except ssl.SSLError:
+            raise ValueError('unsupported ssl_ciphers: ' + ':'.join(ciphers))
+    tmp_files = []
+    try:
+        trusted_certs = params.get('trusted_certs')
+        if trusted_certs:
+            for cert in trusted_certs:
+                ctx.load_verify_locations(cafile=_pem_file(cert, tmp_files))
+        if params.get('client_cert'):
+            ctx.load_cert_chain(_pem_file(params['client_cert'], tmp_files),
+                                _pem_file(params['client_private_key'], tmp_files),
+                                password=params.get('key_password'))
+    finally:
+        for path in tmp_files:
+            os.remove(path)
+    return ctx
+
+
+class _MqttClient(object):
+    """
+    Asyncio MQTT 3.1.1 client for a single network connection.
+
+    Outgoing QoS 1 and 2 messages are pipelined: :py:meth:`publish` returns as soon as
+    the message is written, and at most `max_inflight` messages wait for their acknowledgement.
+    With `ssl_debug`, the TLS version, cipher, session resumption, and connect time are logged for each connect.
+    """
+    def __init__(self, host, port, client_id, keep_alive_seconds=60, username=None, password=None,
+                 ssl_context=None, clean_session=True, max_inflight=_DEFAULT_MAX_INFLIGHT, on_message=None, ssl_debug=False):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.keep_alive_seconds = keep_alive_seconds
+        self.username = username
+        self.password = password
+        self.ssl_context = ssl_context
+        self.clean_session = clean_session
+        self.max_inflight = max_inflight
+        self.on_message = on_message
+        self.ssl_debug = ssl_debug
+        self.session_present = False
+        self.session_reused = False
+        self.connect_seconds = None
+        self._reader = None
+        self._writer = None
+        self._tasks = []
+        self._inflight = dict()
+        self._pending = dict()
+        self._awaiting_rel = set()
+        self._next_id = 0
+        self._closed = None
+        self._inflight_slots = None
+
+    async def connect(self, timeout=_CONNECT_TIMEOUT_SECONDS):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl_context), timeout)
+        self.connect_seconds = loop.time() - start
+        self._writer.write(_connect_packet(self.client_id, self.keep_alive_seconds, self.clean_session, self.username, self.password))
+        packet_type, _, body = await asyncio.wait_for(_read_packet(self._reader), timeout)
+        if packet_type != CONNACK or len(body) != 2:
+            self._writer.close()
+            raise ConnectionError('expected CONNACK from the MQTT server')
+        if body[1] != 0:
+            self._writer.close()
+            raise ConnectionRefusedError('MQTT server refused the connection with return code {}'.format(body[1]))
+        self.session_present = bool(body[0] & 0x01)
+        ssl_object = self._writer.get_extra_info('ssl_object')
+        if ssl_object is not None:
+            self._on_handshake(ssl_object)
+        self._last_send = loop.time()
+        self._last_receive = self._last_send
+        self._closed = loop.create_future()
+        self._inflight_slots = asyncio.Semaphore(self.max_inflight)
+        self._tasks.append(loop.create_task(self._read_loop()))
+        if self.keep_alive_seconds > 0:
+            self._tasks.append(loop.create_task(self._keep_alive_loop()))
+
+    def _on_handshake(self, ssl_object):
+        self.session_reused = ssl_object.session_reused
+        if isinstance(self.ssl_context, _ResumingContext):
+            # with TLS 1.3 the session ticket is available after the first read, which is the CONNACK
+            self.ssl_context.session = ssl_object.session
+        if self.ssl_debug:
+            _logger.info('TLS handshake with %s:%d: %s %s, session reused: %s, connect time: %.1f ms',
+                         self.host, self.port, ssl_object.version(), ssl_object.cipher()[0],
+                         self.session_reused, 1000.0 * self.connect_seconds)
+
+    @property
+    def connected(self):
+        return self._closed is not None and not self._closed.done()
+
+    async def wait_closed(self):
+        await asyncio.shield(self._closed)
+
+    def _send(self, data):
+        if not self.connected:
+            raise ConnectionError('not connected to the MQTT server')
+        self._writer.write(data)
+        self._last_send = asyncio.get_running_loop().time()
+
+    def _next_packet_id(self):
+        while True:
+            self._next_id = self._next_id % 65535 + 1
+            if self._next_id not in self._inflight and self._next_id not in self._pending:
+                return self._next_id
+
+    async def publish(self, topic, payload, qos=0, retain=False):
+        """
+        Publishes a message and returns a future that is done when the delivery is acknowledged.
+        Waits only when `max_inflight` messages are not yet acknowledged.
+        """
+        loop = asyncio.get_running_loop()
+        ack = loop.create_future()
+        if qos == 0:
+            self._send(_publish_packet(topic, payload, 0, retain))
+            ack.set_result(None)
+        else:
+            await self._inflight_slots.acquire()
+            if not self.connected:
+                self._inflight_slots.release()
+                raise ConnectionError('not connected to the MQTT server')
+            packet_id = self._next_packet_id()
+            self._inflight[packet_id] = ack
+            ack.add_done_callback(lambda _: self._inflight_slots.release())
+            self._send(_publish_packet(topic, payload, qos, retain, packet_id))
+        await self._writer.drain()
+        return ack
+
+    async def subscribe(self, topics, qos):
+        """
+        Subscribes for a list of topic filters with a list of qos values and returns the granted qos values.
+        """
+        packet_id = self._next_packet_id()
+        granted = asyncio.get_running_loop().create_future()
+        self._pending[packet_id] = granted
+        body = struct.pack('!H', packet_id) + b''.join(_encode_str(t) + bytes([q]) for t, q in zip(topics, qos))
+        self._send(_packet(SUBSCRIBE, 0x02, body))
+        result = await granted
+        if 0x80 in result:
+            raise ConnectionError('MQTT server refused the subscription for {}'.format(topics))
+        return result
+
+    async def unsubscribe(self, topics):
+        """
+        Unsubscribes from a list of topic filters.
+        """
+        packet_id = self._next_packet_id()
+        unsubscribed = asyncio.get_running_loop().create_future()
+        self._pending[packet_id] = unsubscribed
+        body = struct.pack('!H', packet_id) + b''.join(_encode_str(t) for t in topics)
+        self._send(_packet(UNSUBSCRIBE, 0x02, body))
+        await unsubscribed
+
+    async def flush(self, timeout=_FLUSH_TIMEOUT_SECONDS):
+        """
+        Waits until all published messages are acknowledged.
+        """
+        if self._inflight:
+            await asyncio.wait(list(self._inflight.values()), timeout=timeout)
+
+    async def disconnect(self):
+        if self.connected:
+            self._send(_packet(DISCONNECT, 0))
+            await self._writer.drain()
+        self._connection_lost(None)
+
+    def _connection_lost(self, exc):
+        for task in self._tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+        self._tasks = []
+        if self._writer is not None:
+            self._writer.close()
+        error = ConnectionError('connection to the MQTT server lost')
+        for fut in list(self._inflight.values()) + list(self._pending.values()):
+            if not fut.done():
+                fut.set_exception(error)
+        self._inflight.clear()
+        self._pending.clear()
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(exc)
+
+    async def _keep_alive_loop(self):
+        """
+        Sends a PINGREQ when nothing was sent or received for `keep_alive_seconds`, and closes the connection
+        when no packet is received within 1.5 times `keep_alive_seconds` after the PINGREQ, so that a dead
+        or half-open connection is detected and reconnected
+        """
+        loop = asyncio.get_running_loop()
+        keep_alive = self.keep_alive_seconds
+        timeout = 1.5 * keep_alive
+        ping_time = None
+        while True:
+            now = loop.time()
+            if ping_time is not None:
+                if self._last_receive >= ping_time:
+                    ping_time = None
+                elif now - ping_time >= timeout:
+                    self._connection_lost(TimeoutError('no packet from the MQTT server within {} seconds'.format(timeout)))
+                    return
+            if ping_time is None:
+                if now - min(self._last_send, self._last_receive) >= keep_alive:
+                    self._send(_packet(PINGREQ, 0))
+                    ping_time = now
+                else:
+                    await asyncio.sleep(min(self._last_send, self._last_receive) + keep_alive - now)
+                    continue
+            # the response is checked when the next PINGREQ is due, and the connection closed at the timeout
+            wake = ping_time + keep_alive if now < ping_time + keep_alive else ping_time + timeout
+            await asyncio.sleep(wake - now)
+
+    def _complete(self, packet_id, result=None):
+        fut = self._inflight.pop(packet_id, None)
+        if fut is not None and not fut.done():
+            fut.set_result(result)
+
+    async def _read_loop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                packet_type, flags, body = await _read_packet(self._reader)
+                self._last_receive = loop.time()
+                if packet_type == PUBLISH:
+                    await self._on_publish(flags, body)
+                elif packet_type == PUBACK or packet_type == PUBCOMP:
+                    self._complete(struct.unpack('!H', body)[0])
+                elif packet_type == PUBREC:
+                    self._send(_ack_packet(PUBREL, struct.unpack('!H', body)[0]))
+                elif packet_type == PUBREL:
+                    packet_id = struct.unpack('!H', body)[0]
+                    self._awaiting_rel.discard(packet_id)
+                    self._send(_ack_packet(PUBCOMP, packet_id))
+                elif packet_type == SUBACK or packet_type == UNSUBACK:
+                    fut = self._pending.pop(struct.unpack_from('!H', body)[0], None)
+                    if fut is not None and not fut.done():
+                        fut.set_result(list(body[2:]))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            self._connection_lost(e)
+        except (struct.error, ValueError) as e:
+            # a malformed packet leaves the stream at an unknown position
+            self._connection_lost(ConnectionError('malformed packet from the MQTT server: {}'.format(e)))
+
+    async def _on_publish(self, flags, body):
+        topic, payload, qos, packet_id, retain = _parse_publish(flags, body)
+        if qos == 2:
+            if packet_id not in self._awaiting_rel:
+                self._awaiting_rel.add(packet_id)
+                await self._deliver(topic, payload)
+            self._send(_ack_packet(PUBREC, packet_id))
+        else:
+            await self._deliver(topic, payload)
+            if qos == 1:
+                self._send(_ack_packet(PUBACK, packet_id))
+
+    async def _deliver(self, topic, payload):
+        if self.on_message is not None:
+            await self.on_message(topic, payload)
+
+
+class _BackgroundLoop(object):
+    """
+    An asyncio event loop running in a daemon thread
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='mqtt-engine', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class _EngineCallable(object):
+    """
+    Base class of the engine callables. Connects to the MQTT server when the callable is entered
+    and reconnects when the connection is lost, up to `reconnection_bound` times.
+    When the reconnects are exhausted, :py:attr:`failure` is the last connect error.
+    With `reconnect_max_delay_millis` the delay before each reconnect grows exponentially from
+    `reconnect_delay_millis` up to the maximum, and is shortened by a random fraction of up to `reconnect_jitter`,
+    so that the clients of a restarted server do not reconnect at the same time.
+    Without the maximum, the reconnects are `reconnect_delay_millis` apart.
+    """
+    def __init__(self, params):
+        self._params = params
+
+    def _client_params(self):
+        params = self._params
+        host, port, use_ssl = _parse_server_uri(params['server_uri'])
+        username = params.get('username')
+        password = params.get('password')
+        if params.get('app_config_name'):
+            import streamsx.ec
+            app_config = streamsx.ec.get_application_configuration(params['app_config_name'])
+            username = app_config.get('username', username)
+            password = app_config.get('password', password)
+        client_id = params.get('client_id')
+        if not client_id:
+            client_id = 'streamsx-' + os.urandom(8).hex()
+        return {'host': host, 'port': port, 'client_id': client_id,
+                'keep_alive_seconds': params.get('keep_alive_seconds', 60),
+                'username': username, 'password': password,
+                'ssl_context': _create_ssl_context(params) if use_ssl else None,
+                'clean_session': params.get('clean_session', True),
+                'ssl_debug': bool(params.get('ssl_debug')),
+                'max_inflight': params.get('max_inflight', _DEFAULT_MAX_INFLIGHT)}
+
+    def __enter__(self):
+        self._client = None
+        self._stopping = False
+        self.failure = None
+        self._client_kwargs = self._client_params()
+        self._loop = _BackgroundLoop()
+        self._loop.start()
+        try:
+            self._loop.run(self._start())
+        except BaseException:
+            self._loop.stop()
+            raise
+
+    async def _start(self):
+        self._connected = asyncio.Event()
+        connected = asyncio.get_running_loop().create_future()
+        self._supervisor = asyncio.get_running_loop().create_task(self._supervise(connected))
+        await connected
+
+    def _reconnect_delay(self, attempts):
+        """
+        Returns the seconds to wait before the next connect after `attempts` failed connects
+        """
+        params = self._params
+        max_delay = params.get('reconnect_max_delay_millis')
+        if max_delay is None:
+            return params.get('reconnect_delay_millis', 1000) / 1000.0
+        delay = min(max_delay, params.get('reconnect_delay_millis', 1000) * 2 ** min(attempts, 32))
+        return delay * (1.0 - params.get('reconnect_jitter', 0.5) * random.random()) / 1000.0
+
+    async def _supervise(self, connected):
+        params = self._params
+        reconnection_bound = params.get('reconnection_bound', -1)
+        timeout = params.get('command_timeout_millis')
+        timeout = timeout / 1000.0 if timeout else _CONNECT_TIMEOUT_SECONDS
+        attempts = 0
+        lost = False
+        while not self._stopping:
+            if lost and params.get('reconnect_max_delay_millis') is not None:
+                # the clients of a restarted server do not reconnect at once
+                await asyncio.sleep(self._reconnect_delay(0))
+            client = _MqttClient(on_message=self._on_message, **self._client_kwargs)
+            try:
+                await client.connect(timeout)
+                await self._on_connected(client)
+            except (OSError, asyncio.TimeoutError) as e:
+                client._connection_lost(e)
+                attempts += 1
+                if reconnection_bound >= 0 and attempts > reconnection_bound:
+                    self.failure = e
+                    if not connected.done():
+                        connected.set_exception(e)
+                    # wakes up the tasks waiting for the connection, which check the failure
+                    self._connected.set()
+                    return
+                await asyncio.sleep(self._reconnect_delay(attempts))
+                continue
+            attempts = 0
+            self._client = client
+            self._connected.set()
+            if not connected.done():
+                connected.set_result(None)
+            await client.wait_closed()
+            self._connected.clear()
+            lost = True
+
+    def _check_failure(self):
+        if self.failure is not None:
+            raise ConnectionError('connection to the MQTT server lost, reconnection_bound exhausted') from self.failure
+
+    async def _on_connected(self, client):
+        pass
+
+    async def _on_message(self, topic, payload):
+        pass
+
+    async def _stop(self):
+        self._stopping = True
+        if self._client is not None:
+            await self._client.disconnect()
+        self._supervisor.cancel()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._loop.run(self._stop())
+        self._loop.stop()
+
+
+class _CongestionQueue(object):
+    """
+    Bounded queue between the thread that submits the tuples and the event loop that publishes them.
+    When the queue is full, ``'wait'`` blocks the submitting thread, ``'drop_first'`` drops the oldest
+    queued item, and ``'drop_last'`` drops the new item. After :py:meth:`close`, new items are discarded.
+    """
+    def __init__(self, size, policy):
+        self._size = size
+        self._policy = policy
+        self._items = collections.deque()
+        self._not_full = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        """
+        Adds an item and returns ``True`` when an item was dropped
+        """
+        with self._not_full:
+            if len(self._items) >= self._size:
+                if self._policy == 'drop_last':
+                    self.dropped += 1
+                    return True
+                if self._policy == 'drop_first':
+                    self._items.popleft()
+                    self._items.append(item)
+                    self.dropped += 1
+                    return True
+                while len(self._items) >= self._size and not self._closed:
+                    self._not_full.wait()
+            if not self._closed:
+                self._items.append(item)
+            return False
+
+    def close(self):
+        """
+        Wakes up the waiting threads and discards the items added afterwards
+        """
+        with self._not_full:
+            self._closed = True
+            self._not_full.notify_all()
+
+    def get_nowait(self):
+        """
+        Removes and returns the oldest item, or ``None`` when the queue is empty
+        """
+        with self._not_full:
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._not_full.notify()
+            return item
+
+
+class _EngineSink(_EngineCallable):
+    """
+    ``for_each`` callable that publishes the tuples. `style` denotes how the
+    payload is taken from a tuple: ``'string'``, ``'binary'``, ``'json'``, ``'python'``, or ``'struct'``.
+    When `encoder` is set, the payload is ``encoder(tuple)``.
+    When `qos_attribute_name` is set, the qos of each message is taken from this tuple attribute.
+    When `queue_size` is set, the messages are published from a queue with the `congestion_policy`
+    ``'wait'``, ``'drop_first'``, or ``'drop_last'``, and the dropped messages are counted
+    by the custom metric ``nDroppedTuples``.
+    When the reconnects of `reconnection_bound` are exhausted, the sink raises ``ConnectionError`` instead of waiting for the connection.
+    """
+    def __init__(self, params, style, topic=None, topic_attribute_name=None, data_attribute_name=None, qos=None, retain=False, encoder=None,
+                 queue_size=None, congestion_policy='wait', qos_attribute_name=None):
+        super(_EngineSink, self).__init__(params)
+        self._style = style
+        self._encoder = encoder
+        self._topic = topic
+        self._topic_attribute_name = topic_attribute_name
+        self._data_attribute_name = data_attribute_name if data_attribute_name else 'data'
+        self._qos = qos if qos is not None else 0
+        self._retain = retain
+        self._qos_attribute_name = qos_attribute_name
+        self._queue_size = queue_size
+        self._congestion_policy = congestion_policy
+
+    def __enter__(self):
+        self._queue = None
+        self._dropped_metric = None
+        self._queued_metric = None
+        if self._queue_size:
+            self._queue = _CongestionQueue(self._queue_size, self._congestion_policy)
+            import streamsx.ec
+            if streamsx.ec.is_active():
+                self._dropped_metric = streamsx.ec.CustomMetric(self, name='nDroppedTuples', kind='Counter',
+                    description='Number of tuples dropped by the congestion policy ' + self._congestion_policy)
+                self._queued_metric = streamsx.ec.CustomMetric(self, name='nQueuedTuples', kind='Gauge',
+                    description='Number of tuples in the queue')
+        super(_EngineSink, self).__enter__()
+
+    async def _start(self):
+        await super(_EngineSink, self)._start()
+        if self._queue is not None:
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._drain_task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        while True:
+            item = self._queue.get_nowait()
+            if item is None:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                # an item put before the clear would not wake up the task
+                if len(self._queue) == 0:
+                    await self._wakeup.wait()
+                continue
+            try:
+                await self._publish(*item)
+            except ConnectionError:
+                # the next call of the sink raises the failure
+                self._queue.close()
+                return
+
+    def _message(self, tuple_):
+        """
+        Returns a tuple (topic, payload, qos) for a tuple
+        """
+        topic = _attribute(tuple_, self._topic_attribute_name) if self._topic_attribute_name else self._topic
+        qos = _attribute(tuple_, self._qos_attribute_name) if self._qos_attribute_name else self._qos
+        if self._encoder is not None:
+            return topic, self._encoder(tuple_), qos
+        if self._style == 'struct':
+            return topic, _as_payload(_attribute(tuple_, self._data_attribute_name)), qos
+        return topic, _as_payload(tuple_), qos
+
+    async def _publish(self, topic, payload, qos):
+        while True:
+            await self._connected.wait()
+            self._check_failure()
+            try:
+                ack = await self._client.publish(topic, payload, qos, self._retain)
+            except ConnectionError:
+                # wait for the reconnect
+                continue
+            ack.add_done_callback(lambda f: self._on_ack(f, topic, payload, qos))
+            return
+
+    def _on_ack(self, ack, topic, payload, qos):
+        if not ack.cancelled() and ack.exception() is not None and not self._stopping and self.failure is None:
+            # connection lost before the message was acknowledged; publish again after the reconnect
+            asyncio.get_running_loop().create_task(self._publish(topic, payload, qos))
+
+    async def _stop(self):
+        if self._queue is not None:
+            self._closing = True
+            self._wakeup.set()
+            if self._client is not None and self._client.connected:
+                await self._drain_task
+            else:
+                self._drain_task.cancel()
+        if self._client is not None and self._client.connected:
+            await self._client.flush()
+        await super(_EngineSink, self)._stop()
+
+    @property
+    def dropped(self):
+        """
+        int: The number of messages dropped by the congestion policy
+        """
+        return self._queue.dropped if self._queue is not None else 0
+
+    def __call__(self, tuple_):
+        self._check_failure()
+        message = self._message(tuple_)
+        if self._queue is None:
+            self._loop.run(self._publish(*message))
+            return
+        if self._queue.put(message) and self._dropped_metric is not None:
+            self._dropped_metric.value = self._queue.dropped
+        self._check_failure()
+        if self._queued_metric is not None:
+            self._queued_metric.value = len(self._queue)
+        self._loop.loop.call_soon_threadsafe(self._wakeup.set)
+
+
+class _EngineSource(_EngineCallable):
+    """
+    ``source`` callable that subscribes for topics and returns the received messages
+    as Python objects for the given `style`: ``'string'``, ``'binary'``, ``'json'``, or ``'struct'``.
+    When the receive buffer is full, the `overflow_policy` ``'block'`` stops fetching messages,
+    ``'drop_oldest'`` drops the oldest buffered message, and ``'drop_newest'`` drops the received message.
+    The dropped messages and the maximum number of buffered messages are counted
+    by the custom metrics ``nDroppedMessages`` and ``maxQueuedMessages``.
+    When `decoder` is set, the attributes of ``'struct'`` tuples are ``decoder(payload)``.
+    Malformed payloads, for example invalid UTF-8 or JSON, are dropped and counted by the custom metric ``nMalformedMessages``.
+    With `coalesce`, the sources of a process with the same connection parameters and qos share one connection.
+    """
+    def __init__(self, params, style, topics, qos=None, message_queue_size=500, data_attribute_name=None, topic_attribute_name=None, data_as_blob=False,
+                 overflow_policy='block', decoder=None, coalesce=False):
+        super(_EngineSource, self).__init__(params)
+        self._coalesce = coalesce
+        self._decoder = decoder
+        self._overflow_policy = overflow_policy
+        self._style = style
+        self._topics = topics if isinstance(topics, list) else [topics]
+        if qos is None:
+            qos = 0
+        self._qos = qos if isinstance(qos, list) else [qos] * len(self._topics)
+        self._message_queue_size = message_queue_size
+        self._data_attribute_name = data_attribute_name if data_attribute_name else 'data'
+        self._topic_attribute_name = topic_attribute_name
+        self._data_as_blob = data_as_blob
+
+    def __enter__(self):
+        self._queue = queue.Queue(self._message_queue_size)
+        self.dropped = 0
+        self.max_queued = 0
+        self.malformed = 0
+        self._subscribed = False
+        self._dropped_metric = None
+        self._max_queued_metric = None
+        self._malformed_metric = None
+        import streamsx.ec
+        if streamsx.ec.is_active():
+            self._dropped_metric = streamsx.ec.CustomMetric(self, name='nDroppedMessages', kind='Counter',
+                description='Number of messages dropped by the overflow policy ' + self._overflow_policy)
+            self._max_queued_metric = streamsx.ec.CustomMetric(self, name='maxQueuedMessages', kind='Gauge',
+                description='Maximum number of messages in the receive buffer')
+            if self._style != 'binary':
+                self._malformed_metric = streamsx.ec.CustomMetric(self, name='nMalformedMessages', kind='Counter',
+                    description='Number of dropped messages with a malformed payload')
+        if self._coalesce:
+            self._stopping = False
+            self._shared = _SharedConnection.attach(self)
+        else:
+            super(_EngineSource, self).__enter__()
+
+    async def _on_connected(self, client):
+        if client.session_present and self._subscribed:
+            # the persistent session of the server kept the subscriptions and queued the messages
+            return
+        await client.subscribe(self._topics, self._qos)
+        self._subscribed = True
+
+    def _drop(self):
+        self.dropped += 1
+        if self._dropped_metric is not None:
+            self._dropped_metric.value = self.dropped
+
+    async def _on_message(self, topic, payload):
+        try:
+            self._queue.put_nowait((topic, payload))
+        except queue.Full:
+            if self._overflow_policy == 'drop_newest':
+                self._drop()
+                return
+            if self._overflow_policy == 'drop_oldest':
+                try:
+                    self._queue.get_nowait()
+                    self._drop()
+                except queue.Empty:
+                    pass
+                # the event loop is the only producer, so there is room now
+                self._queue.put_nowait((topic, payload))
+            else:
+                # the receiver stops fetching until there is room in the buffer
+                await asyncio.get_running_loop().run_in_executor(None, self._queue.put, (topic, payload))
+        queued = self._queue.qsize()
+        if queued > self.max_queued:
+            self.max_queued = queued
+            if self._max_queued_metric is not None:
+                self._max_queued_metric.value = queued
+
+    def _malformed_payload(self):
+        self.malformed += 1
+        if self._malformed_metric is not None:
+            self._malformed_metric.value = self.malformed
+
+    def _tuple(self, topic, payload):
+        if self._style == 'binary':
+            return payload
+        try:
+            if self._style == 'string':
+                return payload.decode('utf-8')
+            if self._style == 'json':
+                return json.loads(payload.decode('utf-8'))
+            if self._decoder is not None:
+                tuple_ = self._decoder(payload)
+                if tuple_ is None:
+                    self._malformed_payload()
+                    return None
+            else:
+                tuple_ = {self._data_attribute_name: payload if self._data_as_blob else payload.decode('utf-8')}
+        except ValueError:
+            # UnicodeDecodeError and JSONDecodeError are ValueErrors
+            self._malformed_payload()
+            return None
+        if self._topic_attribute_name:
+            tuple_[self._topic_attribute_name] = topic
+        return tuple_
+
+    def _messages(self):
+        while not self._stopping:
+            try:
+                topic, payload = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                # the buffered messages are returned before the source fails
+                (self._shared if self._coalesce else self)._check_failure()
+                continue
+            tuple_ = self._tuple(topic, payload)
+            if tuple_ is not None:
+                yield tuple_
+
+    def __call__(self):
+        return self._messages()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._coalesce:
+            self._stopping = True
+            self._shared.detach(self)
+        else:
+            super(_EngineSource, self).__exit__(exc_type, exc_value, traceback)
+
+
+_shared_connections = dict()
+_shared_lock = threading.Lock()
+
+
+class _SharedConnection(_EngineCallable):
+    """
+    Connection of the coalesced engine sources of a process with the same connection parameters and qos.
+    The connection subscribes to the minimal cover of the topic filters of the attached sources
+    and passes each received message to the sources with a matching topic filter.
+    """
+    def __init__(self, params, qos):
+        super(_SharedConnection, self).__init__(params)
+        self._qos = qos
+        self._sources = []
+        self._trie = TopicFilterTrie()
+        self._subscribed = []
+        self._subscription_lock = None
+
+    @staticmethod
+    def _key(source):
+        return (source._qos[0], repr(sorted(source._params.items())))
+
+    @classmethod
+    def attach(cls, source):
+        """
+        Attaches `source` to the shared connection for its parameters, which connects on the first attach
+        """
+        key = cls._key(source)
+        with _shared_lock:
+            connection = _shared_connections.get(key)
+            if connection is None:
+                connection = cls(source._params, source._qos[0])
+            connection._sources.append(source)
+            connection._update_trie()
+            try:
+                if len(connection._sources) == 1:
+                    connection.__enter__()
+                    _shared_connections[key] = connection
+                else:
+                    connection._loop.run(connection._resubscribe_connected())
+            except BaseException:
+                connection._sources.remove(source)
+                connection._update_trie()
+                raise
+            return connection
+
+    def detach(self, source):
+        """
+        Detaches `source`, which disconnects on the last detach
+        """
+        with _shared_lock:
+            self._sources.remove(source)
+            self._update_trie()
+            if self._sources:
+                self._loop.run(self._resubscribe_connected())
+            else:
+                del _shared_connections[self._key(source)]
+                self.__exit__(None, None, None)
+
+    def _update_trie(self):
+        trie = TopicFilterTrie()
+        for source in self._sources:
+            for topic_filter in source._topics:
+                trie.add(topic_filter, source)
+        # the event loop reads the trie, so it is replaced and not modified
+        self._trie = trie
+
+    async def _on_connected(self, client):
+        if not client.session_present:
+            # the server has no subscriptions of a previous connection
+            self._subscribed = []
+        await self._resubscribe(client)
+
+    async def _resubscribe_connected(self):
+        if self._client is None or not self._client.connected:
+            # the next connect subscribes
+            return
+        try:
+            await self._resubscribe(self._client)
+        except ConnectionError:
+            pass
+
+    async def _resubscribe(self, client):
+        """
+        Subscribes to the minimal cover of the topic filters of the attached sources
+        and unsubscribes from the filters that are no longer needed
+        """
+        if self._subscription_lock is None:
+            self._subscription_lock = asyncio.Lock()
+        async with self._subscription_lock:
+            cover = minimal_cover([topic_filter for source in self._sources for topic_filter in source._topics])
+            added = [topic_filter for topic_filter in cover if topic_filter not in self._subscribed]
+            removed = [topic_filter for topic_filter in self._subscribed if topic_filter not in cover]
+            if added:
+                await client.subscribe(added, [self._qos] * len(added))
+            if removed:
+                await client.unsubscribe(removed)
+            self._subscribed = cover
+
+    async def _on_message(self, topic, payload):
+        delivered = set()
+        for source in self._trie.match(topic):
+            if id(source) not in delivered:
+                delivered.add(id(source))
+                await source._on_message(topic, payload)
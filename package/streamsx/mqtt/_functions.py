@@ -0,0 +1,830 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Python callables of the stream transformations that the composites insert in front of
+the sink operator or behind the source operator.
+"""
+
+import bz2
+import collections
+import hashlib
+import json
+import lzma
+import os
+import re
+import struct
+import time
+import zlib
+
+_LENGTH_PREFIX = struct.Struct('!I')
+
+# header of compressed payloads: magic bytes followed by one byte for the algorithm
+_COMPRESSION_MAGIC = b'\x00MQZ'
+_COMPRESSION_IDS = {'zlib': 1, 'lzma': 2, 'bz2': 3}
+_COMPRESSORS = {1: zlib.compress, 2: lzma.compress, 3: bz2.compress}
+_DECOMPRESSORS = {1: zlib.decompress, 2: lzma.decompress, 3: bz2.decompress}
+# errors of malformed received payloads; bz2 raises OSError for invalid data
+_MALFORMED_ERRORS = (ValueError, zlib.error, lzma.LZMAError, OSError)
+
+# header of the chunks of large payloads: magic bytes followed by the message id, the chunk index, and the number of chunks
+_CHUNK_MAGIC = b'\x00MQC'
+_CHUNK_HEADER = struct.Struct('!8sII')
+CHUNK_HEADER_BYTES = len(_CHUNK_MAGIC) + _CHUNK_HEADER.size
+
+# struct format characters of the SPL types supported by payload_format='struct'
+_STRUCT_CODES = {
+    'boolean': '?',
+    'int8': 'b', 'int16': 'h', 'int32': 'i', 'int64': 'q',
+    'uint8': 'B', 'uint16': 'H', 'uint32': 'I', 'uint64': 'Q',
+    'float32': 'f', 'float64': 'd',
+}
+_BOUNDED_RSTRING = re.compile(r'^rstring\[(\d+)\]$')
+
+
+def _attribute(tuple_, name):
+    if isinstance(tuple_, dict):
+        return tuple_[name]
+    return getattr(tuple_, name)
+
+
+def _as_payload(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return json.dumps(value).encode('utf-8')
+
+
+def _is_blob_attribute(schema, name):
+    return re.search(r'\bblob\s+' + re.escape(name) + r'\b', str(schema)) is not None
+
+
+def schema_attributes(schema):
+    """
+    Returns the list of (type, name) tuples of the top-level attributes of an SPL tuple schema
+    """
+    spl = schema if isinstance(schema, str) else schema.schema()
+    spl = spl.strip()
+    if not spl.startswith('tuple<') or not spl.endswith('>'):
+        raise TypeError('not a tuple schema: ' + spl)
+    attributes = []
+    depth = 0
+    start = len('tuple<')
+    for i in range(start, len(spl) - 1):
+        c = spl[i]
+        if c == '<':
+            depth += 1
+        elif c == '>':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            attributes.append(spl[start:i])
+            start = i + 1
+    attributes.append(spl[start:len(spl) - 1])
+    return [tuple(a.strip().rsplit(None, 1)) for a in attributes if a.strip()]
+
+
+def struct_layout(attributes):
+    """
+    Returns the struct format of the packed binary layout of a list of (type, name) attributes
+    """
+    layout = '!'
+    for type_, name in attributes:
+        bounded = _BOUNDED_RSTRING.match(type_.replace(' ', ''))
+        if type_ in _STRUCT_CODES:
+            layout += _STRUCT_CODES[type_]
+        elif bounded:
+            layout += bounded.group(1) + 's'
+        else:
+            raise TypeError("attribute '{}' of type {} is not supported by payload_format='struct'".format(name, type_))
+    return layout
+
+
+class _PayloadEncoder(object):
+    """
+    Serializes the attributes `fields` of a structured tuple to a JSON object or to the
+    packed binary layout `layout` created by :py:func:`struct_layout`.
+    """
+    def __init__(self, payload_format, fields, layout=None):
+        self._payload_format = payload_format
+        self._fields = list(fields)
+        # struct caches the compiled layout; struct.Struct objects cannot be pickled with the callable
+        self._layout = layout
+
+    def __call__(self, tuple_):
+        values = [_attribute(tuple_, f) for f in self._fields]
+        if self._layout is None:
+            return json.dumps(dict(zip(self._fields, values))).encode('utf-8')
+        return struct.pack(self._layout, *[v.encode('utf-8') if isinstance(v, str) else v for v in values])
+
+
+def _to_bool(value):
+    if not isinstance(value, bool):
+        raise TypeError(value)
+    return value
+
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def _converter(type_):
+    """
+    Returns a tuple (convert, default) for attributes of the SPL type `type_` decoded from JSON values
+    """
+    type_ = type_.replace(' ', '')
+    if type_.startswith('int') or type_.startswith('uint'):
+        return int, 0
+    if type_.startswith('float'):
+        return float, 0.0
+    if type_ == 'boolean':
+        return _to_bool, False
+    if type_ == 'rstring' or type_ == 'ustring' or _BOUNDED_RSTRING.match(type_):
+        return _to_str, ''
+    if type_.startswith('list<'):
+        return None, []
+    if type_.startswith('set<'):
+        return None, set()
+    if type_.startswith('map<'):
+        return None, {}
+    return None, None
+
+
+class _PayloadDecoder(object):
+    """
+    Deserializes a JSON object or the packed binary layout `layout` created by :py:func:`struct_layout`
+    into a dict with the values of the (type, name) `attributes` of a structured tuple.
+    `field_map` maps attribute names to the keys of the JSON object, where dots in a key
+    denote nested objects. Missing JSON values get the default value of the attribute type.
+    Returns ``None`` when the payload is malformed.
+    """
+    def __init__(self, payload_format, attributes, field_map=None, layout=None):
+        field_map = field_map if field_map else dict()
+        self._fields = []
+        for type_, name in attributes:
+            convert, default = _converter(type_)
+            self._fields.append((name, tuple(field_map.get(name, name).split('.')), convert, default,
+                                 _BOUNDED_RSTRING.match(type_.replace(' ', '')) is not None))
+        self._layout = layout if payload_format == 'struct' else None
+
+    def _unpack(self, payload):
+        try:
+            values = struct.unpack(self._layout, payload)
+            tuple_ = dict()
+            for (name, _, _, _, bounded), value in zip(self._fields, values):
+                tuple_[name] = value.rstrip(b'\0').decode('utf-8') if bounded else value
+            return tuple_
+        except (struct.error, UnicodeDecodeError):
+            return None
+
+    def __call__(self, payload):
+        if self._layout is not None:
+            return self._unpack(payload)
+        try:
+            document = json.loads(payload.decode('utf-8'))
+        except ValueError:
+            # includes UnicodeDecodeError
+            return None
+        if not isinstance(document, dict):
+            return None
+        tuple_ = dict()
+        for name, path, convert, default, _ in self._fields:
+            value = document
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is None:
+                value = default
+            elif convert is not None:
+                try:
+                    value = convert(value)
+                except (TypeError, ValueError):
+                    return None
+            tuple_[name] = value
+        return tuple_
+
+
+class TopicFilterTrie(object):
+    """
+    Trie of MQTT topic filters, which are matched level by level, with the wildcards ``+`` (one level)
+    and ``#`` (any number of levels, including the parent level). Topics starting with ``$`` are not matched
+    by filters starting with a wildcard.
+    """
+    def __init__(self):
+        self._root = dict()
+        self._size = 0
+
+    def add(self, topic_filter, value):
+        """
+        Adds a topic filter with an associated value
+        """
+        node = self._root
+        levels = topic_filter.split('/')
+        for i, level in enumerate(levels):
+            if level == '#' and i != len(levels) - 1:
+                raise ValueError('# must be the last level of the topic filter: ' + topic_filter)
+            if ('#' in level or '+' in level) and len(level) > 1:
+                raise ValueError('wildcards must occupy an entire level of the topic filter: ' + topic_filter)
+            node = node.setdefault(level, dict())
+        # None is never a level, so it marks the end of a filter
+        node.setdefault(None, []).append((self._size, value))
+        self._size += 1
+
+    def match(self, topic):
+        """
+        Returns the values of all filters matching `topic`, in the order in which the filters were added
+        """
+        matches = []
+        levels = topic.split('/')
+        nodes = [self._root]
+        for i, level in enumerate(levels):
+            next_nodes = []
+            for node in nodes:
+                wildcards = not (i == 0 and level.startswith('$'))
+                if wildcards and '#' in node:
+                    matches.extend(node['#'][None])
+                if level in node:
+                    next_nodes.append(node[level])
+                if wildcards and '+' in node:
+                    next_nodes.append(node['+'])
+            nodes = next_nodes
+        for node in nodes:
+            matches.extend(node.get(None, []))
+            # 'a/#' matches 'a'
+            if '#' in node:
+                matches.extend(node['#'][None])
+        return [value for _, value in sorted(matches, key=lambda m: m[0])]
+
+
+class _Route(object):
+    """
+    Split function that returns the index of the first of `topic_filters` matching the topic of a message,
+    or -1 when no filter matches. When `indexes` is set, the index of the matching filter in `indexes` is returned.
+    """
+    _MAX_CACHED_TOPICS = 10000
+
+    def __init__(self, topic_filters, topic_attribute_name, indexes=None):
+        self._topic_filters = topic_filters
+        self._topic_attribute_name = topic_attribute_name
+        self._indexes = indexes if indexes else list(range(len(topic_filters)))
+        self._trie = None
+        self._cache = None
+
+    def __call__(self, message):
+        if self._trie is None:
+            self._trie = TopicFilterTrie()
+            for index, topic_filter in zip(self._indexes, self._topic_filters):
+                self._trie.add(topic_filter, index)
+            self._cache = dict()
+        topic = message[self._topic_attribute_name]
+        index = self._cache.get(topic)
+        if index is None:
+            matches = self._trie.match(topic)
+            index = matches[0] if matches else -1
+            if len(self._cache) >= self._MAX_CACHED_TOPICS:
+                self._cache.clear()
+            self._cache[topic] = index
+        return index
+
+
+def _tuple_payload(tuple_, style, data_attribute_name, encoder=None):
+    """
+    Returns the message payload of a tuple as bytes
+    """
+    if encoder is not None:
+        return encoder(tuple_)
+    if style == 'struct':
+        return _as_payload(_attribute(tuple_, data_attribute_name))
+    return _as_payload(tuple_)
+
+
+def _payload_value(payload, style, data_as_blob=False):
+    """
+    Converts a message payload to the Python value of a tuple or tuple attribute
+    """
+    if style == 'binary' or (style == 'struct' and data_as_blob):
+        return payload
+    if style == 'json':
+        return json.loads(payload.decode('utf-8'))
+    return payload.decode('utf-8')
+
+
+def frame(payloads, batch_format):
+    """
+    Packs a list of payloads into a single message payload
+    """
+    if batch_format == 'json':
+        return json.dumps([p.decode('utf-8') for p in payloads]).encode('utf-8')
+    return b''.join(_LENGTH_PREFIX.pack(len(p)) + p for p in payloads)
+
+
+def unframe(payload, batch_format):
+    """
+    Splits a message payload created by :py:func:`frame` into the list of payloads
+    """
+    if batch_format == 'json':
+        payloads = json.loads(payload.decode('utf-8'))
+        if not isinstance(payloads, list) or not all(isinstance(p, str) for p in payloads):
+            raise ValueError('malformed batch message')
+        return [p.encode('utf-8') for p in payloads]
+    payloads = []
+    pos = 0
+    while pos < len(payload):
+        (length,) = _LENGTH_PREFIX.unpack_from(payload, pos)
+        pos += _LENGTH_PREFIX.size
+        if pos + length > len(payload):
+            raise ValueError('truncated batch message')
+        payloads.append(payload[pos:pos + length])
+        pos += length
+    return payloads
+
+
+def compress(payload, compression, min_bytes=0):
+    """
+    Compresses a payload and prepends the compression header. Payloads smaller than `min_bytes`,
+    and payloads that do not get smaller, are returned unchanged.
+    """
+    if len(payload) < min_bytes:
+        return payload
+    algorithm = _COMPRESSION_IDS[compression]
+    compressed = _COMPRESSION_MAGIC + bytes([algorithm]) + _COMPRESSORS[algorithm](payload)
+    return compressed if len(compressed) < len(payload) else payload
+
+
+def decompress(payload):
+    """
+    Decompresses a payload created by :py:func:`compress`. Payloads without compression header are returned unchanged.
+    """
+    if not payload.startswith(_COMPRESSION_MAGIC) or len(payload) <= len(_COMPRESSION_MAGIC):
+        return payload
+    algorithm = payload[len(_COMPRESSION_MAGIC)]
+    if algorithm not in _DECOMPRESSORS:
+        return payload
+    return _DECOMPRESSORS[algorithm](payload[len(_COMPRESSION_MAGIC) + 1:])
+
+
+def chunk(payload, max_bytes):
+    """
+    Splits a payload into chunks of at most `max_bytes`, each starting with the chunk header.
+    Payloads of at most `max_bytes` are returned unchanged as single chunk.
+    """
+    if len(payload) <= max_bytes:
+        return [payload]
+    size = max_bytes - CHUNK_HEADER_BYTES
+    count = (len(payload) + size - 1) // size
+    message_id = os.urandom(8)
+    return [_CHUNK_MAGIC + _CHUNK_HEADER.pack(message_id, index, count) + payload[index * size:(index + 1) * size]
+            for index in range(count)]
+
+
+class _Reassemble(object):
+    """
+    Reassembles the payloads split by :py:func:`chunk`. Returns the payload when the last missing chunk of a payload
+    is received and ``None`` for the other chunks. Payloads without chunk header are returned unchanged.
+
+    The incomplete payloads are kept in the order of their first chunk. Incomplete payloads whose first chunk is
+    older than `timeout_seconds` are evicted when the next chunk is received, and the oldest incomplete payloads are
+    evicted when the chunks held exceed `max_bytes`. The custom metrics ``nReassembledMessages``, ``nEvictedChunkSets``,
+    and ``reassemblyBytes`` count the reassembled and evicted payloads and the bytes held.
+    """
+    def __init__(self, max_bytes, timeout_seconds, clock=time.monotonic):
+        self._max_bytes = max_bytes
+        self._timeout_seconds = timeout_seconds
+        self._clock = clock
+        # message id -> [time of the first chunk, number of chunks, chunks by index, bytes]
+        self._sets = collections.OrderedDict()
+        self.bytes = 0
+        self.reassembled = 0
+        self.evicted = 0
+        self._metrics = None
+
+    def __enter__(self):
+        import streamsx.ec
+        if streamsx.ec.is_active():
+            self._metrics = (
+                streamsx.ec.CustomMetric(self, name='nReassembledMessages', kind='Counter',
+                    description='Number of messages reassembled from chunks'),
+                streamsx.ec.CustomMetric(self, name='nEvictedChunkSets', kind='Counter',
+                    description='Number of incomplete chunked messages dropped by timeout or memory bound'),
+                streamsx.ec.CustomMetric(self, name='reassemblyBytes', kind='Gauge',
+                    description='Number of bytes of incomplete chunked messages held for reassembly'))
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def _update_metrics(self):
+        if self._metrics is not None:
+            self._metrics[0].value = self.reassembled
+            self._metrics[1].value = self.evicted
+            self._metrics[2].value = self.bytes
+
+    def _evict_oldest(self):
+        _, (_, _, _, size) = self._sets.popitem(last=False)
+        self.bytes -= size
+        self.evicted += 1
+
+    def __call__(self, payload):
+        offset = CHUNK_HEADER_BYTES
+        if not payload.startswith(_CHUNK_MAGIC) or len(payload) < offset:
+            return payload
+        message_id, index, count = _CHUNK_HEADER.unpack_from(payload, len(_CHUNK_MAGIC))
+        if index >= count:
+            return payload
+        sets = self._sets
+        now = self._clock()
+        expired = now - self._timeout_seconds
+        while sets and next(iter(sets.values()))[0] <= expired:
+            self._evict_oldest()
+        entry = sets.get(message_id)
+        if entry is None:
+            entry = [now, count, dict(), 0]
+            sets[message_id] = entry
+        chunks = entry[2]
+        # chunks redelivered with qos 1 are received more than once
+        if entry[1] == count and index not in chunks:
+            data = payload[offset:]
+            chunks[index] = data
+            entry[3] += len(data)
+            self.bytes += len(data)
+        result = None
+        if len(chunks) == entry[1]:
+            del sets[message_id]
+            self.bytes -= entry[3]
+            self.reassembled += 1
+            result = b''.join(chunks[i] for i in range(entry[1]))
+        while self.bytes > self._max_bytes:
+            self._evict_oldest()
+        self._update_metrics()
+        return result
+
+
+class _Encode(object):
+    """
+    Map function that serializes the payload of a tuple with `encoder` and compresses it when `compression` is set.
+    Returns a dict with the attributes ``data`` and, when `topic_attribute_name` or `qos_attribute_name` are set, the topic and the qos.
+    When `max_bytes` is set, it is a flat map function that returns the list of dicts of the chunks of the payload.
+    """
+    def __init__(self, style, data_attribute_name, topic_attribute_name, encoder=None, compression=None, min_bytes=0, qos_attribute_name=None,
+                 max_bytes=None):
+        self._style = style
+        self._data_attribute_name = data_attribute_name
+        self._topic_attribute_name = topic_attribute_name
+        self._qos_attribute_name = qos_attribute_name
+        self._encoder = encoder
+        self._compression = compression
+        self._min_bytes = min_bytes
+        self._max_bytes = max_bytes
+
+    def _message(self, tuple_, payload):
+        message = {'data': payload}
+        if self._topic_attribute_name:
+            message[self._topic_attribute_name] = _attribute(tuple_, self._topic_attribute_name)
+        if self._qos_attribute_name:
+            message[self._qos_attribute_name] = _attribute(tuple_, self._qos_attribute_name)
+        return message
+
+    def __call__(self, tuple_):
+        payload = _tuple_payload(tuple_, self._style, self._data_attribute_name, self._encoder)
+        if self._compression:
+            payload = compress(payload, self._compression, self._min_bytes)
+        if self._max_bytes:
+            return [self._message(tuple_, p) for p in chunk(payload, self._max_bytes)]
+        return self._message(tuple_, payload)
+
+
+class _Lane(object):
+    """
+    Split function that returns the index of the lane named by the attribute `lane_attribute_name` of a tuple.
+    Tuples with an unknown lane are submitted to the last lane.
+    """
+    def __init__(self, lanes, lane_attribute_name):
+        self._lanes = dict((lane, index) for index, lane in enumerate(lanes))
+        self._default = len(lanes) - 1
+        self._lane_attribute_name = lane_attribute_name
+
+    def __call__(self, tuple_):
+        return self._lanes.get(_attribute(tuple_, self._lane_attribute_name), self._default)
+
+
+class _Batch(object):
+    """
+    Window aggregation that packs the tuples of a window into messages of at most `batch_size` tuples.
+    Returns a list of dicts with the attributes ``data`` and, when `topic_attribute_name` is set, the topic.
+    When `max_bytes` is set, messages larger than `max_bytes` are split into chunks.
+    """
+    def __init__(self, style, data_attribute_name, topic_attribute_name, batch_size, batch_format, compression=None, min_bytes=0, encoder=None,
+                 max_bytes=None):
+        self._style = style
+        self._encoder = encoder
+        self._data_attribute_name = data_attribute_name
+        self._topic_attribute_name = topic_attribute_name
+        self._batch_size = batch_size
+        self._batch_format = batch_format
+        self._compression = compression
+        self._min_bytes = min_bytes
+        self._max_bytes = max_bytes
+
+    def __call__(self, tuples):
+        messages = []
+        size = self._batch_size if self._batch_size else len(tuples)
+        for i in range(0, len(tuples), size):
+            payload = frame([_tuple_payload(t, self._style, self._data_attribute_name, self._encoder) for t in tuples[i:i + size]], self._batch_format)
+            if self._compression:
+                payload = compress(payload, self._compression, self._min_bytes)
+            for p in chunk(payload, self._max_bytes) if self._max_bytes else [payload]:
+                message = {'data': p}
+                if self._topic_attribute_name:
+                    message[self._topic_attribute_name] = _attribute(tuples[i], self._topic_attribute_name)
+                messages.append(message)
+        return messages
+
+
+class _Decode(object):
+    """
+    Converts a received message into the tuples of the output stream. The message payload is decompressed
+    when `decompress` is ``True``, and split into the payloads of several tuples when `batch_format` is set.
+    The topic is taken from the message attribute `message_topic_attribute_name`, which defaults to `topic_attribute_name`.
+    When `decoder` is set, the attributes of structured tuples are ``decoder(payload)``.
+    Malformed messages, for example truncated batches or invalid UTF-8 or JSON payloads,
+    are dropped and counted by the custom metric ``nMalformedMessages``.
+    When `reassembler` is set, chunked payloads are reassembled before they are decompressed,
+    and the chunks return no tuples until the payload is complete.
+    """
+    def __init__(self, style, data_attribute_name, topic_attribute_name, batch_format=None, decompress=False, data_as_blob=False, message_topic_attribute_name=None,
+                 decoder=None, reassembler=None):
+        self._style = style
+        self._data_attribute_name = data_attribute_name
+        self._topic_attribute_name = topic_attribute_name
+        self._message_topic_attribute_name = message_topic_attribute_name if message_topic_attribute_name else topic_attribute_name
+        self._batch_format = batch_format
+        self._decompress = decompress
+        self._data_as_blob = data_as_blob
+        self._decoder = decoder
+        self._reassembler = reassembler
+        self.malformed = 0
+        self._malformed_metric = None
+
+    def __enter__(self):
+        if self._reassembler is not None:
+            self._reassembler.__enter__()
+        import streamsx.ec
+        if streamsx.ec.is_active():
+            self._malformed_metric = streamsx.ec.CustomMetric(self, name='nMalformedMessages', kind='Counter',
+                description='Number of dropped messages with a malformed payload')
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def _malformed_payload(self):
+        self.malformed += 1
+        if self._malformed_metric is not None:
+            self._malformed_metric.value = self.malformed
+
+    def __call__(self, message):
+        payload = bytes(message['data'])
+        if self._reassembler is not None:
+            payload = self._reassembler(payload)
+            if payload is None:
+                return []
+        try:
+            if self._decompress:
+                payload = decompress(payload)
+            payloads = unframe(payload, self._batch_format) if self._batch_format else [payload]
+        except _MALFORMED_ERRORS:
+            self._malformed_payload()
+            return []
+        if self._style != 'struct':
+            values = []
+            for p in payloads:
+                try:
+                    values.append(_payload_value(p, self._style))
+                except ValueError:
+                    self._malformed_payload()
+            return values
+        tuples = []
+        for p in payloads:
+            if self._decoder is not None:
+                tuple_ = self._decoder(p)
+                if tuple_ is None:
+                    self._malformed_payload()
+                    continue
+            else:
+                try:
+                    tuple_ = {self._data_attribute_name: _payload_value(p, self._style, self._data_as_blob)}
+                except ValueError:
+                    self._malformed_payload()
+                    continue
+            if self._topic_attribute_name:
+                tuple_[self._topic_attribute_name] = message[self._message_topic_attribute_name]
+            tuples.append(tuple_)
+        return tuples
+
+
+class _CountMalformed(object):
+    """
+    ``for_each`` callable that counts the messages that the JSONToTuple operator cannot parse
+    by the custom metric ``nMalformedMessages``
+    """
+    def __init__(self):
+        self.malformed = 0
+        self._malformed_metric = None
+
+    def __enter__(self):
+        import streamsx.ec
+        if streamsx.ec.is_active():
+            self._malformed_metric = streamsx.ec.CustomMetric(self, name='nMalformedMessages', kind='Counter',
+                description='Number of dropped messages with a malformed payload')
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def __call__(self, message):
+        self.malformed += 1
+        if self._malformed_metric is not None:
+            self._malformed_metric.value = self.malformed
+
+
+def _digest(value):
+    """
+    Returns the 64-bit BLAKE2b digest of the canonical encoding of a payload or tuple
+    """
+    if isinstance(value, memoryview):
+        value = value.tobytes()
+    if isinstance(value, bytes):
+        data = b'b' + value
+    elif isinstance(value, str):
+        data = b's' + value.encode('utf-8')
+    else:
+        if hasattr(value, '_asdict'):
+            value = value._asdict()
+        data = b'j' + json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+
+def _dedupe_key(value):
+    """
+    Returns the key of an attribute value that identifies duplicates: a number or string is its own key,
+    other values are keyed by their digest
+    """
+    if isinstance(value, (str, int, float)):
+        return value
+    return _digest(value)
+
+
+class _Dedupe(object):
+    """
+    Filter function that drops tuples whose key was seen within the last `window` keys and the last `seconds`.
+    The key is the attribute `attribute_name` of structured tuples, or the complete tuple when it is ``None``.
+    Attribute values that are numbers or strings are kept as they are, payloads and tuples by their 64-bit BLAKE2b digest,
+    in the order they were first seen, so that the memory is bounded
+    by `window` and the oldest keys are evicted first. Dropped tuples are counted by the custom metric ``nDuplicateMessages``.
+    """
+    def __init__(self, window, seconds=None, attribute_name=None, clock=time.monotonic):
+        self._window = window
+        self._seconds = seconds
+        self._attribute_name = attribute_name
+        self._clock = clock
+        self._seen = collections.OrderedDict()
+        self.duplicates = 0
+        self._duplicates_metric = None
+
+    def __enter__(self):
+        import streamsx.ec
+        if streamsx.ec.is_active():
+            self._duplicates_metric = streamsx.ec.CustomMetric(self, name='nDuplicateMessages', kind='Counter',
+                description='Number of dropped duplicate messages')
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def __call__(self, tuple_):
+        key = _dedupe_key(_attribute(tuple_, self._attribute_name)) if self._attribute_name else _digest(tuple_)
+        seen = self._seen
+        now = self._clock() if self._seconds else 0.0
+        if self._seconds:
+            expired = now - self._seconds
+            while seen:
+                oldest = next(iter(seen.values()))
+                if oldest > expired:
+                    break
+                seen.popitem(last=False)
+        if key in seen:
+            self.duplicates += 1
+            if self._duplicates_metric is not None:
+                self._duplicates_metric.value = self.duplicates
+            return False
+        seen[key] = now
+        if len(seen) > self._window:
+            seen.popitem(last=False)
+        return True
+
+
+class _TokenBucket(object):
+    """
+    Token bucket with `capacity` tokens that is refilled with `rate` tokens per second
+    """
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.time = now
+
+    def _refill(self, now):
+        if now > self.time:
+            self.tokens = min(self.capacity, self.tokens + (now - self.time) * self.rate)
+            self.time = now
+
+    def wait(self, now):
+        """
+        Returns the seconds until a token is available
+        """
+        self._refill(now)
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1.0
+
+
+class _RateLimit(object):
+    """
+    Filter function that limits the rate of the published messages with a token bucket of `rate` messages per second
+    and, when `topic_rate` is set, a token bucket per topic. The topic is the attribute `topic_attribute_name` of a tuple.
+    The buckets hold up to `burst` tokens, by default the tokens of one second of their rate.
+    The per-topic buckets of the least recently used topics are evicted when there are more than `max_topics` topics.
+    When a token is missing, the policy ``'delay'`` waits for it and ``'drop'`` drops the tuple.
+    The delayed and dropped tuples are counted by the custom metrics ``nDelayedMessages`` and ``nDroppedMessages``.
+    """
+    def __init__(self, rate=None, topic_rate=None, burst=None, topic_attribute_name=None, policy='delay', max_topics=10000,
+                 clock=time.monotonic, sleep=time.sleep):
+        self._rate = rate
+        self._topic_rate = topic_rate
+        self._burst = burst
+        self._topic_attribute_name = topic_attribute_name
+        self._policy = policy
+        self._max_topics = max_topics
+        self._clock = clock
+        self._sleep = sleep
+        self._bucket = None
+        self._topics = collections.OrderedDict()
+        self.delayed = 0
+        self.dropped = 0
+        self._delayed_metric = None
+        self._dropped_metric = None
+
+    def __enter__(self):
+        import streamsx.ec
+        if streamsx.ec.is_active():
+            self._delayed_metric = streamsx.ec.CustomMetric(self, name='nDelayedMessages', kind='Counter',
+                description='Number of messages delayed by the rate limit')
+            self._dropped_metric = streamsx.ec.CustomMetric(self, name='nDroppedMessages', kind='Counter',
+                description='Number of messages dropped by the rate limit')
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def _capacity(self, rate):
+        return float(self._burst) if self._burst else max(1.0, float(rate))
+
+    def _buckets(self, tuple_, now):
+        buckets = []
+        if self._rate:
+            if self._bucket is None:
+                self._bucket = _TokenBucket(self._rate, self._capacity(self._rate), now)
+            buckets.append(self._bucket)
+        if self._topic_rate:
+            topic = _attribute(tuple_, self._topic_attribute_name)
+            bucket = self._topics.get(topic)
+            if bucket is None:
+                bucket = _TokenBucket(self._topic_rate, self._capacity(self._topic_rate), now)
+                self._topics[topic] = bucket
+                if len(self._topics) > self._max_topics:
+                    self._topics.popitem(last=False)
+            else:
+                self._topics.move_to_end(topic)
+            buckets.append(bucket)
+        return buckets
+
+    def __call__(self, tuple_):
+        now = self._clock()
+        buckets = self._buckets(tuple_, now)
+        wait = max(bucket.wait(now) for bucket in buckets)
+        if wait > 0.0:
+            if self._policy == 'drop':
+                self.dropped += 1
+                if self._dropped_metric is not None:
+                    self._dropped_metric.value = self.dropped
+                return False
+            self._sleep(wait)
+            now = self._clock()
+            self.delayed += 1
+            if self._delayed_metric is not None:
+                self._delayed_metric.value = self.delayed
+        for bucket in buckets:
+            bucket.take(now)
+        return True
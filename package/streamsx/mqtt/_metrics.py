@@ -0,0 +1,207 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Runtime metrics of the MQTT operators of a submitted job, retrieved with the REST API of
+:py:mod:`streamsx.rest`, and their export as Prometheus textfile.
+"""
+
+import collections
+import os
+import re
+import tempfile
+import threading
+import time
+
+OperatorMetrics = collections.namedtuple('OperatorMetrics', ['operator', 'kind', 'channel', 'timestamp', 'metrics', 'input_ports'])
+OperatorMetrics.__doc__ = """
+Snapshot of the metrics of an MQTT operator of a running job.
+
+Attributes:
+    operator(str): Name of the operator in the job.
+    kind(str): SPL operator kind, for example ``com.ibm.streamsx.mqtt::MQTTSink``.
+    channel(int): Channel index of the operator in a parallel region, or ``None``.
+    timestamp(float): Epoch time in seconds when the metrics were retrieved.
+    metrics(dict): Values of the custom and system metrics of the operator by metric name.
+    input_ports(list): Values of the metrics of each input port by metric name, for example
+        ``nTuplesQueued``, ``queueSize``, and ``nTuplesDropped`` of a threaded port.
+"""
+
+_CHANNEL = re.compile(r'.*\[(\d+)\]$')
+
+
+def _operator_pattern(name):
+    """
+    Returns the regular expression that matches the operator `name` and its channels in a parallel region
+    """
+    return re.escape(name) + r'(\[\d+\])?$'
+
+
+def _values(metrics, kinds):
+    values = dict()
+    for metric in metrics:
+        values[metric.name] = metric.value
+        kinds[metric.name] = getattr(metric, 'metricKind', None)
+    return values
+
+
+def _snapshot(operator, kinds):
+    match = _CHANNEL.match(operator.name)
+    return OperatorMetrics(operator=operator.name,
+                           kind=getattr(operator, 'operatorKind', None),
+                           channel=int(match.group(1)) if match else None,
+                           timestamp=time.time(),
+                           metrics=_values(operator.get_metrics(), kinds),
+                           input_ports=[_values(port.get_metrics(), kinds) for port in operator.get_input_ports()])
+
+
+def operator_metrics(job, names, kinds=None):
+    """
+    Returns the list of :py:class:`OperatorMetrics` of the operators of `job` with the given names,
+    including all channels of operators in a parallel region.
+    The kinds of the retrieved metrics are added to the dict `kinds` by metric name.
+    """
+    kinds = kinds if kinds is not None else dict()
+    snapshots = []
+    for name in names:
+        for operator in job.get_operators(name=_operator_pattern(name)):
+            snapshots.append(_snapshot(operator, kinds))
+    return snapshots
+
+
+def _metric_name(name):
+    return 'streams_mqtt_' + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+    return '{' + ','.join('{}="{}"'.format(k, _label(v)) for k, v in labels) + '}'
+
+
+def _prometheus_type(kind):
+    if kind is None:
+        return 'untyped'
+    kind = kind.lower()
+    return kind if kind in ('counter', 'gauge') else 'untyped'
+
+
+def prometheus_text(job_name, snapshots, kinds=None):
+    """
+    Returns the metrics of `snapshots` in the Prometheus text exposition format.
+    Each metric gets the prefix ``streams_mqtt_`` and the labels ``job``, ``operator``, ``channel``,
+    and ``port`` for the metrics of input ports. `kinds` maps metric names to the kind
+    (``counter``, ``gauge``); metrics of other kinds are exported as ``untyped``.
+    """
+    kinds = kinds if kinds else dict()
+    samples = collections.OrderedDict()
+    for snapshot in snapshots:
+        labels = [('job', job_name), ('operator', snapshot.operator)]
+        if snapshot.channel is not None:
+            labels.append(('channel', snapshot.channel))
+        for name, value in sorted(snapshot.metrics.items()):
+            samples.setdefault(name, []).append((labels, value))
+        for port, metrics in enumerate(snapshot.input_ports):
+            for name, value in sorted(metrics.items()):
+                samples.setdefault(name, []).append((labels + [('port', port)], value))
+    lines = []
+    for name, values in samples.items():
+        metric_name = _metric_name(name)
+        lines.append('# TYPE {} {}'.format(metric_name, _prometheus_type(kinds.get(name))))
+        for labels, value in values:
+            lines.append('{}{} {}'.format(metric_name, _labels(labels), value))
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+class PrometheusExporter(object):
+    """
+    Polls the metrics of MQTT composites in a running job and writes them as Prometheus textfile,
+    which can be collected by the textfile collector of the Prometheus node exporter.
+
+    The file is replaced atomically, so that the collector never reads a partially written file.
+
+    Args:
+        job(Job): The job from :py:mod:`streamsx.rest`.
+        composites(list): The :py:class:`MQTTSink` and :py:class:`MQTTSource` composites of the job's topology.
+        path(str): Path of the textfile, which should have the extension ``.prom``.
+        interval(float): Seconds between two polls by :py:meth:`start`. The default is 15.
+
+    Example::
+
+        job = submission_result.job
+        exporter = PrometheusExporter(job, [sink, source], '/var/lib/node_exporter/mqtt.prom')
+        exporter.start()
+    """
+    def __init__(self, job, composites, path, interval=15.0):
+        if interval <= 0:
+            raise ValueError('interval must be positive: ' + str(interval))
+        self._job = job
+        self._composites = list(composites)
+        self._path = path
+        self._interval = interval
+        self._kinds = dict()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _job_name(self):
+        name = getattr(self._job, 'name', None)
+        return name if name else str(getattr(self._job, 'id', ''))
+
+    def poll(self):
+        """
+        Retrieves the metrics once and rewrites the textfile. Returns the list of :py:class:`OperatorMetrics`.
+        """
+        snapshots = []
+        for composite in self._composites:
+            snapshots.extend(operator_metrics(self._job, composite._operator_names(), self._kinds))
+        self._write(prometheus_text(self._job_name(), snapshots, self._kinds))
+        return snapshots
+
+    def _write(self, text):
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp = tempfile.mkstemp(prefix='.mqtt-metrics-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            os.replace(tmp, self._path)
+        except:
+            os.remove(tmp)
+            raise
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+            except Exception:
+                # the job may be temporarily unreachable; retry with the next poll
+                pass
+            self._stopped.wait(self._interval)
+
+    def start(self):
+        """
+        Starts polling in a daemon thread
+        """
+        if self._thread is not None:
+            raise ValueError('exporter is already started')
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='mqtt-prometheus-exporter', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops polling and waits for the polling thread to finish
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -7,13 +7,36 @@ import streamsx.spl.types
 from streamsx.topology.composite import Source as AbstractSource
 from streamsx.topology.composite import ForEach as AbstractSink
 from streamsx.topology.schema import CommonSchema
-from streamsx.toolkits import create_keystore, create_truststore, extend_keystore, extend_truststore
+from streamsx.mqtt._build import build_phase, spl_string, unique_name
 from tempfile import gettempdir
+import copy
+import datetime
+import hashlib
 import string
 import random
 import os
+import sys
+import warnings
 
 _TOOLKIT_NAME = 'com.ibm.streamsx.mqtt'
+_JSON_TOOLKIT_NAME = 'com.ibm.streamsx.json'
+_JSON_TOOLKIT_VERSIONS = '[1.4.0,3.0.0)'
+
+def _coalescing(topology):
+    """
+    Returns ``True`` when the subscriptions of the sources of `topology` are coalesced
+    """
+    # coalesce_subscriptions() loads the module, so without it nothing is coalesced
+    subscriptions = sys.modules.get('streamsx.mqtt._subscriptions')
+    return subscriptions is not None and subscriptions.subscription_registry(topology).enabled
+
+
+def _spl_operator(placeable):
+    """
+    Returns the SPL operator of an operator invocation, a stream, or a sink
+    """
+    return placeable._op()
+
 
 def _generate_random_digits(len=10):
     """
@@ -22,9 +45,49 @@ def _generate_random_digits(len=10):
     return ''.join(random.choice(string.digits) for _ in range(len))
 
 
+_BATCH_FORMATS = ('length_prefixed', 'json')
+_COMPRESSIONS = ('zlib', 'lzma', 'bz2')
+_PAYLOAD_FORMATS = ('json', 'struct')
+_SSL_PROTOCOLS = ('TLSv1', 'TLSv1.1', 'TLSv1.2', 'TLSv1.3')
+_CONGESTION_POLICIES = {'wait': 'Sys.Wait', 'drop_first': 'Sys.DropFirst', 'drop_last': 'Sys.DropLast'}
+# keys of the duplicate suppression when only dedupe_seconds is set
+_DEDUPE_WINDOW = 100000
+# bounds of the reassembly of chunked messages
+_REASSEMBLY_MAX_BYTES = 64 * 1024 * 1024
+_REASSEMBLY_TIMEOUT_SECONDS = 60.0
+_RATE_LIMIT_POLICIES = ('delay', 'drop')
+# topics with a token bucket of the per_topic_rate
+_RATE_LIMIT_TOPICS = 10000
+# tuples queued in front of the rate limit with the policy 'delay' when no queue_size is set
+_RATE_LIMIT_QUEUE_SIZE = 1000
+_OVERFLOW_POLICIES = {'block': 'Sys.Wait', 'drop_oldest': 'Sys.DropFirst', 'drop_newest': 'Sys.DropLast'}
+
+
+def _check_batch_format(batch_format):
+    if batch_format not in _BATCH_FORMATS:
+        raise ValueError("batch_format must be 'length_prefixed' or 'json'")
+
+
+def _engine_style(schema):
+    """
+    Returns the style how the Python MQTT engine converts the tuples of a schema
+    """
+    if schema is CommonSchema.Python:
+        return 'python'
+    elif schema is CommonSchema.Json:
+        return 'json'
+    elif schema is CommonSchema.String:
+        return 'string'
+    elif schema is CommonSchema.Binary:
+        return 'binary'
+    return 'struct'
+
+
 class MQTTComposite(object):
     _APP_CONFIG_PROP_NAME_FOR_PASSWORD = 'password'
     _APP_CONFIG_PROP_NAME_FOR_USERNAME = 'username'
+    # the settings of template clones are validated once by the template
+    _validated = False
 
     def __init__(self, **options):
         self._vm_arg = None
@@ -45,6 +108,28 @@ class MQTTComposite(object):
         self._command_timeout_millis = None
         self._client_id = None
         self._ssl_debug = False
+        self._backend = 'java'
+        self._store_cache = True
+        self._connection = None
+        self._operator_name = None
+        if 'connection' in options:
+            self.connection = options.get('connection')
+        self._colocate_with = None
+        self._isolate = False
+        self._host_pool = None
+        self._resource_tags = None
+        if 'colocate_with' in options:
+            self.colocate_with = options.get('colocate_with')
+        if 'isolate' in options:
+            self.isolate = options.get('isolate')
+        if 'host_pool' in options:
+            self.host_pool = options.get('host_pool')
+        if 'resource_tags' in options:
+            self.resource_tags = options.get('resource_tags')
+        if 'store_cache' in options:
+            self.store_cache = options.get('store_cache')
+        if 'backend' in options:
+            self.backend = options.get('backend')
         if 'vm_arg' in options:
             self.vm_arg = options.get('vm_arg')
         if 'ssl_debug' in options:
@@ -71,6 +156,15 @@ class MQTTComposite(object):
             self.keystore_password = options.get('keystore_password')
         if 'ssl_protocol' in options:
             self.ssl_protocol = options.get('ssl_protocol')
+        self._ssl_protocols = None
+        self._ssl_ciphers = None
+        self._ssl_session_reuse = True
+        if 'ssl_protocols' in options:
+            self.ssl_protocols = options.get('ssl_protocols')
+        if 'ssl_ciphers' in options:
+            self.ssl_ciphers = options.get('ssl_ciphers')
+        if 'ssl_session_reuse' in options:
+            self.ssl_session_reuse = options.get('ssl_session_reuse')
         if 'reconnection_bound' in options:
             self.reconnection_bound = options.get('reconnection_bound')
         if 'keep_alive_seconds' in options:
@@ -79,16 +173,244 @@ class MQTTComposite(object):
             self.command_timeout_millis = options.get('command_timeout_millis')
         if 'client_id' in options:
             self.client_id = options.get('client_id')
+        self._reconnect_delay_millis = 1000
+        self._reconnect_max_delay_millis = None
+        self._reconnect_jitter = 0.5
+        self._clean_session = True
+        if 'reconnect_delay_millis' in options:
+            self.reconnect_delay_millis = options.get('reconnect_delay_millis')
+        if 'reconnect_max_delay_millis' in options:
+            self.reconnect_max_delay_millis = options.get('reconnect_max_delay_millis')
+        if 'reconnect_jitter' in options:
+            self.reconnect_jitter = options.get('reconnect_jitter')
+        if 'clean_session' in options:
+            self.clean_session = options.get('clean_session')
+
+    @property
+    def backend(self):
+        """
+        str: The implementation of the MQTT client. ``'java'`` (the default) uses the operators of the
+        ``com.ibm.streamsx.mqtt`` toolkit. ``'python'`` uses a pure Python MQTT 3.1.1 client that runs
+        as Python callable of the topology, which avoids the Java Virtual Machine at runtime.
+
+        The ``'python'`` backend supports the properties :py:attr:`server_uri`, :py:attr:`client_id`,
+        :py:attr:`keep_alive_seconds`, :py:attr:`reconnection_bound`, :py:attr:`command_timeout_millis`,
+        :py:attr:`username`, :py:attr:`password`, :py:attr:`app_config_name`, :py:attr:`ssl_protocol`,
+        :py:attr:`ssl_protocols`, :py:attr:`ssl_ciphers`, :py:attr:`ssl_session_reuse`, :py:attr:`ssl_debug`,
+        :py:attr:`trusted_certs`, :py:attr:`client_cert`, :py:attr:`client_private_key`, the reconnect backoff,
+        and :py:attr:`clean_session`, and the qos of the source and the sink. The properties :py:attr:`truststore` and :py:attr:`keystore` are not supported,
+        :py:attr:`vm_arg` is ignored.
+        The ``'python'`` client connects when the operator is initialized at the start of the PE, so that the
+        first tuple does not wait for the TCP connect and the TLS handshake.
+        """
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: str):
+        if backend not in ('java', 'python'):
+            raise ValueError("backend must be 'java' or 'python'")
+        self._backend = backend
+
+    @property
+    def store_cache(self):
+        """
+        bool: When ``True`` (the default), the truststores and keystores created from :py:attr:`trusted_certs`,
+        :py:attr:`client_cert`, and :py:attr:`client_private_key` are kept in a persistent cache
+        and reused by subsequent topology builds with the same certificates and keys.
+        The stores are named by a hash of the PEM inputs, so that the bundle contents do not change between builds.
+        The cache directory is ``$STREAMSX_MQTT_CACHE_DIR``, or ``streamsx.mqtt`` in ``$XDG_CACHE_HOME`` or ``~/.cache``.
+        The least recently used stores are evicted when the cache holds more than 64 stores; the bundle gets a copy
+        of the cached store that the eviction by a concurrent build does not remove.
+        When ``False``, new stores with random names are created in the temp directory on every build.
+        """
+        return self._store_cache
+
+    @store_cache.setter
+    def store_cache(self, store_cache: bool):
+        self._store_cache = store_cache
+
+    @property
+    def colocate_with(self):
+        """
+        Stream|Sink|list: Processing logic, for example the stream consumed by an :py:class:`MQTTSink` or the downstream
+        transformation of an :py:class:`MQTTSource`, that must run in the same processing element as the MQTT operator,
+        which avoids the serialization and the network hop between processing elements. The default is ``None``.
+
+        Example::
+
+            readings = topo.source(MQTTSource('tcp://host.domain:1883', 'sensors/#', CommonSchema.Json))
+            alerts = readings.filter(lambda r: r['temperature'] > 80)
+            alerts.for_each(MQTTSink('tcp://host.domain:1883', topic='alerts', colocate_with=alerts))
+        """
+        return self._colocate_with
+
+    @colocate_with.setter
+    def colocate_with(self, colocate_with):
+        if colocate_with is not None:
+            others = colocate_with if isinstance(colocate_with, (list, tuple)) else [colocate_with]
+            for other in others:
+                if not hasattr(other, '_op'):
+                    raise TypeError(other)
+        self._colocate_with = colocate_with
+
+    @property
+    def isolate(self):
+        """
+        bool: When ``True``, the MQTT operator runs in its own processing element, isolated from the transformations
+        of the composite and from the upstream or downstream processing logic. The default is ``False``.
+        """
+        return self._isolate
+
+    @isolate.setter
+    def isolate(self, isolate: bool):
+        self._isolate = isolate
+
+    @property
+    def host_pool(self):
+        """
+        str: The tagged host pool that runs the MQTT operator. Host pools of a topology are defined by
+        resource tags, so the operator is placed on the hosts tagged with this name, see :py:attr:`resource_tags`.
+        The default is ``None``.
+        """
+        return self._host_pool
+
+    @host_pool.setter
+    def host_pool(self, host_pool: str):
+        if host_pool is not None:
+            if not isinstance(host_pool, str):
+                raise TypeError(host_pool)
+            if not host_pool:
+                raise ValueError(host_pool)
+        self._host_pool = host_pool
+
+    @property
+    def resource_tags(self):
+        """
+        set(str): Resource tags of the hosts that can run the MQTT operator, for example hosts with connectivity
+        to the MQTT server. Submission fails when no resources with all tags exist. The default is ``None``.
+        """
+        return self._resource_tags
+
+    @resource_tags.setter
+    def resource_tags(self, resource_tags):
+        if resource_tags is not None:
+            if isinstance(resource_tags, str):
+                resource_tags = [resource_tags]
+            for tag in resource_tags:
+                if not isinstance(tag, str):
+                    raise TypeError(tag)
+            resource_tags = set(resource_tags)
+        self._resource_tags = resource_tags
+
+    def _isolated(self, stream):
+        """
+        Returns `stream` isolated from its downstream processing logic when :py:attr:`isolate` is set
+        """
+        if not self._isolate:
+            return stream
+        # the layout grouping of composites does not support the isolation marker
+        self.group = False
+        return stream.isolate()
+
+    @staticmethod
+    def _threaded_port(invoke, queue_size, spl_congestion_policy):
+        """
+        Configures a threaded input port on the operator `invoke`
+        """
+        op = _spl_operator(invoke)
+        port = op.inputPorts[0].getSPLInputPort()
+        op.config['queue'] = {'inputPortName': port['alias'] if port.get('alias') else port['connections'][0],
+                              'congestionPolicy': spl_congestion_policy,
+                              'queueSize': str(queue_size)}
+
+    def _place(self, placeable):
+        """
+        Applies the placement of the MQTT operator to `placeable`, the SPL operator invocation,
+        the stream of the source callable, or the sink of the sink callable
+        """
+        op = _spl_operator(placeable)
+        self._operator_name = op.name
+        self._stable_settings(op)
+        if self._colocate_with:
+            placeable.colocate(self._colocate_with)
+        tags = set(self._resource_tags) if self._resource_tags else set()
+        if self._host_pool:
+            tags.add(self._host_pool)
+        if tags:
+            placeable.resource_tags.update(tags)
+
+    def _operator_names(self):
+        """
+        Returns the names of the MQTT operators added by this composite
+        """
+        if self._operator_name is None:
+            raise ValueError('the composite is not added to a topology')
+        return [self._operator_name]
+
+    def metrics(self, job):
+        """
+        Returns snapshots of the metrics of the MQTT operators of this composite in a running job.
+        The operators are located by name with the REST API of :py:mod:`streamsx.rest`, so the composite
+        must be the instance that was added to the topology of the job.
+        Operators in a parallel region return a snapshot per channel.
+
+        With ``backend='java'`` the metrics are the custom metrics of the MQTT toolkit operators and the system metrics,
+        for example ``nTuplesDropped`` and ``queueSize`` of the input port of a sink with a ``queue_size``.
+        With ``backend='python'`` the sink provides the custom metrics ``nDroppedTuples`` and ``nQueuedTuples``.
+
+        Args:
+            job(Job): The job from :py:mod:`streamsx.rest`, for example ``submission_result.job``.
+
+        Returns:
+            list(OperatorMetrics): The snapshot of each operator.
+
+        Example::
+
+            for snapshot in sink.metrics(submission_result.job):
+                print(snapshot.operator, snapshot.metrics, snapshot.input_ports)
+
+        .. seealso:: :py:class:`~streamsx.mqtt.PrometheusExporter` to export the metrics periodically.
+        """
+        from streamsx.mqtt._metrics import operator_metrics
+        return operator_metrics(job, self._operator_names())
+
+    @property
+    def connection(self):
+        """
+        MQTTConnection: A connection to the MQTT server shared by several MQTT operators. When set, the operator references
+        the connection by its name in the connection document of the topology, instead of carrying its own
+        copy of the server URI, credential, and TLS parameters, which are ignored.
+        The ``server_uri`` argument can be ``None``. The default is ``None``.
+
+        Example::
+
+            conn = MQTTConnection('broker', 'ssl://host.domain:8883', trusted_certs=ca_pem, username='user', password='secret')
+            topo.source(MQTTSource(None, 'sensors/#', CommonSchema.Json, connection=conn))
+            stream.for_each(MQTTSink(None, topic='alerts', connection=conn))
+        """
+        return self._connection
+
+    @connection.setter
+    def connection(self, connection):
+        if connection is not None and not isinstance(connection, MQTTConnection):
+            raise TypeError(connection)
+        self._connection = connection
 
     @property
     def ssl_debug(self):
         """
-        bool: When ``True`` the property enables verbose SSL debug output at runtime.
+        bool|str: When ``True`` or ``'all'`` the property enables verbose SSL debug output at runtime,
+        which slows down the operator considerably. ``'handshake'`` traces the TLS handshakes only
+        (``-Djavax.net.debug=ssl:handshake``), which is cheap enough for production.
+        With ``backend='python'`` every value logs the TLS version, the cipher, whether the TLS session
+        was resumed, and the connect time of each connect with the logger ``streamsx.mqtt._engine``.
         """
         return self._ssl_debug
     
     @ssl_debug.setter
-    def ssl_debug(self, ssl_debug:bool):
+    def ssl_debug(self, ssl_debug):
+        if ssl_debug not in (True, False, None, 'all', 'handshake'):
+            raise ValueError("ssl_debug must be a bool, 'all', or 'handshake'")
         self._ssl_debug = ssl_debug
 
     @property
@@ -313,6 +635,64 @@ class MQTTComposite(object):
     def ssl_protocol(self, ssl_protocol: str):
         self._ssl_protocol = ssl_protocol
 
+    @property
+    def ssl_protocols(self):
+        """
+        list(str): The SSL protocols that the client may negotiate with the server, for example ``['TLSv1.3', 'TLSv1.2']``,
+        instead of the single :py:attr:`ssl_protocol`. Supported are ``TLSv1``, ``TLSv1.1``, ``TLSv1.2``, and ``TLSv1.3``.
+        With ``backend='java'`` the list is passed as ``-Djdk.tls.client.protocols`` to the JVM.
+        Mutually exclusive with :py:attr:`ssl_protocol`. The default is ``None``.
+        """
+        return self._ssl_protocols
+
+    @ssl_protocols.setter
+    def ssl_protocols(self, ssl_protocols):
+        if ssl_protocols is not None:
+            ssl_protocols = self._str_list(ssl_protocols)
+            for protocol in ssl_protocols:
+                if protocol not in _SSL_PROTOCOLS:
+                    raise ValueError('unsupported SSL protocol: ' + protocol)
+        self._ssl_protocols = ssl_protocols
+
+    @property
+    def ssl_ciphers(self):
+        """
+        list(str): The cipher suites that the client offers to the server for TLS 1.2 and older, in order of preference.
+        The names are the names of the backend: OpenSSL names like ``ECDHE-RSA-AES128-GCM-SHA256`` with ``backend='python'``,
+        JSSE names like ``TLS_ECDHE_RSA_WITH_AES_128_GCM_SHA256`` with ``backend='java'``, which are passed
+        as ``-Djdk.tls.client.cipherSuites`` to the JVM. The default is ``None``, which offers the default ciphers.
+        """
+        return self._ssl_ciphers
+
+    @ssl_ciphers.setter
+    def ssl_ciphers(self, ssl_ciphers):
+        self._ssl_ciphers = self._str_list(ssl_ciphers) if ssl_ciphers is not None else None
+
+    @property
+    def ssl_session_reuse(self):
+        """
+        bool: When ``True`` (the default), the ``'python'`` backend resumes the TLS session of the previous connection
+        when it reconnects to the server, which saves the full TLS handshake with its certificate verification.
+        The JVM of the ``'java'`` backend caches the TLS sessions of its SSL contexts independent of this property.
+        """
+        return self._ssl_session_reuse
+
+    @ssl_session_reuse.setter
+    def ssl_session_reuse(self, ssl_session_reuse: bool):
+        self._ssl_session_reuse = ssl_session_reuse
+
+    @staticmethod
+    def _str_list(value):
+        """
+        Returns a str or list of str as non-empty list
+        """
+        values = [value] if isinstance(value, str) else value
+        if not isinstance(values, (list, tuple)) or not all(isinstance(v, str) for v in values):
+            raise TypeError(value)
+        if not values:
+            raise ValueError(value)
+        return list(values)
+
     @property
     def server_uri(self):
         """
@@ -385,6 +765,84 @@ class MQTTComposite(object):
     def client_id(self, client_id: str):
         self._client_id = client_id
 
+    @property
+    def reconnect_max_delay_millis(self):
+        """
+        int: Enables the exponential backoff of reconnects. The delay before a reconnect starts at
+        :py:attr:`reconnect_delay_millis` and doubles with every failed attempt up to this maximum.
+        Each delay is shortened by a random fraction of up to :py:attr:`reconnect_jitter`, so that the clients of
+        a restarted MQTT server do not reconnect at the same time and overload the server.
+        The default is ``None``, which reconnects immediately after the connection is lost and retries with a fixed period.
+
+        With ``backend='java'`` the operators support no backoff and retry with a fixed period, and a warning is issued.
+        Each operator gets its own period between :py:attr:`reconnect_delay_millis` and this maximum, derived from the
+        operator name, which at least spreads the reconnects of the operators across the range.
+
+        Example::
+
+            sink = MQTTSink('tcp://host.domain:1883', topic='telemetry', reconnect_delay_millis=500,
+                            reconnect_max_delay_millis=60000, backend='python')
+        """
+        return self._reconnect_max_delay_millis
+
+    @reconnect_max_delay_millis.setter
+    def reconnect_max_delay_millis(self, reconnect_max_delay_millis: int):
+        if reconnect_max_delay_millis is not None:
+            if not isinstance(reconnect_max_delay_millis, int):
+                raise TypeError(reconnect_max_delay_millis)
+            if reconnect_max_delay_millis < 1:
+                raise ValueError(reconnect_max_delay_millis)
+        self._reconnect_max_delay_millis = reconnect_max_delay_millis
+
+    @property
+    def reconnect_delay_millis(self):
+        """
+        int: The delay before the first reconnect when :py:attr:`reconnect_max_delay_millis` is set, otherwise the fixed
+        period between the reconnects of the ``'python'`` backend. The default is 1000.
+        """
+        return self._reconnect_delay_millis
+
+    @reconnect_delay_millis.setter
+    def reconnect_delay_millis(self, reconnect_delay_millis: int):
+        if not isinstance(reconnect_delay_millis, int):
+            raise TypeError(reconnect_delay_millis)
+        if reconnect_delay_millis < 1:
+            raise ValueError(reconnect_delay_millis)
+        self._reconnect_delay_millis = reconnect_delay_millis
+
+    @property
+    def reconnect_jitter(self):
+        """
+        float: The maximum fraction between 0 and 1 by which a random jitter shortens the reconnect delays
+        when :py:attr:`reconnect_max_delay_millis` is set. The default is 0.5, which waits between half and
+        the full delay. 0 disables the jitter.
+        """
+        return self._reconnect_jitter
+
+    @reconnect_jitter.setter
+    def reconnect_jitter(self, reconnect_jitter: float):
+        if not 0.0 <= reconnect_jitter <= 1.0:
+            raise ValueError(reconnect_jitter)
+        self._reconnect_jitter = reconnect_jitter
+
+    @property
+    def clean_session(self):
+        """
+        bool: When ``False``, the client connects with a persistent session. The MQTT server keeps the subscriptions
+        of the client and queues the QoS 1 and 2 messages for it while it is disconnected, so that after a reconnect
+        the source does not subscribe again and receives the messages that were published in the meantime.
+        A persistent session requires a stable client ID: when :py:attr:`client_id` is not set, it is derived from
+        the namespace and name of the topology and the name of the operator, so that it is the same for every
+        connect and every submission of the application. Submit an application only once per MQTT server,
+        or set the client ID, to avoid that two jobs connect with the same client ID.
+        Requires ``backend='python'``; the default is ``True``.
+        """
+        return self._clean_session
+
+    @clean_session.setter
+    def clean_session(self, clean_session: bool):
+        self._clean_session = clean_session
+
     def _check_types(self):
         if self._trusted_certs is not None:
             # the setter ensures that a string is converted to a one element list
@@ -399,6 +857,11 @@ class MQTTComposite(object):
                     if not isinstance(v, str):
                         raise TypeError('vm_arg must be of type str or list of str')
     
+    def _validate(self):
+        if not self._validated:
+            self._check_types()
+            self._check_adjust()
+
     def _check_adjust(self):
         if self._truststore:
             if not self._truststore_password:
@@ -409,49 +872,151 @@ class MQTTComposite(object):
         if self._keystore:
             if not self._keystore_password:
                 raise ValueError('the keystore property requires the keystore_password property to be set')
-        if not self._server_uri:
+        if not self._server_uri and not self._connection:
             raise ValueError('the server_uri property is required.')
+        if self._connection:
+            self._connection._check_adjust()
+        if self._reconnect_max_delay_millis is not None and self._reconnect_max_delay_millis < self._reconnect_delay_millis:
+            raise ValueError('reconnect_max_delay_millis must not be less than reconnect_delay_millis')
+        if not self._clean_session and self._backend != 'python':
+            raise ValueError("clean_session=False requires backend='python'")
+        if self._ssl_protocol and self._ssl_protocols:
+            raise ValueError('Only one of ssl_protocol or ssl_protocols is allowed')
+
+    def _check_python_backend(self):
+        if self._connection:
+            self._connection._check_python_backend()
+        if self._truststore or self._keystore:
+            raise ValueError("the truststore and keystore properties are not supported by the 'python' backend")
+
+    def _engine_params(self) -> dict:
+        """
+        Creates the connection parameters of the Python MQTT engine
+        """
+        if self._connection:
+            params = self._connection._engine_params()
+            params['client_id'] = self.client_id
+            params['app_config_name'] = self.app_config_name
+            self._reconnect_params(params)
+            return params
+        params = dict()
+        params['server_uri'] = self.server_uri
+        params['keep_alive_seconds'] = self.keep_alive_seconds
+        params['reconnection_bound'] = self.reconnection_bound
+        params['client_id'] = self.client_id
+        params['command_timeout_millis'] = self.command_timeout_millis
+        params['username'] = self.username
+        params['password'] = self.password
+        params['app_config_name'] = self.app_config_name
+        params['ssl_protocol'] = self.ssl_protocol
+        params['ssl_protocols'] = self.ssl_protocols
+        params['ssl_ciphers'] = self.ssl_ciphers
+        params['ssl_session_reuse'] = self.ssl_session_reuse
+        params['trusted_certs'] = self._trusted_certs
+        params['client_cert'] = self.client_cert
+        params['client_private_key'] = self.client_private_key
+        params['key_password'] = self.keystore_password
+        self._reconnect_params(params)
+        return params
+
+    def _reconnect_params(self, params):
+        params['ssl_debug'] = self.ssl_debug
+        params['reconnect_delay_millis'] = self.reconnect_delay_millis
+        params['reconnect_max_delay_millis'] = self.reconnect_max_delay_millis
+        params['reconnect_jitter'] = self.reconnect_jitter
+        params['clean_session'] = self.clean_session
+
+    def _stable_settings(self, op):
+        """
+        Derives the reconnect period of the SPL operator `op` from its name, so that it is the same for every build
+        """
+        if isinstance(self._op, streamsx.spl.op.Invoke) and self._reconnect_max_delay_millis is not None:
+            reconnection_bound = self._connection.reconnection_bound if self._connection else self._reconnection_bound
+            if reconnection_bound != 0:
+                name = op.graph.namespace + '::' + op.graph.name + '::' + op.name
+                period = random.Random(name).randint(self._reconnect_delay_millis, self._reconnect_max_delay_millis)
+                self._op.params['period'] = streamsx.spl.types.int64(period)
+                warnings.warn("the operator {} retries to connect with a fixed period of {} ms: backend='java' supports no "
+                              "exponential backoff, use backend='python' for it".format(op.name, period), stacklevel=4)
+
+    def _session_client_id(self, topology, name):
+        """
+        Returns the client ID of the Python operator `name`, which is derived from the namespace and name of `topology`
+        and the operator name for a persistent session without :py:attr:`client_id`
+        """
+        if self._clean_session or self._client_id:
+            return self._client_id
+        name = topology.graph.namespace + '::' + topology.graph.name + '::' + name
+        return 'streamsx-' + hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]
 
-    def create_spl_params(self, topology) -> dict:
+    def _channel_client_id(self, prefix):
+        """
+        Returns an SPL expression for a client ID that is unique per channel of a parallel region
+        """
+        client_id_prefix = self.client_id if self.client_id else prefix
+        return streamsx.spl.op.Expression.expression(spl_string(client_id_prefix + '-') + ' + (rstring)getChannel()')
+
+    def _new_store(self, kind, pems, create):
+        """
+        Returns a tuple (path, password) of a new or cached store. ``create(path)`` creates the store and returns the password.
+        """
+        from streamsx.mqtt._stores import StoreCache
+        if self._store_cache:
+            return StoreCache().get(kind, pems, create)
+        store_filepath = os.path.join(gettempdir(), kind + '-' + _generate_random_digits(16) + '.jks')
+        return store_filepath, create(store_filepath)
+
+    def _new_truststore(self):
+        from streamsx.toolkits import create_truststore
+        truststore_filepath, truststore_pass = self._new_store('truststore', self._trusted_certs,
+                                                                lambda path: create_truststore(self.trusted_certs, path))
+        print("using truststore with trusted certificate(s): " + truststore_filepath)
+        print("truststore password is: " + truststore_pass)
+        return truststore_filepath, truststore_pass
+
+    def _new_keystore(self):
+        from streamsx.toolkits import create_keystore
+        keystore_filepath, keystore_pass = self._new_store('keystore', [self.client_cert, self.client_private_key],
+                                                            lambda path: create_keystore(self.client_cert, self.client_private_key, path))
+        print("using keystore with client certificate and key: " + keystore_filepath)
+        print("keystore password is: " + keystore_pass)
+        return keystore_filepath, keystore_pass
+
+    def _connection_spl_params(self, topology) -> dict:
+        """
+        Creates the SPL parameters of the connection to the MQTT server, which can also be
+        specified in a connection document
+        """
+        from streamsx.mqtt._stores import credential_registry
         spl_params = dict()
+        # stores and files are created and added to the topology once for all MQTT operators of the topology
+        registry = credential_registry(topology)
         if self.trusted_certs:
             if self.truststore:
-                print("adding trusted certificate(s) to truststore: " + self.truststore)
-                extend_truststore(self.trusted_certs, self.truststore, self.truststore_password)
+                from streamsx.toolkits import extend_truststore
+                if registry.extend_once('truststore', self._trusted_certs, self.truststore,
+                                        lambda: extend_truststore(self.trusted_certs, self.truststore, self.truststore_password)):
+                    print("added trusted certificate(s) to truststore: " + self.truststore)
             else:
                 # create truststore with given certificates
-                truststore_basename = 'truststore-' + _generate_random_digits(16) + '.jks'
-                truststore_filepath = os.path.join(gettempdir(), truststore_basename)
-                print("adding trusted certificate(s) to new truststore: " + truststore_filepath)
-                truststore_pass = create_truststore(self.trusted_certs, truststore_filepath)
-                print("truststore password is: " + truststore_pass)
-                topology.add_file_dependency(truststore_filepath, 'etc')
-                spl_params['trustStore'] = 'etc/' + truststore_basename
-                spl_params['trustStorePassword'] = truststore_pass
+                spl_params['trustStore'], spl_params['trustStorePassword'] = registry.store('truststore', self._trusted_certs, self._new_truststore)
 
         if self.truststore:
-            topology.add_file_dependency(self.truststore, 'etc')
-            spl_params['trustStore'] = 'etc/' + os.path.basename(self.truststore)
+            spl_params['trustStore'] = registry.file_dependency(self.truststore)
             spl_params['trustStorePassword'] = self.truststore_password
        
         if self.client_cert:
             if self.keystore:
-                print("adding client cert and key to keystore: " + self.keystore)
-                extend_keystore(self.client_cert, self.client_private_key, self.keystore, self.keystore_password)
+                from streamsx.toolkits import extend_keystore
+                if registry.extend_once('keystore', [self.client_cert, self.client_private_key], self.keystore,
+                                        lambda: extend_keystore(self.client_cert, self.client_private_key, self.keystore, self.keystore_password)):
+                    print("added client cert and key to keystore: " + self.keystore)
             else:
                 # create keystore with given certificate and key
-                keystore_basename = 'keystore-' + _generate_random_digits(16) + '.jks'
-                keystore_filepath = os.path.join(gettempdir(), keystore_basename)
-                print("adding client certificate and key to new keystore: " + keystore_filepath)
-                keystore_pass = create_keystore(self.client_cert, self.client_private_key, keystore_filepath)
-                print("keystore password is: " + keystore_pass)
-                topology.add_file_dependency(keystore_filepath, 'etc')
-                spl_params['keyStore'] = 'etc/' + keystore_basename
-                spl_params['keyStorePassword'] = keystore_pass
+                spl_params['keyStore'], spl_params['keyStorePassword'] = registry.store('keystore', [self.client_cert, self.client_private_key], self._new_keystore)
         
         if self.keystore:
-            topology.add_file_dependency(self.keystore, 'etc')
-            spl_params['keyStore'] = 'etc/' + os.path.basename(self.keystore)
+            spl_params['keyStore'] = registry.file_dependency(self.keystore)
             spl_params['keyStorePassword'] = self.keystore_password
     
         spl_params['serverURI'] = self.server_uri
@@ -459,33 +1024,110 @@ class MQTTComposite(object):
         spl_params['reconnectionBound'] = self.reconnection_bound
         if self.reconnection_bound != 0:
             spl_params['period'] = streamsx.spl.types.int64(30)
-        
-        if self.app_config_name:
-            spl_params['appConfigName'] = self.app_config_name
-            spl_params['passwordPropName'] = MQTTComposite._APP_CONFIG_PROP_NAME_FOR_PASSWORD
-            spl_params['userPropName'] = MQTTComposite._APP_CONFIG_PROP_NAME_FOR_USERNAME
         if self.username:
             spl_params['userID'] = self.username
         if self.password:
             spl_params['password'] = self.password
-        if self.client_id:
-            spl_params['clientID'] = self.client_id
         if self.command_timeout_millis is not None:
             spl_params['commandTimeout'] = streamsx.spl.types.int64(self.command_timeout_millis)
         if self.ssl_protocol:
             spl_params['sslProtocol'] = self.ssl_protocol
-        if self.vm_arg or self.ssl_debug:
+        elif self.ssl_protocols:
+            # the protocols are restricted by jdk.tls.client.protocols
+            spl_params['sslProtocol'] = 'TLS'
+        return spl_params
+
+    def create_spl_params(self, topology) -> dict:
+        if self._connection:
+            spl_params = self._connection._document_spl_params(topology)
+        else:
+            spl_params = self._connection_spl_params(topology)
+        if self.app_config_name:
+            spl_params['appConfigName'] = self.app_config_name
+            spl_params['passwordPropName'] = MQTTComposite._APP_CONFIG_PROP_NAME_FOR_PASSWORD
+            spl_params['userPropName'] = MQTTComposite._APP_CONFIG_PROP_NAME_FOR_USERNAME
+        if self.client_id:
+            spl_params['clientID'] = self.client_id
+        ssl_settings = self._connection if self._connection else self
+        if self.vm_arg or self.ssl_debug or ssl_settings.ssl_protocols or ssl_settings.ssl_ciphers:
             vmargs = []
             if isinstance(self.vm_arg, list):
                 vmargs.extend(self.vm_arg)
             elif isinstance(self.vm_arg, str):
                 vmargs.append(self.vm_arg)
             if self.ssl_debug:
-                vmargs.append('-Djavax.net.debug=all')
+                vmargs.append('-Djavax.net.debug=' + ('ssl:handshake' if self.ssl_debug == 'handshake' else 'all'))
+            if ssl_settings.ssl_protocols:
+                vmargs.append('-Djdk.tls.client.protocols=' + ','.join(ssl_settings.ssl_protocols))
+            if ssl_settings.ssl_ciphers:
+                vmargs.append('-Djdk.tls.client.cipherSuites=' + ','.join(ssl_settings.ssl_ciphers))
             spl_params['vmArg'] = vmargs
         return spl_params
 
 
+class MQTTConnection(MQTTComposite):
+    """
+    A named connection to an MQTT server, which is shared by the :py:class:`MQTTSink` and :py:class:`MQTTSource` operators
+    that reference it with their ``connection`` property.
+
+    The connection is rendered once into the connection document of the topology, which contains all
+    connections of the topology and is added as a single file dependency. The operators are configured with
+    the parameters ``connection`` and ``connectionDocument``, so that the bundle does not grow with the
+    number of operators, and operators fused into the same PE can share the client of the connection.
+    The :py:attr:`reconnection_bound` and :py:attr:`command_timeout_millis` are not defined by the connection
+    document schema of the toolkit and are passed as parameters of each operator.
+
+    The connection supports the properties :py:attr:`server_uri`, :py:attr:`keep_alive_seconds`, :py:attr:`reconnection_bound`,
+    :py:attr:`command_timeout_millis`, :py:attr:`username`, :py:attr:`password`, :py:attr:`ssl_protocol`,
+    :py:attr:`ssl_protocols`, :py:attr:`ssl_ciphers`, :py:attr:`ssl_session_reuse`, :py:attr:`trusted_certs`, :py:attr:`truststore`, :py:attr:`client_cert`, :py:attr:`client_private_key`, and :py:attr:`keystore`
+    with their passwords. The :py:attr:`client_id`, :py:attr:`app_config_name`, and :py:attr:`vm_arg` are properties of the operators.
+
+    Args:
+        name(str): The name of the connection specification in the connection document
+        server_uri(str): The MQTT server URI
+        **options(kwargs): optional parameters as keyword arguments
+
+    Example::
+
+        conn = MQTTConnection('broker', 'ssl://host.domain:8883', trusted_certs=ca_pem, username='user', password='secret')
+        for topic in ['alerts', 'events', 'metrics']:
+            streams[topic].for_each(MQTTSink(None, topic=topic, connection=conn))
+    """
+    _OPERATOR_PARAMS = ('period', 'reconnectionBound', 'commandTimeout')
+
+    def __init__(self, name, server_uri, **options):
+        MQTTComposite.__init__(self, **options)
+        if not isinstance(name, str):
+            raise TypeError(name)
+        if not name:
+            raise ValueError(name)
+        if not server_uri:
+            raise ValueError(server_uri)
+        self._name = name
+        self.server_uri = server_uri
+
+    @property
+    def name(self):
+        """
+        str: The name of the connection specification in the connection document.
+        """
+        return self._name
+
+    def _document_spl_params(self, topology) -> dict:
+        """
+        Adds the connection to the connection document of the topology and returns the SPL parameters referencing it
+        """
+        self._check_types()
+        spl_params = self._connection_spl_params(topology)
+        # the connection document schema of the toolkit does not define the reconnect and timeout settings
+        operator_params = dict((name, spl_params.pop(name)) for name in MQTTConnection._OPERATOR_PARAMS if name in spl_params)
+        attributes = dict((name, str(value)) for name, value in spl_params.items())
+        operator_params['connection'] = self._name
+        from streamsx.mqtt._connection import connection_document
+        operator_params['connectionDocument'] = connection_document(topology).add(self._name, attributes)
+        return operator_params
+
+
 class MQTTSink(MQTTComposite, AbstractSink):
     """
     The ``MQTTSink`` represents a stream termination that publishes messages to one or more MQTT topics.
@@ -500,13 +1142,16 @@ class MQTTSink(MQTTComposite, AbstractSink):
         **options(kwargs): optional parameters as keyword arguments
     """
     def __init__(self, server_uri, topic=None, topic_attribute_name=None, data_attribute_name=None, **options):
+        MQTTSink._check_topic(topic, topic_attribute_name)
+        self._configure(server_uri, topic, topic_attribute_name, data_attribute_name, options)
+
+    def _configure(self, server_uri, topic, topic_attribute_name, data_attribute_name, options):
+        """
+        Applies the arguments of the constructor, without the topic check that does not apply to templates
+        """
         MQTTComposite.__init__(self, **options)
         AbstractSink.__init__(self)
-        if not topic and not topic_attribute_name:
-            raise ValueError('One of topic or topic_attribute_name is required')
-        if topic and topic_attribute_name:
-            raise ValueError('Only one of topic or topic_attribute_name is allowed')
-        if not server_uri:
+        if not server_uri and not options.get('connection'):
             raise ValueError(server_uri)
         self.server_uri = server_uri
         
@@ -515,12 +1160,108 @@ class MQTTSink(MQTTComposite, AbstractSink):
         self._topic_attribute_name = topic_attribute_name
         self._data_attribute_name = data_attribute_name
         self._qos = None
+        self._parallel_width = None
+        self._partition_by = None
         if 'qos' in options:
             self.qos = options.get('qos')
         if 'retain' in options:
             self.retain = options.get('retain')
+        if 'parallel_width' in options:
+            self.parallel_width = options.get('parallel_width')
+        if 'partition_by' in options:
+            self.partition_by = options.get('partition_by')
+        self._batch_size = None
+        self._batch_timeout_ms = None
+        self._batch_format = 'length_prefixed'
+        if 'batch_size' in options:
+            self.batch_size = options.get('batch_size')
+        if 'batch_timeout_ms' in options:
+            self.batch_timeout_ms = options.get('batch_timeout_ms')
+        if 'batch_format' in options:
+            self.batch_format = options.get('batch_format')
+        self._compression = None
+        self._compression_min_bytes = 0
+        if 'compression' in options:
+            self.compression = options.get('compression')
+        if 'compression_min_bytes' in options:
+            self.compression_min_bytes = options.get('compression_min_bytes')
+        self._max_message_bytes = None
+        if 'max_message_bytes' in options:
+            self.max_message_bytes = options.get('max_message_bytes')
+        self._payload_format = None
+        self._fields = None
+        if 'payload_format' in options:
+            self.payload_format = options.get('payload_format')
+        if 'fields' in options:
+            self.fields = options.get('fields')
+        self._queue_size = None
+        self._congestion_policy = 'wait'
+        if 'queue_size' in options:
+            self.queue_size = options.get('queue_size')
+        if 'congestion_policy' in options:
+            self.congestion_policy = options.get('congestion_policy')
+        self._max_rate = None
+        self._per_topic_rate = None
+        self._burst = None
+        self._rate_limit_policy = 'delay'
+        self._rate_operator_name = None
+        if 'max_rate' in options:
+            self.max_rate = options.get('max_rate')
+        if 'per_topic_rate' in options:
+            self.per_topic_rate = options.get('per_topic_rate')
+        if 'burst' in options:
+            self.burst = options.get('burst')
+        if 'rate_limit_policy' in options:
+            self.rate_limit_policy = options.get('rate_limit_policy')
+        self._qos_attribute_name = None
+        self._lanes = None
+        self._lane_attribute_name = None
+        if 'qos_attribute_name' in options:
+            self.qos_attribute_name = options.get('qos_attribute_name')
+        if 'lanes' in options:
+            self.lanes = options.get('lanes')
+        if 'lane_attribute_name' in options:
+            self.lane_attribute_name = options.get('lane_attribute_name')
+        self._lane_sinks = None
         self._op = None
 
+    @staticmethod
+    def _check_topic(topic, topic_attribute_name):
+        if not topic and not topic_attribute_name:
+            raise ValueError('One of topic or topic_attribute_name is required')
+        if topic and topic_attribute_name:
+            raise ValueError('Only one of topic or topic_attribute_name is allowed')
+
+    @classmethod
+    def template(cls, server_uri, topic=None, topic_attribute_name=None, data_attribute_name=None, **options):
+        """
+        Creates a template for many sinks with the same settings, for example one sink per device group.
+        The settings are validated once when the template is created, and are shared by all sinks that
+        are created with :py:meth:`~_SinkTemplate.clone`, so that a clone only stores the settings that differ.
+        The settings of the template cannot be changed.
+
+        Args:
+            server_uri(str): The MQTT server URI
+            topic(str): The default topic of the clones.
+            topic_attribute_name(str): The default topic attribute of the clones.
+            data_attribute_name(str): The name of the tuple attribute containing the message data.
+            **options(kwargs): optional parameters as keyword arguments, as for :py:class:`MQTTSink`
+
+        Returns:
+            _SinkTemplate: The template, which creates sinks with ``clone(topic=..., **options)``.
+
+        Example::
+
+            template = MQTTSink.template('ssl://host.domain:8883', qos=1, trusted_certs=ca_pem, username='user', password='secret')
+            for group in device_groups:
+                streams[group].for_each(template.clone(topic='devices/' + group, client_id='publisher-' + group))
+
+        .. versionadded:: 1.0.3
+        """
+        sink = cls.__new__(cls)
+        sink._configure(server_uri, topic, topic_attribute_name, data_attribute_name, options)
+        return _SinkTemplate(sink)
+
     def create_spl_params(self, topology) -> dict:
         spl_params = MQTTComposite.create_spl_params(self, topology)
         if self.qos is not None:
@@ -532,6 +1273,8 @@ class MQTTSink(MQTTComposite, AbstractSink):
             spl_params['topicAttributeName'] = self._topic_attribute_name
         if self._retain:
             spl_params['retain'] = self._retain
+        if self._qos_attribute_name:
+            spl_params['qosAttributeName'] = self._qos_attribute_name
         #verify that we do not setup invalid SPL parameters
         for paramName in spl_params.keys():
             if not paramName in _MqttSink.SUPPORTED_SPL_PARAMS:
@@ -567,10 +1310,594 @@ class MQTTSink(MQTTComposite, AbstractSink):
     def retain(self, retain: bool):
         self._retain = retain
 
+    @property
+    def parallel_width(self):
+        """
+        int: The number of parallel channels of the sink. When set, a parallel region with *n* channels
+        is inserted in front of the sink, and each channel publishes with its own MQTT client.
+        The client ID of each channel is derived from the :py:attr:`client_id` and the channel number,
+        for example ``myclient-0``, ``myclient-1``. When no client ID is given, it is derived from the
+        topology name and the operator name.
+        Tuples are distributed round robin over the channels unless :py:attr:`partition_by` is set.
+        The default is ``None`` (no parallel region).
+        """
+        return self._parallel_width
+
+    @parallel_width.setter
+    def parallel_width(self, parallel_width: int):
+        if parallel_width is not None:
+            if not isinstance(parallel_width, int):
+                raise TypeError(parallel_width)
+            if parallel_width < 1:
+                raise ValueError(parallel_width)
+        self._parallel_width = parallel_width
+
+    @property
+    def partition_by(self):
+        """
+        str: The tuple attribute used to partition the tuples over the channels when :py:attr:`parallel_width` is set.
+        ``'topic'`` denotes the attribute given as ``topic_attribute_name``. All tuples with the same
+        attribute value are published by the same channel, so that the order of the messages per topic is retained.
+
+        Example::
+
+            sink = MQTTSink('tcp://host.domain:1883', topic_attribute_name='topic_name', parallel_width=4, partition_by='topic')
+        """
+        return self._partition_by
+
+    @partition_by.setter
+    def partition_by(self, partition_by: str):
+        if partition_by is not None:
+            if not isinstance(partition_by, str):
+                raise TypeError(partition_by)
+            if not partition_by:
+                raise ValueError(partition_by)
+        self._partition_by = partition_by
+
+    @property
+    def batch_size(self):
+        """
+        int: The maximum number of tuples that are packed into a single MQTT message.
+        The batched messages must be received with an :py:class:`MQTTSource` with ``unbatch=True``
+        and the same :py:attr:`batch_format`. When :py:attr:`batch_timeout_ms` is not set,
+        a message is published every *batch_size* tuples.
+        The default is ``None`` (no batching).
+
+        Example::
+
+            sink = MQTTSink('tcp://host.domain:1883', topic='sensors', batch_size=100, batch_timeout_ms=200)
+        """
+        return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, batch_size: int):
+        if batch_size is not None:
+            if not isinstance(batch_size, int):
+                raise TypeError(batch_size)
+            if batch_size < 1:
+                raise ValueError(batch_size)
+        self._batch_size = batch_size
+
+    @property
+    def batch_timeout_ms(self):
+        """
+        int: The time in milliseconds for which tuples are collected into batched messages.
+        All tuples received within the timeout are published when the timeout expires, in messages
+        of at most :py:attr:`batch_size` tuples. With :py:attr:`topic_attribute_name`, tuples are batched per topic.
+        The default is ``None``.
+        """
+        return self._batch_timeout_ms
+
+    @batch_timeout_ms.setter
+    def batch_timeout_ms(self, batch_timeout_ms: int):
+        if batch_timeout_ms is not None:
+            if not isinstance(batch_timeout_ms, int):
+                raise TypeError(batch_timeout_ms)
+            if batch_timeout_ms < 1:
+                raise ValueError(batch_timeout_ms)
+        self._batch_timeout_ms = batch_timeout_ms
+
+    @property
+    def batch_format(self):
+        """
+        str: The format of batched messages. ``'length_prefixed'`` (the default) concatenates the
+        payloads, each preceded by its length as 4 byte unsigned integer in network byte order.
+        ``'json'`` creates a JSON array of the payloads as strings, which is not supported for binary payloads,
+        for example of ``CommonSchema.Binary``, a ``blob`` data attribute, or ``payload_format='struct'``.
+        """
+        return self._batch_format
+
+    @batch_format.setter
+    def batch_format(self, batch_format: str):
+        _check_batch_format(batch_format)
+        self._batch_format = batch_format
+
+    @property
+    def compression(self):
+        """
+        str: The compression of the published messages, ``'zlib'``, ``'lzma'``, or ``'bz2'``.
+        Compressed messages start with a header that denotes the compression, so that an :py:class:`MQTTSource`
+        with ``decompress=True`` detects and decompresses them. Messages that do not get smaller are published uncompressed.
+        With batching, the batched messages are compressed. The default is ``None`` (no compression).
+
+        Example::
+
+            sink = MQTTSink('tcp://host.domain:1883', topic='telemetry', compression='zlib', compression_min_bytes=256)
+        """
+        return self._compression
+
+    @compression.setter
+    def compression(self, compression: str):
+        if compression is not None and compression not in _COMPRESSIONS:
+            raise ValueError("compression must be 'zlib', 'lzma', or 'bz2'")
+        self._compression = compression
+
+    @property
+    def compression_min_bytes(self):
+        """
+        int: The minimum payload size in bytes for compression. Smaller payloads are published uncompressed.
+        The default is 0.
+        """
+        return self._compression_min_bytes
+
+    @compression_min_bytes.setter
+    def compression_min_bytes(self, compression_min_bytes: int):
+        if compression_min_bytes < 0:
+            raise ValueError(compression_min_bytes)
+        self._compression_min_bytes = compression_min_bytes
+
+    @property
+    def max_message_bytes(self):
+        """
+        int: The maximum size in bytes of the published messages. Larger payloads are split into chunks of at most
+        `max_message_bytes`, each starting with a header of 20 bytes with a message ID, the index of the chunk, and the number of chunks,
+        so that an :py:class:`MQTTSource` with ``reassemble=True`` reassembles the payload.
+        The payload is split after serialization, batching, and compression. Smaller payloads are published unchanged.
+        The default is ``None`` (no size limit).
+
+        Example::
+
+            sink = MQTTSink('tcp://host.domain:1883', topic='images', max_message_bytes=256*1024)
+        """
+        return self._max_message_bytes
+
+    @max_message_bytes.setter
+    def max_message_bytes(self, max_message_bytes: int):
+        if max_message_bytes is not None:
+            from streamsx.mqtt._functions import CHUNK_HEADER_BYTES
+            if not isinstance(max_message_bytes, int):
+                raise TypeError(max_message_bytes)
+            if max_message_bytes <= CHUNK_HEADER_BYTES:
+                raise ValueError('max_message_bytes must be greater than {}'.format(CHUNK_HEADER_BYTES))
+        self._max_message_bytes = max_message_bytes
+
+    @property
+    def payload_format(self):
+        """
+        str: Serializes the attributes of structured tuples into the message payload, so that no ``map``
+        is required in front of the sink. ``'json'`` publishes a JSON object with the attribute names as keys.
+        ``'struct'`` publishes the attribute values packed in a fixed binary layout in network byte order,
+        in the order of the attributes (see :py:attr:`fields`). It supports the SPL types ``boolean``,
+        ``int8`` to ``int64``, ``uint8`` to ``uint64``, ``float32``, ``float64``, and bounded strings ``rstring[N]``,
+        which are UTF-8 encoded and padded with zero bytes to *N* bytes.
+        For example, the layout of ``tuple<int64 ts, float64 value, rstring[8] id>`` corresponds to the Python struct format ``'!qd8s'``.
+        Mutually exclusive with ``data_attribute_name``. The default is ``None``.
+
+        Example::
+
+            s = topo.source(readings).map(schema='tuple<rstring id, int64 ts, float64 value>')
+            s.for_each(MQTTSink('tcp://host.domain:1883', topic='telemetry', payload_format='json', fields=['ts', 'value']))
+        """
+        return self._payload_format
+
+    @payload_format.setter
+    def payload_format(self, payload_format: str):
+        if payload_format is not None and payload_format not in _PAYLOAD_FORMATS:
+            raise ValueError("payload_format must be 'json' or 'struct'")
+        self._payload_format = payload_format
+
+    @property
+    def fields(self):
+        """
+        list(str): The attributes serialized by :py:attr:`payload_format`, in the order of the list.
+        The default is ``None``, which serializes all attributes of the tuple except the ``topic_attribute_name``.
+        """
+        return self._fields
+
+    @fields.setter
+    def fields(self, fields):
+        if fields is not None:
+            if isinstance(fields, str) or not all(isinstance(f, str) for f in fields):
+                raise TypeError(fields)
+            if len(fields) == 0:
+                raise ValueError(fields)
+            fields = list(fields)
+        self._fields = fields
+
+    @property
+    def queue_size(self):
+        """
+        int: The size of a queue in front of the sink operator. When set, the sink receives the tuples on a
+        threaded input port, so that the upstream processing continues while the sink waits for a slow or
+        unavailable MQTT server. The behavior when the queue is full is set by :py:attr:`congestion_policy`.
+        The default is ``None`` (no queue).
+
+        Example::
+
+            sink = MQTTSink('tcp://host.domain:1883', topic='sensors', queue_size=10000, congestion_policy='drop_first')
+        """
+        return self._queue_size
+
+    @queue_size.setter
+    def queue_size(self, queue_size: int):
+        if queue_size is not None:
+            if not isinstance(queue_size, int):
+                raise TypeError(queue_size)
+            if queue_size < 1:
+                raise ValueError(queue_size)
+        self._queue_size = queue_size
+
+    @property
+    def congestion_policy(self):
+        """
+        str: The behavior when the queue of :py:attr:`queue_size` is full. ``'wait'`` (the default) blocks the upstream
+        processing until there is room in the queue, ``'drop_first'`` drops the oldest queued tuple, and ``'drop_last'``
+        drops the arriving tuple.
+
+        The dropped tuples are counted by the input port metric ``nTuplesDropped`` of the ``MQTTSink`` operator,
+        or by the custom metric ``nDroppedTuples`` with ``backend='python'``, which also provides the number of
+        queued tuples as custom metric ``nQueuedTuples``.
+        """
+        return self._congestion_policy
+
+    @congestion_policy.setter
+    def congestion_policy(self, congestion_policy: str):
+        if congestion_policy not in _CONGESTION_POLICIES:
+            raise ValueError("congestion_policy must be 'wait', 'drop_first', or 'drop_last'")
+        self._congestion_policy = congestion_policy
+
+    @staticmethod
+    def _check_rate(rate):
+        if rate is not None:
+            if isinstance(rate, bool) or not isinstance(rate, (int, float)):
+                raise TypeError(rate)
+            if rate <= 0:
+                raise ValueError(rate)
+
+    @property
+    def max_rate(self):
+        """
+        float: The maximum number of published messages per second of the connection. A token bucket in front of the sink
+        operator holds up to :py:attr:`burst` messages, and the behavior when the rate is exceeded is set by :py:attr:`rate_limit_policy`.
+        The messages are counted after batching and chunking, as they are published to the MQTT server.
+        With a :py:attr:`parallel_width`, the rate applies to all channels together. The default is ``None`` (no limit).
+
+        Example::
+
+            sink = MQTTSink('tcp://host.domain:1883', topic_attribute_name='topic', max_rate=500, burst=1000, per_topic_rate=50)
+        """
+        return self._max_rate
+
+    @max_rate.setter
+    def max_rate(self, max_rate: float):
+        MQTTSink._check_rate(max_rate)
+        self._max_rate = max_rate
+
+    @property
+    def per_topic_rate(self):
+        """
+        float: The maximum number of published messages per second of each topic, given by the
+        ``topic_attribute_name``, which is required. The token buckets of the least recently used topics are evicted when
+        there are more than 10000 topics, so that an evicted topic starts again with a full bucket. The default is ``None`` (no limit).
+        """
+        return self._per_topic_rate
+
+    @per_topic_rate.setter
+    def per_topic_rate(self, per_topic_rate: float):
+        MQTTSink._check_rate(per_topic_rate)
+        self._per_topic_rate = per_topic_rate
+
+    @property
+    def burst(self):
+        """
+        int: The number of messages that can be published at once after an idle period, the capacity of the token buckets
+        of :py:attr:`max_rate` and :py:attr:`per_topic_rate`. The default is the number of messages of one second at the rate.
+        """
+        return self._burst
+
+    @burst.setter
+    def burst(self, burst: int):
+        if burst is not None:
+            if not isinstance(burst, int):
+                raise TypeError(burst)
+            if burst < 1:
+                raise ValueError(burst)
+        self._burst = burst
+
+    @property
+    def rate_limit_policy(self):
+        """
+        str: The behavior when a message exceeds :py:attr:`max_rate` or :py:attr:`per_topic_rate`. ``'delay'`` (the default)
+        waits until the message can be published. The rate limit operator then receives the messages on a threaded input port
+        with a queue of :py:attr:`queue_size` tuples, by default 1000, so that only this operator waits, while the operators
+        fused with it continue. When the queue is full, :py:attr:`congestion_policy` applies. ``'drop'`` drops the message.
+        The delayed and dropped messages are counted by the custom metrics ``nDelayedMessages`` and ``nDroppedMessages``
+        of the rate limit operator in front of the sink.
+        """
+        return self._rate_limit_policy
+
+    @rate_limit_policy.setter
+    def rate_limit_policy(self, rate_limit_policy: str):
+        if rate_limit_policy not in _RATE_LIMIT_POLICIES:
+            raise ValueError("rate_limit_policy must be 'delay' or 'drop'")
+        self._rate_limit_policy = rate_limit_policy
+
+    @property
+    def qos_attribute_name(self):
+        """
+        str: The name of an ``int32`` tuple attribute that contains the qos of each published message.
+        Mutually exclusive with :py:attr:`qos`; not supported with batching. The default is ``None``.
+        """
+        return self._qos_attribute_name
+
+    @qos_attribute_name.setter
+    def qos_attribute_name(self, qos_attribute_name: str):
+        if qos_attribute_name is not None:
+            if not isinstance(qos_attribute_name, str):
+                raise TypeError(qos_attribute_name)
+            if not qos_attribute_name:
+                raise ValueError(qos_attribute_name)
+        self._qos_attribute_name = qos_attribute_name
+
+    @property
+    def lanes(self):
+        """
+        dict: Priority lanes of the sink. Each lane is published by its own sink operator with its own MQTT connection,
+        so that a slow lane, for example bulk telemetry with a large queue, cannot delay the messages of another lane,
+        for example alarms with qos 2. The dict maps the lane names to dicts of options that override the
+        options of this sink for the lane, for example ``qos``, ``queue_size``, ``congestion_policy``, ``retain``,
+        ``compression``, ``batch_size``, ``client_id``, or the placement options.
+        The tuples are routed by the value of the attribute :py:attr:`lane_attribute_name`.
+        Tuples with a value that is not a lane name are published by the last lane.
+        When the client ID is set for the sink, the client ID of each lane is the client ID followed by ``-`` and the lane name.
+        The default is ``None`` (no lanes).
+
+        Example::
+
+            sink = MQTTSink('tcp://host.domain:1883', topic_attribute_name='topic', lane_attribute_name='priority', lanes={
+                'critical': {'qos': 2, 'queue_size': 100},
+                'bulk': {'qos': 0, 'queue_size': 100000, 'congestion_policy': 'drop_first', 'batch_size': 100}})
+        """
+        return self._lanes
+
+    @lanes.setter
+    def lanes(self, lanes):
+        if lanes is not None:
+            if not isinstance(lanes, dict):
+                raise TypeError(lanes)
+            if not lanes:
+                raise ValueError(lanes)
+            for lane, lane_options in lanes.items():
+                if not isinstance(lane, str) or not isinstance(lane_options, dict):
+                    raise TypeError(lane)
+                for option in lane_options:
+                    if option in ('lanes', 'lane_attribute_name') or not isinstance(getattr(MQTTSink, option, None), property):
+                        raise ValueError("invalid option '{}' of lane '{}'".format(option, lane))
+        self._lanes = lanes
+
+    @property
+    def lane_attribute_name(self):
+        """
+        str: The name of the ``rstring`` tuple attribute that contains the lane name of a tuple, see :py:attr:`lanes`.
+        """
+        return self._lane_attribute_name
+
+    @lane_attribute_name.setter
+    def lane_attribute_name(self, lane_attribute_name: str):
+        if lane_attribute_name is not None:
+            if not isinstance(lane_attribute_name, str):
+                raise TypeError(lane_attribute_name)
+            if not lane_attribute_name:
+                raise ValueError(lane_attribute_name)
+        self._lane_attribute_name = lane_attribute_name
+
+    def _lane_sink(self, lane):
+        """
+        Returns a copy of this sink with the options of `lane`
+        """
+        sink = copy.copy(self)
+        sink._lanes = None
+        sink._lane_attribute_name = None
+        sink._lane_sinks = None
+        sink._op = None
+        lane_options = self._lanes[lane]
+        if self.client_id and 'client_id' not in lane_options:
+            sink.client_id = self.client_id + '-' + lane
+        for option, value in lane_options.items():
+            setattr(sink, option, value)
+        return sink
+
+    def _operator_names(self):
+        if self._lanes and self._lane_sinks:
+            return [name for sink in self._lane_sinks.values() for name in sink._operator_names()]
+        names = MQTTComposite._operator_names(self)
+        if self._rate_operator_name:
+            names.append(self._rate_operator_name)
+        return names
+
+    def _populate_lanes(self, topology, stream, name):
+        """
+        Splits the stream by lane and adds a sink per lane
+        """
+        from streamsx.mqtt._functions import _Lane
+        if not self._lane_attribute_name:
+            raise ValueError('lanes requires the lane_attribute_name')
+        lanes = list(self._lanes.keys())
+        streams = stream.split(len(lanes), _Lane(lanes, self._lane_attribute_name), names=lanes)
+        self._lane_sinks = dict()
+        terminations = []
+        for lane, lane_stream in zip(lanes, streams):
+            sink = self._lane_sink(lane)
+            terminations.append(sink._populate(topology, lane_stream, name + '_' + lane if name else None))
+            if not getattr(sink, 'group', True):
+                self.group = False
+            self._lane_sinks[lane] = sink
+        self._op = self._lane_sinks[lanes[0]]._op
+        return terminations[0]
+
+    def _encoder(self, schema):
+        """
+        Returns the payload encoder for tuples of `schema`, or ``None`` when :py:attr:`payload_format` is not set
+        """
+        if not self._payload_format:
+            if self._fields:
+                raise ValueError('fields requires the payload_format')
+            return None
+        from streamsx.mqtt._functions import _PayloadEncoder, schema_attributes, struct_layout
+        if _engine_style(schema) != 'struct':
+            raise TypeError('payload_format requires a structured schema: ' + str(schema))
+        if self._data_attribute_name:
+            raise ValueError('Only one of payload_format or data_attribute_name is allowed')
+        types = dict((name, type_) for type_, name in schema_attributes(schema))
+        control = (self._topic_attribute_name, self._qos_attribute_name, self._lane_attribute_name)
+        fields = self._fields if self._fields else [name for name in types if name not in control]
+        for name in fields:
+            if name not in types:
+                raise ValueError("field '{}' is not an attribute of {}".format(name, schema))
+        attributes = [(types[name], name) for name in fields]
+        if self._payload_format == 'struct':
+            return _PayloadEncoder('struct', fields, struct_layout(attributes))
+        for type_, name in attributes:
+            if type_ == 'blob':
+                raise TypeError("attribute '{}' of type blob is not supported by payload_format='json'".format(name))
+        return _PayloadEncoder('json', fields)
+
+    def _message_schema(self):
+        schema = 'tuple<blob data'
+        if self._topic_attribute_name:
+            schema += ', rstring ' + self._topic_attribute_name
+        if self._qos_attribute_name:
+            schema += ', int32 ' + self._qos_attribute_name
+        return schema + '>'
+
+    def _batched(self, stream, encoder):
+        from streamsx.mqtt._functions import _Batch, _is_blob_attribute
+        style = _engine_style(stream.oport.schema)
+        if self._batch_format == 'json':
+            data_attribute_name = self._data_attribute_name if self._data_attribute_name else 'data'
+            if style == 'binary' or self._payload_format == 'struct' or \
+                    (style == 'struct' and not encoder and _is_blob_attribute(stream.oport.schema, data_attribute_name)):
+                raise TypeError("batch_format='json' does not support binary payloads, use batch_format='length_prefixed'")
+        if self._batch_timeout_ms:
+            window = stream.batch(datetime.timedelta(milliseconds=self._batch_timeout_ms))
+        else:
+            window = stream.batch(self._batch_size)
+        if self._topic_attribute_name:
+            window = window.partition(self._topic_attribute_name)
+        batch = _Batch(style, self._data_attribute_name if self._data_attribute_name else 'data',
+                       self._topic_attribute_name, self._batch_size, self._batch_format,
+                       self._compression, self._compression_min_bytes, encoder, self._max_message_bytes)
+        return window.aggregate(batch).flat_map().map(schema=self._message_schema())
+
+    def _encoded(self, stream, encoder):
+        from streamsx.mqtt._functions import _Encode
+        encode = _Encode(_engine_style(stream.oport.schema), self._data_attribute_name if self._data_attribute_name else 'data',
+                         self._topic_attribute_name, encoder, self._compression, self._compression_min_bytes,
+                         self._qos_attribute_name, self._max_message_bytes)
+        if self._max_message_bytes:
+            return stream.flat_map(encode).map(schema=self._message_schema())
+        return stream.map(encode, schema=self._message_schema())
+
+    def _prepare(self, stream):
+        """
+        Adds the transformations in front of the sink operator and returns
+        a tuple (stream, data_attribute_name, encoder) for the sink operator.
+        The serialization, batching, compression and chunking are done in a single Python callable.
+        The returned `encoder` is not ``None`` when the payload must still be serialized by the sink.
+        """
+        data_attribute_name = self._data_attribute_name
+        encoder = self._encoder(stream.oport.schema)
+        if self._batch_size or self._batch_timeout_ms:
+            if self._qos_attribute_name:
+                raise ValueError('qos_attribute_name is not supported with batching')
+            # batches are serialized and compressed by the batch aggregation
+            stream = self._batched(stream, encoder)
+            data_attribute_name = 'data'
+            encoder = None
+        elif self._compression or self._max_message_bytes or (encoder and self._backend != 'python'):
+            # the python backend serializes in the sink callable
+            stream = self._encoded(stream, encoder)
+            data_attribute_name = 'data'
+            encoder = None
+        return stream, data_attribute_name, encoder
+
+    def _rate_limited(self, stream, name):
+        """
+        Returns `stream` passed through the token buckets of :py:attr:`max_rate` and :py:attr:`per_topic_rate`
+        """
+        if not self._max_rate and not self._per_topic_rate:
+            if self._burst:
+                raise ValueError('burst requires the max_rate or the per_topic_rate')
+            return stream
+        if self._per_topic_rate and not self._topic_attribute_name:
+            raise ValueError('per_topic_rate requires the topic_attribute_name')
+        from streamsx.mqtt._functions import _RateLimit
+        rate_limit = _RateLimit(self._max_rate, self._per_topic_rate, self._burst, self._topic_attribute_name,
+                                self._rate_limit_policy, _RATE_LIMIT_TOPICS)
+        stream = stream.filter(rate_limit, name=unique_name(stream.topology, (name if name else 'MQTTSink') + '_rate'))
+        self._rate_operator_name = stream.oport.operator.name
+        if self._rate_limit_policy == 'delay':
+            # the delay blocks the thread of the input port, not the upstream operators of the PE
+            queue_size = self._queue_size if self._queue_size else _RATE_LIMIT_QUEUE_SIZE
+            self._threaded_port(stream, queue_size, _CONGESTION_POLICIES[self._congestion_policy])
+        return stream
+
+    def _partition_key(self):
+        if self._partition_by == 'topic':
+            if not self._topic_attribute_name:
+                raise ValueError("partition_by='topic' requires the topic_attribute_name")
+            return self._topic_attribute_name
+        return self._partition_by
+
+    def _populate_python(self, topology, stream, name, data_attribute_name, encoder):
+        from streamsx.mqtt._engine import _EngineSink
+        self._check_python_backend()
+        if self._parallel_width:
+            raise ValueError("parallel_width is not supported by the 'python' backend")
+        schema = stream.oport.schema
+        name = unique_name(topology, name if name else _EngineSink.__name__)
+        params = self._engine_params()
+        params['client_id'] = self._session_client_id(topology, name)
+        self._op = _EngineSink(params, _engine_style(schema), topic=self._topic,
+                               topic_attribute_name=self._topic_attribute_name,
+                               data_attribute_name=data_attribute_name,
+                               qos=self.qos, retain=self.retain, encoder=encoder,
+                               queue_size=self._queue_size, congestion_policy=self._congestion_policy,
+                               qos_attribute_name=self._qos_attribute_name)
+        sink = self._isolated(stream).for_each(self._op, name=name)
+        self._place(sink)
+        return sink
+
     def populate(self, topology, stream, name, **options):
-        self._check_types()
-        self._check_adjust()
-        spl_params = self.create_spl_params(topology)
+        with build_phase('populate'):
+            return self._populate(topology, stream, name)
+
+    def _populate(self, topology, stream, name):
+        with build_phase('validate'):
+            self._validate()
+        if stream.oport.schema is CommonSchema.XML:
+            raise TypeError('CommonSchema.XML is not supported by the MQTTSink')
+        if self._qos_attribute_name and self.qos is not None:
+            raise ValueError('Only one of qos or qos_attribute_name is allowed')
+        if self._lanes:
+            return self._populate_lanes(topology, stream, name)
+        with build_phase('transform'):
+            stream, data_attribute_name, encoder = self._prepare(stream)
+            stream = self._rate_limited(stream, name)
+        if self._backend == 'python':
+            return self._populate_python(topology, stream, name, data_attribute_name, encoder)
+        with build_phase('params'):
+            spl_params = self.create_spl_params(topology)
         #derive 'dataAttributeName' from schema
         schema = stream.oport.schema
         if schema is CommonSchema.Python:
@@ -587,13 +1914,98 @@ class MQTTSink(MQTTComposite, AbstractSink):
             spl_params['dataAttributeName'] = 'binary'
         # TODO add more pre-defined schemas
         else:
-            if self._data_attribute_name:
-                spl_params['dataAttributeName'] = self._data_attribute_name
+            if data_attribute_name:
+                spl_params['dataAttributeName'] = data_attribute_name
 
-        self._op = _MqttSink(stream, spl_params, name)
+        stream = self._isolated(stream)
+        if self._parallel_width:
+            if self._partition_by:
+                stream = stream.parallel(self._parallel_width, routing=streamsx.topology.topology.Routing.KEY_PARTITIONED, keys=[self._partition_key()])
+            else:
+                stream = stream.parallel(self._parallel_width)
+            # the layout grouping of composites does not support the markers of the parallel region
+            self.group = False
+
+        with build_phase('operator'):
+            self._op = _MqttSink(stream, spl_params, name)
+            self._place(self._op)
+            if self._queue_size:
+                self._threaded_port(self._op, self._queue_size, _CONGESTION_POLICIES[self._congestion_policy])
+            if self._parallel_width:
+                self._op.params['clientID'] = self._channel_client_id(topology.name + '-' + _spl_operator(self._op).name)
         return streamsx.topology.topology.Sink(self._op)
 
 
+def _copy_containers(value):
+    """
+    Returns a deep copy of the lists, sets, and dicts in `value`, which shares all other objects,
+    for example the streams of :py:attr:`~MQTTComposite.colocate_with`
+    """
+    if isinstance(value, list):
+        return [_copy_containers(item) for item in value]
+    if isinstance(value, dict):
+        return dict((key, _copy_containers(item)) for key, item in value.items())
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
+class _SinkTemplate(object):
+    """
+    Template of :py:class:`MQTTSink` instances with shared settings, created by :py:meth:`MQTTSink.template`.
+
+    The validated settings of the template become the class attributes of a private subclass of ``MQTTSink``,
+    so that a clone stores only its own settings in its instance dictionary. Lists, sets, and dicts are copied
+    into each clone, so that changing them in one clone does not change the template or the other clones.
+    """
+    def __init__(self, sink):
+        sink._check_types()
+        sink._check_adjust()
+        settings = dict(sink.__dict__)
+        self._mutable = [name for name, value in settings.items() if isinstance(value, (list, set, dict))]
+        settings['_validated'] = True
+        settings['__module__'] = MQTTSink.__module__
+        settings['__doc__'] = MQTTSink.__doc__
+        self._topic = sink._topic
+        self._topic_attribute_name = sink._topic_attribute_name
+        self._class = type(MQTTSink.__name__, (type(sink),), settings)
+
+    def clone(self, topic=None, topic_attribute_name=None, data_attribute_name=None, **options):
+        """
+        Returns a new :py:class:`MQTTSink` with the settings of the template.
+
+        Args:
+            topic(str): The topic to publish the messages to. Mutually exclusive with ``topic_attribute_name``.
+                The default is the topic of the template.
+            topic_attribute_name(str): The name of a tuple attribute denoting the destination topic.
+                The default is the topic attribute of the template.
+            data_attribute_name(str): The name of the tuple attribute containing the message data.
+                The default is the data attribute of the template.
+            **options(kwargs): Settings of the clone that differ from the template, for example ``client_id``.
+                The settings of the clone are validated again when `options` are given.
+        """
+        if topic or topic_attribute_name:
+            MQTTSink._check_topic(topic, topic_attribute_name)
+        else:
+            MQTTSink._check_topic(self._topic, self._topic_attribute_name)
+        sink = self._class.__new__(self._class)
+        for name in self._mutable:
+            setattr(sink, name, _copy_containers(getattr(self._class, name)))
+        if topic or topic_attribute_name:
+            sink._topic = topic
+            sink._topic_attribute_name = topic_attribute_name
+        if data_attribute_name:
+            sink._data_attribute_name = data_attribute_name
+        for option, value in options.items():
+            if not isinstance(getattr(MQTTSink, option, None), property):
+                raise ValueError('unknown option: ' + option)
+            setattr(sink, option, value)
+        if options:
+            sink._check_types()
+            sink._check_adjust()
+        return sink
+
+
 class MQTTSource(MQTTComposite, AbstractSource):
     """
     Represents a source for messages read from an MQTT server, which can be passed to 
@@ -601,33 +2013,85 @@ class MQTTSource(MQTTComposite, AbstractSource):
     
     Args:
         server_uri(str): The MQTT server URI
-        topics(str|list): The topic or topics to subscribe for messages.
-        schema: The schema of the created stream
+        topics(str|list|dict): The topic or topics to subscribe for messages. A dict maps topic filters to the schemas
+            of separate output streams, see :py:attr:`streams`.
+        schema: The schema of the created stream. Must be ``None`` when `topics` is a dict.
         data_attribute_name(str): The name of the tuple attribute containing the message data. ``data`` is assumed as default.
         topic_attribute_name(str): The name of a tuple attribute denoting the source topic of received messages.
         **options(kwargs): optional parameters as keyword arguments
     """
     
-    def __init__(self, server_uri, topics, schema, data_attribute_name=None, topic_attribute_name=None, **options):
+    def __init__(self, server_uri, topics, schema=None, data_attribute_name=None, topic_attribute_name=None, **options):
         MQTTComposite.__init__(self, **options)
         AbstractSource.__init__(self)
         if not topics:
             raise ValueError(topics)
-        if not server_uri:
+        if not server_uri and not options.get('connection'):
             raise ValueError(server_uri)
-        if not schema:
+        if isinstance(topics, dict):
+            if schema:
+                raise ValueError('schema must be None when topics is a dict')
+            self._outputs = self._check_outputs(topics)
+        elif not schema:
             raise ValueError(schema)
+        else:
+            self._outputs = None
         self.server_uri = server_uri
         self._schema = schema
-        self._topics = topics
+        self._topics = list(topics.keys()) if isinstance(topics, dict) else topics
+        self._streams = None
         self._topic_attribute_name = topic_attribute_name
         self._data_attribute_name = data_attribute_name
         self._qos = None
         self._message_queue_size = 500
+        self._parallel_width = None
+        self._share_group = None
         if 'qos' in options:
             self.qos = options.get('qos')
         if 'message_queue_size' in options:
             self.message_queue_size = options.get('message_queue_size')
+        self._overflow_policy = 'block'
+        self._buffer_operator_name = None
+        if 'overflow_policy' in options:
+            self.overflow_policy = options.get('overflow_policy')
+        if 'parallel_width' in options:
+            self.parallel_width = options.get('parallel_width')
+        if 'share_group' in options:
+            self.share_group = options.get('share_group')
+        self._unbatch = False
+        self._batch_format = 'length_prefixed'
+        if 'unbatch' in options:
+            self.unbatch = options.get('unbatch')
+        if 'batch_format' in options:
+            self.batch_format = options.get('batch_format')
+        self._decompress = False
+        if 'decompress' in options:
+            self.decompress = options.get('decompress')
+        self._reassemble = False
+        self._reassembly_max_bytes = _REASSEMBLY_MAX_BYTES
+        self._reassembly_timeout_seconds = _REASSEMBLY_TIMEOUT_SECONDS
+        if 'reassemble' in options:
+            self.reassemble = options.get('reassemble')
+        if 'reassembly_max_bytes' in options:
+            self.reassembly_max_bytes = options.get('reassembly_max_bytes')
+        if 'reassembly_timeout_seconds' in options:
+            self.reassembly_timeout_seconds = options.get('reassembly_timeout_seconds')
+        self._payload_format = None
+        self._field_map = None
+        if 'payload_format' in options:
+            self.payload_format = options.get('payload_format')
+        if 'field_map' in options:
+            self.field_map = options.get('field_map')
+        self._dedupe_window = None
+        self._dedupe_seconds = None
+        self._dedupe_key = 'payload'
+        self._dedupe_operator_names = []
+        if 'dedupe_window' in options:
+            self.dedupe_window = options.get('dedupe_window')
+        if 'dedupe_seconds' in options:
+            self.dedupe_seconds = options.get('dedupe_seconds')
+        if 'dedupe_key' in options:
+            self.dedupe_key = options.get('dedupe_key')
         self._op = None
         
     @property
@@ -691,6 +2155,624 @@ class MQTTSource(MQTTComposite, AbstractSource):
             raise ValueError(message_queue_size)
         self._message_queue_size = message_queue_size
 
+    @property
+    def overflow_policy(self):
+        """
+        str: What happens when the receive buffer of :py:attr:`message_queue_size` messages is full.
+        ``'block'`` (the default) stops fetching messages from the MQTT server until there is room in the buffer,
+        so that no message is lost, but the backlog builds up on the server.
+        ``'drop_oldest'`` drops the oldest buffered message and ``'drop_newest'`` drops the received message,
+        so that the client keeps receiving while the downstream processing is slow.
+
+        With ``backend='python'`` the dropped messages and the maximum number of buffered messages are counted by the
+        custom metrics ``nDroppedMessages`` and ``maxQueuedMessages`` of the source operator.
+        With ``backend='java'`` the messages are passed through a buffer of :py:attr:`message_queue_size` messages
+        behind the source operator, an SPL ``Filter`` with a threaded input port, whose system metrics ``nTuplesDropped``
+        and ``maxItemsQueued`` provide the counts. Both operators are included in :py:meth:`metrics`.
+        Sources with a drop policy do not share their subscriptions with other sources, see :py:func:`coalesce_subscriptions`.
+
+        Example::
+
+            telemetry = topo.source(MQTTSource('tcp://host.domain:1883', 'sensors/#', CommonSchema.Json,
+                                               message_queue_size=10000, overflow_policy='drop_oldest'))
+        """
+        return self._overflow_policy
+
+    @overflow_policy.setter
+    def overflow_policy(self, overflow_policy: str):
+        if overflow_policy not in _OVERFLOW_POLICIES:
+            raise ValueError("overflow_policy must be 'block', 'drop_oldest', or 'drop_newest'")
+        self._overflow_policy = overflow_policy
+
+    @property
+    def parallel_width(self):
+        """
+        int: The number of parallel channels of the source. When set, the source is placed into a parallel region
+        with *n* channels, each running its own MQTT client. The channels subscribe with
+        shared subscriptions (``$share/<share_group>/<topic>``), so that the MQTT server distributes the messages
+        across the channels. The channels are merged into a single output stream.
+        The MQTT server must support shared subscriptions. The default is ``None`` (no parallel region).
+
+        Example::
+
+            mqttSource = MQTTSource('tcp://host.domain:1883', 'sensors/#', CommonSchema.String)
+            mqttSource.parallel_width = 4
+            mqttSource.share_group = 'ingest'
+        """
+        return self._parallel_width
+
+    @parallel_width.setter
+    def parallel_width(self, parallel_width: int):
+        if parallel_width is not None:
+            if not isinstance(parallel_width, int):
+                raise TypeError(parallel_width)
+            if parallel_width < 1:
+                raise ValueError(parallel_width)
+        self._parallel_width = parallel_width
+
+    @property
+    def share_group(self):
+        """
+        str: The name of the shared subscription group used when :py:attr:`parallel_width` is set.
+        The client ID of each channel is derived from the :py:attr:`client_id` (or the share group
+        when no client ID is given) and the channel number, for example ``ingest-0``, ``ingest-1``.
+        By default the share group is derived from the topology name and the operator name.
+        """
+        return self._share_group
+
+    @share_group.setter
+    def share_group(self, share_group: str):
+        if share_group is not None:
+            if not isinstance(share_group, str):
+                raise TypeError(share_group)
+            if not share_group or any(c in share_group for c in '/+#'):
+                raise ValueError('share_group must not be empty or contain /, +, or #')
+        self._share_group = share_group
+
+    @property
+    def unbatch(self):
+        """
+        bool: When ``True``, each received message is split into the tuples that an :py:class:`MQTTSink`
+        with :py:attr:`~MQTTSink.batch_size` or :py:attr:`~MQTTSink.batch_timeout_ms` packed into the message.
+        The :py:attr:`batch_format` must match the format of the sink. The default is ``False``.
+        """
+        return self._unbatch
+
+    @unbatch.setter
+    def unbatch(self, unbatch: bool):
+        self._unbatch = unbatch
+
+    @property
+    def batch_format(self):
+        """
+        str: The format of batched messages when :py:attr:`unbatch` is ``True``,
+        ``'length_prefixed'`` (the default) or ``'json'``. See :py:attr:`MQTTSink.batch_format`.
+        """
+        return self._batch_format
+
+    @batch_format.setter
+    def batch_format(self, batch_format: str):
+        _check_batch_format(batch_format)
+        self._batch_format = batch_format
+
+    @property
+    def decompress(self):
+        """
+        bool: When ``True``, messages compressed by an :py:class:`MQTTSink` with :py:attr:`~MQTTSink.compression`
+        are detected by their header and decompressed. Messages without compression header are passed unchanged.
+        The default is ``False``.
+        """
+        return self._decompress
+
+    @decompress.setter
+    def decompress(self, decompress: bool):
+        self._decompress = decompress
+
+    @property
+    def reassemble(self):
+        """
+        bool: When ``True``, the chunks of messages split by an :py:class:`MQTTSink` with :py:attr:`~MQTTSink.max_message_bytes`
+        are detected by their header and reassembled, before they are decompressed and unbatched.
+        A tuple is submitted when the last missing chunk of a message is received. Messages without chunk header are passed unchanged.
+        The incomplete messages are held in a table bounded by :py:attr:`reassembly_max_bytes` and :py:attr:`reassembly_timeout_seconds`,
+        and incomplete messages that exceed a bound are dropped, oldest first.
+        The custom metrics ``nReassembledMessages``, ``nEvictedChunkSets``, and ``reassemblyBytes`` count the reassembled and dropped
+        messages and the bytes held. The default is ``False``.
+
+        The chunks of a message must be received by the same source, so that ``reassemble`` is not supported with shared subscriptions
+        of the ``topics`` or a :py:attr:`share_group`. With a :py:attr:`parallel_width`, the messages are reassembled behind the parallel region.
+
+        Example::
+
+            images = topo.source(MQTTSource('tcp://host.domain:1883', 'images', CommonSchema.Binary,
+                                            reassemble=True, reassembly_timeout_seconds=10))
+        """
+        return self._reassemble
+
+    @reassemble.setter
+    def reassemble(self, reassemble: bool):
+        self._reassemble = reassemble
+
+    @property
+    def reassembly_max_bytes(self):
+        """
+        int: The maximum number of bytes of incomplete messages held for reassembly when :py:attr:`reassemble` is ``True``.
+        The default is 64 MB.
+        """
+        return self._reassembly_max_bytes
+
+    @reassembly_max_bytes.setter
+    def reassembly_max_bytes(self, reassembly_max_bytes: int):
+        if reassembly_max_bytes <= 0:
+            raise ValueError(reassembly_max_bytes)
+        self._reassembly_max_bytes = reassembly_max_bytes
+
+    @property
+    def reassembly_timeout_seconds(self):
+        """
+        float: The time in seconds after the first chunk of a message within which all chunks must be received
+        when :py:attr:`reassemble` is ``True``. Older incomplete messages are dropped when the next chunk is received.
+        The default is 60 seconds.
+        """
+        return self._reassembly_timeout_seconds
+
+    @reassembly_timeout_seconds.setter
+    def reassembly_timeout_seconds(self, reassembly_timeout_seconds: float):
+        if reassembly_timeout_seconds <= 0:
+            raise ValueError(reassembly_timeout_seconds)
+        self._reassembly_timeout_seconds = reassembly_timeout_seconds
+
+    @property
+    def payload_format(self):
+        """
+        str: Deserializes the message payload into the attributes of the structured output schema,
+        so that no ``map`` is required behind the source. ``'json'`` expects a JSON object, whose values are assigned
+        to the attributes with the same name or the key given by :py:attr:`field_map`. Missing values get the default
+        value of the attribute type, for example ``0`` or the empty string.
+        ``'struct'`` expects the fixed binary layout published by an :py:class:`MQTTSink` with the same
+        :py:attr:`~MQTTSink.payload_format`, with all attributes in schema order except the ``topic_attribute_name``.
+        Messages that cannot be deserialized, for example invalid JSON, are dropped and counted
+        by the custom metric ``nMalformedMessages``.
+        Mutually exclusive with ``data_attribute_name``. The default is ``None``.
+
+        With ``backend='python'`` the source operator deserializes the payload. With the Java MQTTSource operator,
+        JSON payloads are parsed by the ``JSONToTuple`` operator of the ``com.ibm.streamsx.json`` toolkit, which assigns
+        the values of the keys with the attribute names, so that no Python operator is added.
+
+        .. warning:: With the Java MQTTSource operator, ``'struct'`` payloads, a :py:attr:`field_map` with keys that
+            differ from the attribute names, and the payloads of batched, compressed, or chunked messages are
+            deserialized by a Python operator behind the source operator, which converts each message into a Python
+            object. Use ``backend='python'`` to deserialize them in the source operator.
+
+        Example::
+
+            schema = 'tuple<rstring device, int64 ts, float64 value>'
+            readings = topo.source(MQTTSource('tcp://host.domain:1883', 'sensors/#', schema,
+                                              payload_format='json', field_map={'value': 'reading.value'}))
+        """
+        return self._payload_format
+
+    @payload_format.setter
+    def payload_format(self, payload_format: str):
+        if payload_format is not None and payload_format not in _PAYLOAD_FORMATS:
+            raise ValueError("payload_format must be 'json' or 'struct'")
+        self._payload_format = payload_format
+
+    @property
+    def field_map(self):
+        """
+        dict: Maps attribute names of the output schema to the keys of the JSON object when the
+        :py:attr:`payload_format` is ``'json'``. Dots in a key denote nested objects, for example
+        ``{'value': 'reading.value'}`` assigns ``42.0`` of ``{"reading": {"value": 42.0}}`` to the attribute ``value``.
+        Attributes that are not in the dict are assigned from the key with the attribute name. The default is ``None``.
+        """
+        return self._field_map
+
+    @field_map.setter
+    def field_map(self, field_map: dict):
+        if field_map is not None:
+            if not isinstance(field_map, dict):
+                raise TypeError(field_map)
+            for name, key in field_map.items():
+                if not isinstance(name, str) or not isinstance(key, str):
+                    raise TypeError(field_map)
+                if not key or '' in key.split('.'):
+                    raise ValueError('invalid key of field_map: ' + repr(key))
+            field_map = dict(field_map)
+        self._field_map = field_map
+
+    @property
+    def dedupe_window(self):
+        """
+        int: Drops received messages whose :py:attr:`dedupe_key` equals the key of one of the last *N* messages,
+        for example the messages that the MQTT server redelivers with ``qos=1`` after a reconnect.
+        Attribute keys that are numbers or strings are kept as they are, payloads by their 64-bit BLAKE2b digest,
+        so that the memory is bounded by the window; when the window is full,
+        the oldest key is evicted. The dropped messages are counted by the custom metric ``nDuplicateMessages``
+        of the filter operator behind the source, which is included in :py:meth:`metrics`.
+        The default is ``None``, which disables the duplicate suppression unless :py:attr:`dedupe_seconds` is set.
+
+        Example::
+
+            readings = topo.source(MQTTSource('tcp://host.domain:1883', 'sensors/#', CommonSchema.Json, qos=1,
+                                              dedupe_window=100000, dedupe_seconds=60))
+        """
+        return self._dedupe_window
+
+    @dedupe_window.setter
+    def dedupe_window(self, dedupe_window: int):
+        if dedupe_window is not None:
+            if not isinstance(dedupe_window, int):
+                raise TypeError(dedupe_window)
+            if dedupe_window < 1:
+                raise ValueError(dedupe_window)
+        self._dedupe_window = dedupe_window
+
+    @property
+    def dedupe_seconds(self):
+        """
+        float: Evicts the keys of the duplicate suppression after the given number of seconds, so that only duplicates
+        received within this time are dropped. When the :py:attr:`dedupe_window` is not set, at most
+        100000 keys are kept. The default is ``None``.
+        """
+        return self._dedupe_seconds
+
+    @dedupe_seconds.setter
+    def dedupe_seconds(self, dedupe_seconds: float):
+        if dedupe_seconds is not None and dedupe_seconds <= 0:
+            raise ValueError(dedupe_seconds)
+        self._dedupe_seconds = dedupe_seconds
+
+    @property
+    def dedupe_key(self):
+        """
+        str: The key of the duplicate suppression. ``'payload'`` (the default) compares the message data,
+        which is the data attribute of structured schemas or the complete tuple with a :py:attr:`payload_format`.
+        The name of an attribute of a structured schema compares the attribute values, for example a message ID.
+        """
+        return self._dedupe_key
+
+    @dedupe_key.setter
+    def dedupe_key(self, dedupe_key: str):
+        if not isinstance(dedupe_key, str):
+            raise TypeError(dedupe_key)
+        if not dedupe_key:
+            raise ValueError(dedupe_key)
+        self._dedupe_key = dedupe_key
+
+    @property
+    def streams(self):
+        """
+        dict: The output streams by stream name when the `topics` are given as dict. The dict maps
+        each topic filter to the schema of its output stream, or to a tuple (stream name, schema).
+        The stream name defaults to the topic filter. All topics are subscribed with a single MQTT connection,
+        and each received message is submitted to the output stream of the first filter in the dict that matches its topic.
+        ``Topology.source()`` returns the output stream of the first filter. Messages matching no filter, for example
+        retained messages of overlapping subscriptions of other clients, are dropped.
+        The streams are available after the source is added to the topology; the default is ``None``.
+
+        Example::
+
+            src = MQTTSource('tcp://host.domain:1883', {
+                'sensors/+/temperature': ('temperature', 'tuple<rstring data, rstring topic>'),
+                'alerts/#': ('alerts', CommonSchema.Json)}, topic_attribute_name='topic')
+            topo.source(src)
+            temperatures = src.streams['temperature']
+            alerts = src.streams['alerts']
+        """
+        return self._streams
+
+    @staticmethod
+    def _check_outputs(topics):
+        """
+        Returns the list of tuples (topic filter, stream name, schema) of a dict of topic filters
+        """
+        from streamsx.mqtt._functions import TopicFilterTrie
+        outputs = []
+        for topic_filter, output in topics.items():
+            if not isinstance(topic_filter, str):
+                raise TypeError(topic_filter)
+            stream_name, schema = output if isinstance(output, tuple) else (topic_filter, output)
+            if not schema:
+                raise ValueError(output)
+            # validates the filter
+            TopicFilterTrie().add(MQTTSource._unshared(topic_filter), None)
+            outputs.append((topic_filter, stream_name, schema))
+        return outputs
+
+    @staticmethod
+    def _unshared(topic_filter):
+        """
+        Returns the topic filter of a shared subscription ``$share/<group>/<filter>``
+        """
+        if topic_filter.startswith('$share/'):
+            return topic_filter.split('/', 2)[2]
+        return topic_filter
+
+    def _user_schema(self):
+        schema = self._schema[0] if isinstance(self._schema, list) else self._schema
+        if schema is CommonSchema.Python or schema is CommonSchema.XML:
+            raise TypeError('{} is not supported by the MQTTSource'.format(schema))
+        return streamsx.topology.schema._normalize(schema)
+
+    def _decoder(self, schema):
+        """
+        Returns the payload decoder for tuples of `schema`, or ``None`` when :py:attr:`payload_format` is not set
+        """
+        if not self._payload_format:
+            if self._field_map:
+                raise ValueError('field_map requires the payload_format')
+            return None
+        from streamsx.mqtt._functions import _PayloadDecoder, schema_attributes, struct_layout
+        if _engine_style(schema) != 'struct':
+            raise TypeError('payload_format requires a structured schema: ' + str(schema))
+        if self._data_attribute_name:
+            raise ValueError('Only one of payload_format or data_attribute_name is allowed')
+        attributes = [(type_, name) for type_, name in schema_attributes(schema) if name != self._topic_attribute_name]
+        if self._field_map:
+            if self._payload_format != 'json':
+                raise ValueError("field_map requires payload_format='json'")
+            names = [name for _, name in attributes]
+            for name in self._field_map:
+                if name not in names:
+                    raise ValueError("field_map attribute '{}' is not an attribute of {}".format(name, schema))
+        if self._payload_format == 'struct':
+            return _PayloadDecoder('struct', attributes, layout=struct_layout(attributes))
+        for type_, name in attributes:
+            if type_ == 'blob':
+                raise TypeError("attribute '{}' of type blob is not supported by payload_format='json'".format(name))
+        return _PayloadDecoder('json', attributes, self._field_map)
+
+    def _parses_json(self):
+        """
+        Returns ``True`` when the JSON payload received by the Java MQTTSource operator is parsed into the
+        output schema by the JSONToTuple operator of the JSON toolkit
+        """
+        if self._backend == 'python' or self._payload_format != 'json' or self._outputs:
+            return False
+        if self._unbatch or self._decompress or self._reassemble:
+            return False
+        # JSONToTuple assigns the values of the keys with the names of the attributes
+        return not self._field_map or all(name == key for name, key in self._field_map.items())
+
+    def _decodes(self):
+        """
+        Returns ``True`` when the received messages are converted by a Python operator behind the source operator
+        """
+        if self._unbatch or self._decompress or self._reassemble:
+            return True
+        return self._payload_format is not None and self._backend != 'python' and not self._parses_json()
+
+    def _parsed(self, stream):
+        """
+        Returns `stream` of JSON payloads parsed into the output schema by the JSONToTuple operator.
+        The messages that cannot be parsed are counted by the custom metric ``nMalformedMessages``.
+        """
+        import streamsx.spl.toolkit
+        from streamsx.mqtt._functions import _CountMalformed
+        topology = stream.topology
+        schema = self._user_schema()
+        # validates the schema and the field_map
+        self._decoder(schema)
+        streamsx.spl.toolkit.add_toolkit_dependency(topology, _JSON_TOOLKIT_NAME, _JSON_TOOLKIT_VERSIONS)
+        parse = streamsx.spl.op.Invoke(topology, _JSON_TOOLKIT_NAME + '::JSONToTuple', [stream],
+                                       schemas=[schema, stream.oport.schema],
+                                       params={'jsonStringAttribute': 'jsonString', 'ignoreParsingError': True},
+                                       name=unique_name(topology, self._operator_name + '_parse'))
+        parse.outputs[1].for_each(_CountMalformed(), name=unique_name(topology, self._operator_name + '_malformed'))
+        return parse.outputs[0]
+
+    def _message_schema(self):
+        """
+        Returns a tuple (schema, data_attribute_name) for the stream of received messages
+        """
+        if self._outputs:
+            return 'tuple<blob data, rstring ' + self._raw_topic_attribute_name() + '>', 'data'
+        if self._parses_json():
+            self._user_schema()
+            if self._topic_attribute_name:
+                return 'tuple<rstring jsonString, rstring ' + self._topic_attribute_name + '>', 'jsonString'
+            return 'tuple<rstring jsonString>', 'jsonString'
+        if self._decodes():
+            self._user_schema()
+            if self._topic_attribute_name:
+                return 'tuple<blob data, rstring ' + self._topic_attribute_name + '>', 'data'
+            return 'tuple<blob data>', 'data'
+        return self._schema, self._data_attribute_name
+
+    def _decoded(self, stream, schema, message_topic_attribute_name=None):
+        """
+        Converts the stream of received messages into a stream of `schema`
+        """
+        from streamsx.mqtt._functions import _Decode, _is_blob_attribute
+        data_attribute_name = self._data_attribute_name if self._data_attribute_name else 'data'
+        decode = _Decode(_engine_style(schema), data_attribute_name, self._topic_attribute_name,
+                         batch_format=self._batch_format if self._unbatch else None, decompress=self._decompress,
+                         data_as_blob=_is_blob_attribute(schema, data_attribute_name),
+                         message_topic_attribute_name=message_topic_attribute_name,
+                         decoder=self._decoder(schema), reassembler=self._reassembler())
+        return stream.flat_map(decode).map(schema=schema)
+
+    def _reassembler(self):
+        """
+        Returns the reassembly table of chunked messages, or ``None`` when :py:attr:`reassemble` is not set
+        """
+        if not self._reassemble:
+            return None
+        from streamsx.mqtt._functions import _Reassemble
+        return _Reassemble(self._reassembly_max_bytes, self._reassembly_timeout_seconds)
+
+    def _deduplicated(self, stream):
+        """
+        Returns `stream` without the duplicates of the :py:attr:`dedupe_window` and :py:attr:`dedupe_seconds`
+        """
+        if not self._dedupe_window and not self._dedupe_seconds:
+            return stream
+        from streamsx.mqtt._functions import _Dedupe, schema_attributes
+        schema = stream.oport.schema
+        structured = _engine_style(schema) == 'struct'
+        if self._dedupe_key != 'payload':
+            if not structured:
+                raise TypeError('dedupe_key requires a structured schema: ' + str(schema))
+            if self._dedupe_key not in [name for _, name in schema_attributes(schema)]:
+                raise ValueError("dedupe_key '{}' is not an attribute of {}".format(self._dedupe_key, schema))
+            attribute_name = self._dedupe_key
+        elif structured and not self._payload_format:
+            attribute_name = self._data_attribute_name if self._data_attribute_name else 'data'
+        else:
+            attribute_name = None
+        window = self._dedupe_window if self._dedupe_window else _DEDUPE_WINDOW
+        stream = stream.filter(_Dedupe(window, self._dedupe_seconds, attribute_name),
+                               name=unique_name(stream.topology, self._operator_name + '_dedupe'))
+        self._dedupe_operator_names.append(stream.oport.operator.name)
+        return stream
+
+    def _demultiplexed(self, stream, message_topic_attribute_name):
+        """
+        Splits the stream of received messages into the output streams of the topic filters
+        """
+        from streamsx.mqtt._functions import _Route
+        topic_filters = [self._unshared(topic_filter) for topic_filter, _, _ in self._outputs]
+        route = _Route(topic_filters, message_topic_attribute_name)
+        outputs = stream.split(len(self._outputs), route)
+        self._streams = dict()
+        for (_, stream_name, schema), output in zip(self._outputs, outputs):
+            if schema is CommonSchema.Python or schema is CommonSchema.XML:
+                raise TypeError('{} is not supported by the MQTTSource'.format(schema))
+            decoded = self._decoded(output, streamsx.topology.schema._normalize(schema), message_topic_attribute_name)
+            self._streams[stream_name] = self._deduplicated(decoded)
+        return self._streams[self._outputs[0][1]]
+
+    def _raw_topic_attribute_name(self):
+        return self._topic_attribute_name if self._topic_attribute_name else 'topic'
+
+    def _complete(self, stream):
+        """
+        Adds the transformations behind the source and returns the output stream of the composite
+        """
+        with build_phase('transform'):
+            if self._outputs:
+                return self._demultiplexed(stream, self._raw_topic_attribute_name())
+            if self._decodes():
+                stream = self._decoded(stream, self._user_schema())
+            elif self._parses_json():
+                stream = self._parsed(stream)
+            return self._deduplicated(stream)
+
+    def _buffered(self, topology, stream):
+        """
+        Returns `stream` passed through a buffer that drops messages by the :py:attr:`overflow_policy`,
+        so that the submission of the source operator does not block
+        """
+        if self._overflow_policy == 'block':
+            return stream
+        buffer = streamsx.spl.op.Map('spl.relational::Filter', stream,
+                                     name=unique_name(topology, self._operator_name + '_buffer'))
+        self._threaded_port(buffer, self._message_queue_size, _OVERFLOW_POLICIES[self._overflow_policy])
+        self._buffer_operator_name = _spl_operator(buffer).name
+        return buffer.stream
+
+    def _operator_names(self):
+        names = MQTTComposite._operator_names(self)
+        if self._buffer_operator_name:
+            names.append(self._buffer_operator_name)
+        names.extend(self._dedupe_operator_names)
+        return names
+
+    def _topic_list(self):
+        return self._topics if isinstance(self._topics, list) else [self._topics]
+
+    def _coalescable(self):
+        if self._parallel_width or isinstance(self.qos, list) or self._overflow_policy != 'block':
+            return False
+        return not any(t.startswith('$share/') for t in self._topic_list())
+
+    def _routed_assignments(self):
+        """
+        Returns a tuple (data_type, schema, assignments) when an SPL Functor converts the messages of the shared
+        source operator into the schema of the received messages, with the output assignments from the attributes
+        of the shared operator, or ``None`` when the messages are converted by Python operators
+        """
+        if self._outputs or self._decodes():
+            return None
+        if self._parses_json():
+            schema, data_attribute_name = self._message_schema()
+            schema = streamsx.topology.schema._normalize(schema)
+        else:
+            schema = self._user_schema()
+            data_attribute_name = self._data_attribute_name if self._data_attribute_name else 'data'
+        if schema is CommonSchema.String:
+            return 'rstring', schema, {'string': 'data'}
+        if schema is CommonSchema.Json:
+            return 'rstring', schema, {'jsonString': 'data'}
+        if schema is CommonSchema.Binary:
+            return 'blob', schema, {'binary': 'data'}
+        from streamsx.mqtt._functions import schema_attributes
+        from streamsx.mqtt._subscriptions import SubscriptionGroup
+        attributes = dict((name, type_) for type_, name in schema_attributes(schema))
+        assignments = {data_attribute_name: 'data'}
+        if self._topic_attribute_name:
+            if attributes.get(self._topic_attribute_name) != 'rstring':
+                return None
+            assignments[self._topic_attribute_name] = SubscriptionGroup.TOPIC_ATTRIBUTE_NAME
+        if set(attributes) != set(assignments) or attributes[data_attribute_name] not in ('rstring', 'blob'):
+            return None
+        # output assignments are attributes of the operator invocation
+        if any(hasattr(streamsx.spl.op.Map, name) or name in ('topology', 'outputs', '_inputs') for name in assignments):
+            return None
+        return attributes[data_attribute_name], schema, assignments
+
+    def _populate_coalesced(self, topology, name):
+        """
+        Selects the messages of this source from the source operator shared by all sources with the same connection settings
+        """
+        from streamsx.mqtt._subscriptions import SubscriptionGroup, connection_key, subscription_registry, topic_condition
+        topics = self._topic_list()
+        params = self.create_spl_params(topology)
+        for param_name in ('topics', 'topicOutAttrName', 'messageQueueSize'):
+            params.pop(param_name, None)
+        routed = self._routed_assignments()
+        data_type = routed[0] if routed else 'blob'
+        tags = set(self._resource_tags) if self._resource_tags else set()
+        others = self._colocate_with if isinstance(self._colocate_with, (list, tuple)) else [self._colocate_with]
+        colocated = tuple(sorted(id(_spl_operator(other)) for other in others if other is not None))
+        placement = (colocated, self._host_pool, tuple(sorted(tags)))
+        registry = subscription_registry(topology)
+        key = (connection_key(self._backend, params, self.qos), data_type, placement)
+        group = registry.group(key)
+        if group is None:
+            group = registry.add_group(key, SubscriptionGroup(data_type))
+            params.update(group.params())
+            group.op = _MqttSource(topology, group.schema, params, name)
+            # the shared operator gets the placement of the sources of the group
+            self._op = group.op
+            self._place(group.op)
+        else:
+            self._op = group.op
+            self._operator_name = _spl_operator(group.op).name
+        group.add(topics, self.message_queue_size)
+        condition = streamsx.spl.op.Expression.expression(topic_condition(topics, SubscriptionGroup.TOPIC_ATTRIBUTE_NAME))
+        route_name = unique_name(topology, (name if name else 'MQTTSource') + '_route')
+        if routed:
+            route = streamsx.spl.op.Map('spl.relational::Functor', group.op.outputs[0], schema=routed[1],
+                                        params={'filter': condition}, name=route_name)
+            for attribute_name, value in routed[2].items():
+                setattr(route, attribute_name, route.output(value))
+            stream = self._isolated(route.stream)
+            if self._parses_json():
+                stream = self._parsed(stream)
+            return self._deduplicated(stream)
+        route = streamsx.spl.op.Map('spl.relational::Filter', group.op.outputs[0], params={'filter': condition}, name=route_name)
+        stream = self._isolated(route.stream)
+        if self._outputs:
+            return self._demultiplexed(stream, SubscriptionGroup.TOPIC_ATTRIBUTE_NAME)
+        return self._deduplicated(self._decoded(stream, self._user_schema(), SubscriptionGroup.TOPIC_ATTRIBUTE_NAME))
+
+    def _shared_topics(self, share_group):
+        topics = self._topic_list()
+        shared_prefix = '$share/' + share_group + '/'
+        return [t if t.startswith('$share/') else shared_prefix + t for t in topics]
+
     def create_spl_params(self, topology) -> dict:
         spl_params = MQTTComposite.create_spl_params(self, topology)
         if isinstance(self.qos, int):
@@ -701,8 +2783,8 @@ class MQTTSource(MQTTComposite, AbstractSource):
         if self._topics:
             spl_params['topics'] = self._topics
             
-        if self._topic_attribute_name:
-            spl_params['topicOutAttrName'] = self._topic_attribute_name
+        if self._topic_attribute_name or self._outputs:
+            spl_params['topicOutAttrName'] = self._raw_topic_attribute_name()
         spl_params['messageQueueSize'] = self._message_queue_size
         #verify that we do not setup invalid SPL parameters
         for paramName in spl_params.keys():
@@ -710,30 +2792,86 @@ class MQTTSource(MQTTComposite, AbstractSource):
                 raise AttributeError('illegal operator parameter: {}'.format(paramName))
         return spl_params
 
+    def _populate_python(self, topology, name, schema, data_attribute_name, coalesce=False):
+        from streamsx.mqtt._engine import _EngineSource
+        from streamsx.mqtt._functions import _is_blob_attribute
+        self._check_python_backend()
+        if self._parallel_width:
+            raise ValueError("parallel_width is not supported by the 'python' backend")
+        schema = schema[0] if isinstance(schema, list) else schema
+        if schema is CommonSchema.Python or schema is CommonSchema.XML:
+            raise TypeError('{} is not supported by the MQTTSource'.format(schema))
+        schema = streamsx.topology.schema._normalize(schema)
+        # the decode stage behind the source deserializes the payload of batched, compressed, and demultiplexed messages
+        decoder = None if self._outputs or self._decodes() else self._decoder(schema)
+        data_attribute_name = data_attribute_name if data_attribute_name else 'data'
+        name = unique_name(topology, name if name else _EngineSource.__name__)
+        params = self._engine_params()
+        params['client_id'] = self._session_client_id(topology, name)
+        self._op = _EngineSource(params, _engine_style(schema), self._topics,
+                                 qos=self.qos, message_queue_size=self.message_queue_size,
+                                 data_attribute_name=data_attribute_name,
+                                 topic_attribute_name=self._raw_topic_attribute_name() if self._outputs else self._topic_attribute_name,
+                                 data_as_blob=_is_blob_attribute(schema, data_attribute_name),
+                                 overflow_policy=self._overflow_policy, decoder=decoder, coalesce=coalesce)
+        stream = topology.source(self._op, name=name)
+        self._place(stream)
+        return self._isolated(stream).map(schema=schema)
+
     def populate(self, topology, name, **options):
-        self._check_types()
-        self._check_adjust()
-        spl_params = self.create_spl_params(topology)
+        with build_phase('populate'):
+            return self._populate(topology, name)
+
+    def _populate(self, topology, name):
+        with build_phase('validate'):
+            self._validate()
+            if self._field_map and not self._payload_format:
+                raise ValueError('field_map requires the payload_format')
+            if self._reassemble and (self._share_group or any(t.startswith('$share/') for t in self._topic_list())):
+                raise ValueError('reassemble is not supported with shared subscriptions')
+        coalesce = _coalescing(topology) and self._coalescable()
+        schema, data_attribute_name = self._message_schema()
+        if self._backend == 'python':
+            return self._complete(self._populate_python(topology, name, schema, data_attribute_name, coalesce))
+        if coalesce:
+            return self._populate_coalesced(topology, name)
+        with build_phase('params'):
+            spl_params = self.create_spl_params(topology)
         #derive 'dataAttributeName' from schema
-        if self._schema is CommonSchema.Python:
+        if schema is CommonSchema.Python:
             spl_params['dataAttributeName'] = '__spl_po'
             raise TypeError('CommonSchema.Python is not supported by the MQTTSource')
-        elif self._schema is CommonSchema.XML:
+        elif schema is CommonSchema.XML:
             spl_params['dataAttributeName'] = 'document'
             raise TypeError('CommonSchema.XML is not supported by the MQTTSource')
-        elif self._schema is CommonSchema.Json:
+        elif schema is CommonSchema.Json:
             spl_params['dataAttributeName'] = 'jsonString'
-        elif self._schema is CommonSchema.String:
+        elif schema is CommonSchema.String:
             spl_params['dataAttributeName'] = 'string'
-        elif self._schema is CommonSchema.Binary:
+        elif schema is CommonSchema.Binary:
             spl_params['dataAttributeName'] = 'binary'
         # TODO add more pre-defined schemas
         else:
-            if self._data_attribute_name:
-                spl_params['dataAttributeName'] = self._data_attribute_name
-
-        self._op = _MqttSource(topology, self._schema, spl_params, name)
-        return self._op.outputs[0]
+            if data_attribute_name:
+                spl_params['dataAttributeName'] = data_attribute_name
+
+        with build_phase('operator'):
+            self._op = _MqttSource(topology, schema, spl_params, name)
+            self._place(self._op)
+            stream = self._op.outputs[0]
+            if self._parallel_width:
+                # every channel subscribes with a shared subscription and gets its own client ID
+                share_group = self._share_group
+                if not share_group:
+                    share_group = topology.name + '-' + _spl_operator(self._op).name
+                self._op.params['topics'] = self._shared_topics(share_group)
+                self._op.params['clientID'] = self._channel_client_id(share_group)
+                stream.set_parallel(self._parallel_width)
+                stream = stream.end_parallel()
+                # the layout grouping of composites does not support the markers of the parallel region
+                self.group = False
+            stream = self._buffered(topology, stream)
+        return self._complete(self._isolated(stream))
 
 
 class _MqttSource(streamsx.spl.op.Source):
@@ -750,7 +2888,7 @@ class _MqttSource(streamsx.spl.op.Source):
     def __init__(self, topology, schema, spl_params, name=None):
         kind="com.ibm.streamsx.mqtt::MQTTSource"
         schemas = schema
-        super(_MqttSource, self).__init__(topology, kind, schemas, spl_params, name)
+        super(_MqttSource, self).__init__(topology, kind, schemas, spl_params, unique_name(topology, name if name else 'MQTTSource'))
 
 
 class _MqttSink(streamsx.spl.op.Sink):
@@ -764,5 +2902,5 @@ class _MqttSink(streamsx.spl.op.Sink):
 
     def __init__(self, stream, spl_params, name=None):
         kind = "com.ibm.streamsx.mqtt::MQTTSink"
-        super(_MqttSink, self).__init__(kind, stream, spl_params, name)
+        super(_MqttSink, self).__init__(kind, stream, spl_params, unique_name(stream.topology, name if name else 'MQTTSink'))
 
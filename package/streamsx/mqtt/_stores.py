@@ -0,0 +1,220 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Persistent cache for the truststores and keystores generated from PEM certificates and keys.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+
+_CACHE_DIR_ENV = 'STREAMSX_MQTT_CACHE_DIR'
+_DEFAULT_MAX_ENTRIES = 64
+
+# copies of the cached stores that the builds of this process reference, by the path of the cached store
+_build_copies = dict()
+_build_copies_lock = threading.Lock()
+_build_dir = None
+
+
+def _default_cache_dir():
+    if os.environ.get(_CACHE_DIR_ENV):
+        return os.environ[_CACHE_DIR_ENV]
+    cache_home = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'streamsx.mqtt')
+
+
+def _read_pem(pem):
+    """
+    Returns the content of a PEM string or a filename with PEM content as bytes
+    """
+    if os.path.isfile(pem):
+        with open(pem, 'rb') as f:
+            return f.read()
+    return pem.encode('utf-8')
+
+
+def pem_digest(kind, pems):
+    """
+    Returns a hash of the store kind and the contents of the given PEM strings or files
+    """
+    digest = hashlib.sha256(kind.encode('utf-8'))
+    for pem in pems:
+        content = _read_pem(pem)
+        digest.update(len(content).to_bytes(8, 'big'))
+        digest.update(content)
+    return digest.hexdigest()
+
+
+class StoreCache(object):
+    """
+    Content addressed cache of JKS stores. A store is named ``<kind>-<hash>.jks``, where the hash is computed
+    from the PEM inputs. The password of the store is kept in a ``.pass`` file next to the store.
+    The least recently used stores are evicted when more than `max_entries` stores are cached.
+    A lock file in the cache directory serializes the creation and eviction of stores of concurrent builds,
+    so that a store is always read with its own password.
+    The returned path is a copy of the cached store in a temporary directory of the process, which is not evicted,
+    so that the eviction by a concurrent build cannot remove a store before the bundle of a topology is assembled.
+    """
+    def __init__(self, directory=None, max_entries=_DEFAULT_MAX_ENTRIES):
+        self.directory = directory if directory else _default_cache_dir()
+        self.max_entries = max_entries
+
+    def get(self, kind, pems, create):
+        """
+        Returns a tuple (path, password) for a store created from `pems`.
+        When the store is not cached, ``create(path)`` is called to create the store; it must return the password.
+        """
+        basename = kind + '-' + pem_digest(kind, pems)[:32] + '.jks'
+        path = os.path.join(self.directory, basename)
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        with self._locked(fcntl.LOCK_SH):
+            password = self._cached(path)
+            if password is not None:
+                return self._copy(path, password)
+        with self._locked(fcntl.LOCK_EX):
+            # another build may have created the store while this build waited for the lock
+            password = self._cached(path)
+            if password is None:
+                password = self._create(path, create)
+            copy = self._copy(path, password)
+            self._evict()
+        return copy
+
+    @staticmethod
+    def _copy(path, password):
+        """
+        Returns a tuple (path, password) of the copy of the cached store at `path` in the build directory of the process.
+        The copy is made once, so that the stores referenced by the topologies of the process do not change.
+        """
+        global _build_dir
+        path = os.path.abspath(path)
+        with _build_copies_lock:
+            if path not in _build_copies:
+                if _build_dir is None:
+                    _build_dir = tempfile.mkdtemp(prefix='streamsx-mqtt-stores-')
+                # the copies keep the store name, in one directory per cache directory
+                copy_dir = os.path.join(_build_dir, hashlib.sha256(os.path.dirname(path).encode('utf-8')).hexdigest()[:16])
+                os.makedirs(copy_dir, mode=0o700, exist_ok=True)
+                copy_path = os.path.join(copy_dir, os.path.basename(path))
+                shutil.copyfile(path, copy_path)
+                _build_copies[path] = (copy_path, password)
+            return _build_copies[path]
+
+    @contextlib.contextmanager
+    def _locked(self, operation):
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _cached(path):
+        """
+        Returns the password of the cached store at `path`, or ``None`` when the store is not cached
+        """
+        password_path = path + '.pass'
+        if not os.path.isfile(path) or not os.path.isfile(password_path):
+            return None
+        with open(password_path, 'r') as f:
+            password = f.read()
+        # the modification time tracks the last use
+        os.utime(path)
+        return password
+
+    def _create(self, path, create):
+        # the files are created under temporary names and renamed, so that an interrupted build leaves no partial files
+        fd, tmp_path = tempfile.mkstemp(suffix='.jks.tmp', dir=self.directory)
+        os.close(fd)
+        fd, tmp_password_path = tempfile.mkstemp(suffix='.pass.tmp', dir=self.directory)
+        try:
+            password = create(tmp_path)
+            with os.fdopen(fd, 'w') as f:
+                fd = None
+                f.write(password)
+            os.replace(tmp_password_path, path + '.pass')
+            os.replace(tmp_path, path)
+        finally:
+            if fd is not None:
+                os.close(fd)
+            for f in (tmp_path, tmp_password_path):
+                if os.path.exists(f):
+                    os.remove(f)
+        return password
+
+    def _evict(self):
+        stores = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.jks')]
+        if len(stores) <= self.max_entries:
+            return
+        stores.sort(key=os.path.getmtime)
+        for path in stores[:len(stores) - self.max_entries]:
+            for f in (path, path + '.pass'):
+                if os.path.exists(f):
+                    os.remove(f)
+
+
+class CredentialRegistry(object):
+    """
+    Credential files of a topology. Each unique store is created once and added once as file dependency,
+    so that all MQTT operators of a topology with the same credentials share the same file in the bundle.
+    """
+    def __init__(self, topology):
+        self._topology = weakref.ref(topology)
+        self._stores = dict()
+        self._files = dict()
+        self._extended = set()
+
+    def file_dependency(self, path):
+        """
+        Adds `path` as file dependency to the ``etc`` directory once and returns the path in the bundle
+        """
+        abspath = os.path.abspath(path)
+        if abspath not in self._files:
+            self._files[abspath] = self._topology().add_file_dependency(abspath, 'etc')
+        return self._files[abspath]
+
+    def store(self, kind, pems, new_store):
+        """
+        Returns a tuple (bundle_path, password) for a store created from `pems`.
+        ``new_store()`` is called once per unique content and must return a tuple (path, password).
+        """
+        key = pem_digest(kind, pems)
+        if key not in self._stores:
+            path, password = new_store()
+            self._stores[key] = (self.file_dependency(path), password)
+        return self._stores[key]
+
+    def extend_once(self, kind, pems, store_path, extend):
+        """
+        Calls ``extend()`` to add `pems` to the existing store at `store_path` once per topology.
+        Returns ``True`` when ``extend()`` was called.
+        """
+        key = (os.path.abspath(store_path), pem_digest(kind, pems))
+        if key in self._extended:
+            return False
+        extend()
+        self._extended.add(key)
+        return True
+
+
+_registries = weakref.WeakKeyDictionary()
+
+
+def credential_registry(topology):
+    """
+    Returns the credential registry of a topology
+    """
+    registry = _registries.get(topology)
+    if registry is None:
+        registry = CredentialRegistry(topology)
+        _registries[topology] = registry
+    return registry
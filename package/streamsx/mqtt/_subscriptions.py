@@ -0,0 +1,206 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Coalescing of the subscriptions of the MQTT sources of a topology that share their connection settings.
+"""
+
+import json
+import re
+import weakref
+
+from streamsx.mqtt._build import ResolvedParam, spl_string
+
+
+def filter_covers(covering, topic_filter):
+    """
+    Returns ``True`` when every topic matching `topic_filter` also matches the filter `covering`
+    """
+    a = covering.split('/')
+    b = topic_filter.split('/')
+    for i, level in enumerate(a):
+        # filters starting with a wildcard do not match topics starting with $
+        system = i == 0 and i < len(b) and b[i].startswith('$')
+        if level == '#':
+            return not system
+        if i >= len(b) or b[i] == '#':
+            return False
+        if level == '+':
+            if system:
+                return False
+            continue
+        if level != b[i]:
+            return False
+    return len(a) == len(b)
+
+
+def minimal_cover(topic_filters):
+    """
+    Returns the topic filters that are not covered by another filter, in the given order.
+    Of identical filters, the first one is returned.
+    """
+    cover = []
+    for i, topic_filter in enumerate(topic_filters):
+        covered = False
+        for j, other in enumerate(topic_filters):
+            if i == j:
+                continue
+            if other == topic_filter:
+                covered = j < i
+            elif filter_covers(other, topic_filter):
+                covered = True
+            if covered:
+                break
+        if not covered:
+            cover.append(topic_filter)
+    return cover
+
+
+def connection_key(backend, params, qos):
+    """
+    Returns a hashable key of the connection settings of a source, created from its
+    SPL operator or engine parameters without the subscription specific parameters
+    """
+    items = []
+    for name in sorted(params):
+        value = params[name]
+        if isinstance(value, ResolvedParam):
+            # the value is not known yet, equal settings share the parameter object
+            value = id(value)
+        elif hasattr(value, 'spl_json'):
+            value = json.dumps(value.spl_json(), sort_keys=True)
+        items.append((name, repr(value)))
+    return (backend, qos, tuple(items))
+
+
+def _filter_regex(topic_filter):
+    """
+    Returns a POSIX extended regular expression that matches the topics of a topic filter with wildcards
+    """
+    levels = topic_filter.split('/')
+    parts = []
+    for i, level in enumerate(levels):
+        if level == '#':
+            # 'a/#' matches 'a'; filters starting with a wildcard do not match topics starting with $
+            parts.append('(/.*)?' if i else '([^$].*)?')
+            break
+        if i:
+            parts.append('/')
+        if level == '+':
+            parts.append('[^/]*' if i else '([^$/][^/]*)?')
+        else:
+            parts.append(re.sub(r'([.\[\]()*+?{}|^$\\])', r'\\\1', level))
+    return '^' + ''.join(parts) + '$'
+
+
+def topic_condition(topic_filters, attribute):
+    """
+    Returns an SPL expression that is ``true`` when the topic `attribute` matches one of the topic filters
+    """
+    conditions = []
+    for topic_filter in topic_filters:
+        if '+' in topic_filter or '#' in topic_filter:
+            conditions.append('size(regexMatch({}, {})) > 0'.format(attribute, spl_string(_filter_regex(topic_filter))))
+        else:
+            conditions.append('{} == {}'.format(attribute, spl_string(topic_filter)))
+    return ' || '.join('(' + condition + ')' for condition in conditions)
+
+
+class SubscriptionGroup(object):
+    """
+    The source operator shared by the MQTT sources of a topology with the same connection settings and placement.
+    The operator submits the received messages with the schema :py:attr:`schema`. It is created once, with the
+    ``topics`` and ``messageQueueSize`` parameters resolved when the SPL graph is generated, so that it subscribes
+    to the minimal covering set of the topic filters of all sources added until then.
+    """
+    TOPIC_ATTRIBUTE_NAME = 'topic'
+
+    def __init__(self, data_type):
+        self.schema = 'tuple<' + data_type + ' data, rstring ' + self.TOPIC_ATTRIBUTE_NAME + '>'
+        self.op = None
+        self.topic_filters = []
+        self.message_queue_size = 0
+
+    @property
+    def subscribed(self):
+        return minimal_cover(self.topic_filters)
+
+    def params(self):
+        """
+        Returns the subscription parameters of the shared operator
+        """
+        return {'topics': ResolvedParam(lambda: self.subscribed),
+                'messageQueueSize': ResolvedParam(lambda: self.message_queue_size),
+                'dataAttributeName': 'data',
+                'topicOutAttrName': self.TOPIC_ATTRIBUTE_NAME}
+
+    def add(self, topic_filters, message_queue_size):
+        """
+        Adds the topic filters and the message queue size of a source
+        """
+        self.topic_filters.extend(topic_filters)
+        self.message_queue_size = max(self.message_queue_size, message_queue_size)
+
+
+class SubscriptionRegistry(object):
+    """
+    Subscription groups of a topology by connection key. Coalescing is disabled by default.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._groups = dict()
+
+    def group(self, key):
+        return self._groups.get(key)
+
+    def add_group(self, key, group):
+        self._groups[key] = group
+        return group
+
+
+_registries = weakref.WeakKeyDictionary()
+
+
+def subscription_registry(topology):
+    """
+    Returns the subscription registry of a topology
+    """
+    registry = _registries.get(topology)
+    if registry is None:
+        registry = SubscriptionRegistry()
+        _registries[topology] = registry
+    return registry
+
+
+def coalesce_subscriptions(topology, enabled=True):
+    """
+    Enables the coalescing of the subscriptions of the :py:class:`MQTTSource` composites that are
+    added to `topology` after this call.
+
+    Sources with the same connection settings (server URI, credentials, client ID, and all other connection
+    parameters), the same backend, and the same integer ``qos`` share an MQTT connection, which subscribes to the
+    minimal set of topic filters that covers the filters of all sources, for example only ``plant/#`` for the filters
+    ``plant/+/temp`` and ``plant/#``, so that the MQTT server delivers each message once.
+
+    With the ``'java'`` backend, sources that also have the same placement share a single source operator.
+    Each source selects the messages of its own filters from the shared stream with an SPL operator, and
+    converts them with Python operators only when the source decodes the payload, so the streams returned by
+    ``Topology.source()`` are not changed. With the ``'python'`` backend, each source keeps its own operator,
+    and the sources that run in the same process share the connection.
+
+    Sources with a ``parallel_width``, shared subscriptions (``$share/...``), a list of qos values, or an ``overflow_policy``
+    that drops messages are not coalesced.
+
+    Args:
+        topology(Topology): The topology
+        enabled(bool): ``False`` disables the coalescing for the sources added afterwards.
+
+    Example::
+
+        topo = Topology()
+        coalesce_subscriptions(topo)
+        temperatures = topo.source(MQTTSource('tcp://host.domain:1883', 'plant/+/temp', CommonSchema.String))
+        everything = topo.source(MQTTSource('tcp://host.domain:1883', 'plant/#', CommonSchema.Json))
+    """
+    subscription_registry(topology).enabled = enabled
@@ -0,0 +1,65 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Measures the startup time and the memory footprint of the Python MQTT engine (``backend='python'``)
+against the stand-in broker.
+
+Each measurement runs in a fresh Python process, which imports the engine, connects,
+publishes one message with QoS 1, and waits for its acknowledgement::
+
+    python -m streamsx.mqtt.tests.benchmark_backend --runs 5
+
+The Java operators can only be measured in a Streams instance. To compare, use the PE metrics
+``nResidentMemoryConsumption`` and the time between PE start and the first ``nTuplesProcessed``
+of a job containing one ``MQTTSink`` with the default ``backend='java'``.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from streamsx.mqtt.tests.broker import StandInBroker
+
+_PROBE = """
+import resource, sys, time, json
+start = time.perf_counter()
+from streamsx.mqtt._engine import _EngineSink
+sink = _EngineSink({'server_uri': sys.argv[1]}, 'string', topic='benchmark', qos=1)
+sink.__enter__()
+sink('first message')
+sink.__exit__(None, None, None)
+elapsed = time.perf_counter() - start
+print(json.dumps({'startup_seconds': elapsed, 'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+
+def run(runs):
+    broker = StandInBroker().start()
+    try:
+        results = []
+        for _ in range(runs):
+            out = subprocess.check_output([sys.executable, '-c', _PROBE, broker.server_uri])
+            results.append(json.loads(out.decode('utf-8')))
+    finally:
+        broker.stop()
+    return {
+        'backend': 'python',
+        'runs': runs,
+        'startup_seconds_median': statistics.median(r['startup_seconds'] for r in results),
+        'max_rss_kb_median': statistics.median(r['max_rss_kb'] for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='number of measured process starts')
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs), indent=2))
+
+
+if __name__ == '__main__':
+    main()
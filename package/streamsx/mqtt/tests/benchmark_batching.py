@@ -0,0 +1,78 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Measures the reduction of the MQTT message rate by batching small payloads, as done by
+``MQTTSink(batch_size=...)``, against the stand-in broker::
+
+    python -m streamsx.mqtt.tests.benchmark_batching --tuples 20000 --payload-size 32 --qos 1
+"""
+
+import argparse
+import json
+import time
+
+from streamsx.mqtt._engine import _EngineSink, _EngineSource
+from streamsx.mqtt._functions import _Batch, _Decode
+from streamsx.mqtt.tests.broker import StandInBroker
+
+
+def _run(broker, tuples, payload, qos, batch_size, batch_format):
+    params = {'server_uri': broker.server_uri}
+    receiver = _EngineSource(dict(params), 'binary', ['benchmark'], qos=qos, message_queue_size=10000)
+    receiver.__enter__()
+    published_before = broker.published
+    if batch_size:
+        sink = _EngineSink(dict(params), 'struct', topic='benchmark', qos=qos)
+        batch = _Batch('binary', None, None, batch_size, batch_format)
+        unbatch = _Decode('binary', 'data', None, batch_format=batch_format)
+        messages = batch([payload] * tuples)
+    else:
+        sink = _EngineSink(dict(params), 'binary', topic='benchmark', qos=qos)
+        messages = [payload] * tuples
+    sink.__enter__()
+    start = time.perf_counter()
+    for message in messages:
+        sink(message)
+    received = receiver()
+    count = 0
+    while count < tuples:
+        message = next(received)
+        count += len(unbatch({'data': message})) if batch_size else 1
+    elapsed = time.perf_counter() - start
+    sink.__exit__(None, None, None)
+    receiver.__exit__(None, None, None)
+    return {
+        'batch_size': batch_size,
+        'batch_format': batch_format if batch_size else None,
+        'qos': qos,
+        'tuples': tuples,
+        'messages': broker.published - published_before,
+        'seconds': elapsed,
+        'tuples_per_second': tuples / elapsed,
+    }
+
+
+def run(tuples, payload_size, qos, batch_sizes, batch_format):
+    broker = StandInBroker().start()
+    payload = b'x' * payload_size
+    try:
+        return [_run(broker, tuples, payload, qos, batch_size, batch_format) for batch_size in [None] + batch_sizes]
+    finally:
+        broker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tuples', type=int, default=20000)
+    parser.add_argument('--payload-size', type=int, default=32)
+    parser.add_argument('--qos', type=int, default=1, choices=[0, 1, 2])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--batch-format', default='length_prefixed', choices=['length_prefixed', 'json'])
+    args = parser.parse_args()
+    print(json.dumps(run(args.tuples, args.payload_size, args.qos, args.batch_sizes, args.batch_format), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Measures the time to add many ``MQTTSink`` composites to a topology, created with the constructor
+and with ``MQTTSink.template(...).clone(...)``, to show that the build time grows linearly
+with the number of operators::
+
+    python -m streamsx.mqtt.tests.benchmark_build --operators 1000 2500 5000 10000
+
+The sinks are spread over ``--streams`` input streams. ``Topology`` connects the input ports of the
+consumers of a stream with a list lookup, so fanning out all sinks from a single stream grows
+quadratically independent of the MQTT composites.
+"""
+
+import argparse
+import gc
+import json
+import time
+
+from streamsx.topology.topology import Topology
+from streamsx.mqtt import BuildProfiler, MQTTSink
+
+_SERVER_URI = 'ssl://host.domain:8883'
+
+
+def _build(operators, streams, use_template):
+    topo = Topology()
+    inputs = [topo.source(['x']).as_string() for _ in range(streams)]
+    options = {'qos': 1, 'username': 'user', 'password': 'secret', 'reconnection_bound': 10}
+    template = MQTTSink.template(_SERVER_URI, **options) if use_template else None
+    with BuildProfiler() as profiler:
+        start = time.perf_counter()
+        for i in range(operators):
+            topic = 'devices/group-' + str(i)
+            sink = template.clone(topic=topic) if use_template else MQTTSink(_SERVER_URI, topic=topic, **options)
+            inputs[i % streams].for_each(sink)
+        elapsed = time.perf_counter() - start
+    return elapsed, profiler.stats()
+
+
+def run(operator_counts, streams):
+    results = []
+    for use_template in (False, True):
+        # warm up
+        _build(operator_counts[0], streams, use_template)
+        base = None
+        for operators in operator_counts:
+            gc.collect()
+            elapsed, phases = _build(operators, streams, use_template)
+            per_operator = 1e6 * elapsed / operators
+            base = base if base else per_operator
+            results.append({
+                'api': 'template' if use_template else 'constructor',
+                'operators': operators,
+                'seconds': elapsed,
+                'us_per_operator': per_operator,
+                # 1.0 is linear scaling, relative to the smallest topology
+                'scaling': per_operator / base,
+                'phases_seconds': dict((name, phase['seconds']) for name, phase in phases.items()),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--operators', type=int, nargs='+', default=[1000, 2500, 5000, 10000])
+    parser.add_argument('--streams', type=int, default=100, help='number of input streams of the sinks')
+    args = parser.parse_args()
+    print(json.dumps(run(args.operators, args.streams), indent=2))
+
+
+if __name__ == '__main__':
+    main()
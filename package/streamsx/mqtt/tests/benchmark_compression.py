@@ -0,0 +1,70 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Measures the CPU time and the bytes saved by the compression of ``MQTTSink(compression=...)``
+for JSON telemetry payloads of different sizes::
+
+    python -m streamsx.mqtt.tests.benchmark_compression --sizes 64 256 1024 4096 65536
+"""
+
+import argparse
+import json
+import random
+import time
+
+from streamsx.mqtt._functions import compress, decompress
+
+
+def _payload(size):
+    """
+    Returns a JSON telemetry document of about `size` bytes
+    """
+    rnd = random.Random(size)
+    readings = []
+    document = b''
+    while len(document) < size:
+        readings.append({'sensor': 'sensor-{}'.format(rnd.randint(0, 50)), 'ts': 1580000000 + len(readings), 'value': round(rnd.uniform(10, 30), 2)})
+        document = json.dumps(readings).encode('utf-8')
+    return document[:size]
+
+
+def _time_per_call(func, arg, min_seconds=0.2):
+    calls = 0
+    start = time.process_time()
+    while True:
+        func(arg)
+        calls += 1
+        elapsed = time.process_time() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def run(sizes, compressions):
+    results = []
+    for size in sizes:
+        payload = _payload(size)
+        for compression in compressions:
+            compressed = compress(payload, compression)
+            results.append({
+                'payload_bytes': len(payload),
+                'compression': compression,
+                'compressed_bytes': len(compressed),
+                'bytes_saved_percent': 100.0 * (len(payload) - len(compressed)) / len(payload),
+                'compress_cpu_us': 1e6 * _time_per_call(lambda p: compress(p, compression), payload),
+                'decompress_cpu_us': 1e6 * _time_per_call(decompress, compressed),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 256, 1024, 4096, 65536])
+    parser.add_argument('--compressions', nargs='+', default=['zlib', 'lzma', 'bz2'], choices=['zlib', 'lzma', 'bz2'])
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.compressions), indent=2))
+
+
+if __name__ == '__main__':
+    main()
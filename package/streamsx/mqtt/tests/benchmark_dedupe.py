@@ -0,0 +1,112 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Measures the CPU time and the memory of the duplicate suppression of ``MQTTSource``
+(``dedupe_window``, ``dedupe_seconds``) per message at a given message rate::
+
+    python -m streamsx.mqtt.tests.benchmark_dedupe --rate 100000 --windows 10000 100000 1000000
+
+The messages are 64 byte payloads, of which ``--duplicates`` is the fraction of redelivered messages.
+The clock of the filter is simulated, so that the keys expire as they would at ``--rate`` messages per second.
+``cpu_share`` is the fraction of a core the filter needs at the rate.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from streamsx.mqtt._functions import _Dedupe
+
+
+class _Clock(object):
+    def __init__(self, rate):
+        self._interval = 1.0 / rate
+        self.now = 0.0
+
+    def tick(self):
+        self.now += self._interval
+
+    def __call__(self):
+        return self.now
+
+
+def _payloads(messages, duplicates, payload_bytes):
+    rnd = random.Random(0)
+    payloads = []
+    for i in range(messages):
+        if payloads and rnd.random() < duplicates:
+            # a redelivery of one of the recent messages
+            payloads.append(payloads[-rnd.randint(1, min(len(payloads), 1000))])
+        else:
+            payloads.append(os.urandom(payload_bytes))
+    return payloads
+
+
+def _case(rate, window, seconds, messages, duplicates, payload_bytes):
+    payloads = _payloads(messages, duplicates, payload_bytes)
+    clock = _Clock(rate)
+    dedupe = _Dedupe(window, seconds, clock=clock)
+    gc.collect()
+    start = time.process_time()
+    passed = 0
+    for payload in payloads:
+        clock.tick()
+        if dedupe(payload):
+            passed += 1
+    cpu = time.process_time() - start
+    keys = len(dedupe._seen)
+    # the memory is traced in a second pass, tracing slows down the filter
+    clock = _Clock(rate)
+    dedupe = _Dedupe(window, seconds, clock=clock)
+    gc.collect()
+    tracemalloc.start()
+    for payload in payloads:
+        clock.tick()
+        dedupe(payload)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    us_per_message = 1e6 * cpu / messages
+    return {
+        'window': window,
+        'seconds': seconds,
+        'messages': messages,
+        'duplicates': dedupe.duplicates,
+        'passed': passed,
+        'keys': keys,
+        'us_per_message': us_per_message,
+        'cpu_share': us_per_message * rate / 1e6,
+        'memory_bytes': memory,
+        'bytes_per_key': memory / keys if keys else None,
+    }
+
+
+def run(rate, windows, seconds, messages, duplicates, payload_bytes):
+    """
+    Runs a case per window size and returns the list of results
+    """
+    # untraced warm up
+    _Dedupe(1000)(b'x')
+    return [_case(rate, window, seconds, max(messages, 2 * window), duplicates, payload_bytes) for window in windows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=100000, help='messages per second')
+    parser.add_argument('--windows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--seconds', type=float, default=None, help='dedupe_seconds, the default is no time eviction')
+    parser.add_argument('--messages', type=int, default=200000, help='minimum number of messages per case')
+    parser.add_argument('--duplicates', type=float, default=0.05, help='fraction of redelivered messages')
+    parser.add_argument('--payload-bytes', type=int, default=64)
+    args = parser.parse_args()
+    results = run(args.rate, args.windows, args.seconds, args.messages, args.duplicates, args.payload_bytes)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Simulates an outage of the MQTT server with many clients of the Python MQTT engine (``backend='python'``)
+and measures how the reconnects after the restart are spread, with and without the reconnect backoff::
+
+    python -m streamsx.mqtt.tests.benchmark_reconnect --clients 400 --outage 2
+
+Without backoff, every client retries with the same fixed period and all clients reconnect within a few
+milliseconds after the restart. ``peak_connects`` is the maximum number of CONNECT packets that the server
+receives within ``--bucket-millis``.
+"""
+
+import argparse
+import json
+import time
+
+from streamsx.mqtt._engine import _EngineSink
+from streamsx.mqtt.tests.broker import StandInBroker
+
+
+def _case(clients, outage, backoff, bucket):
+    broker = StandInBroker().start()
+    params = {'server_uri': broker.server_uri}
+    if backoff:
+        params.update(backoff)
+    else:
+        params['reconnect_delay_millis'] = 100
+    sinks = [_EngineSink(dict(params), 'string', topic='t') for _ in range(clients)]
+    try:
+        for sink in sinks:
+            sink.__enter__()
+        connects = len(broker.connect_times)
+        broker.outage(outage).result()
+        restarted = time.monotonic()
+        deadline = restarted + 120.0
+        while len(broker.connect_times) < connects + clients and time.monotonic() < deadline:
+            time.sleep(0.05)
+        reconnects = sorted(broker.connect_times[connects:])
+        buckets = dict()
+        for t in reconnects:
+            key = int((t - restarted) / bucket)
+            buckets[key] = buckets.get(key, 0) + 1
+        return {
+            'backoff': backoff,
+            'clients': clients,
+            'reconnected': len(reconnects),
+            'spread_seconds': reconnects[-1] - reconnects[0] if reconnects else None,
+            'last_reconnect_seconds': reconnects[-1] - restarted if reconnects else None,
+            'peak_connects': max(buckets.values()) if buckets else 0,
+        }
+    finally:
+        for sink in sinks:
+            sink.__exit__(None, None, None)
+        broker.stop()
+
+
+def run(clients, outage, delay_millis, max_delay_millis, jitter, bucket_millis):
+    """
+    Runs the outage without backoff and with the given backoff and returns the list of results
+    """
+    backoff = {'reconnect_delay_millis': delay_millis, 'reconnect_max_delay_millis': max_delay_millis, 'reconnect_jitter': jitter}
+    return [_case(clients, outage, None, bucket_millis / 1000.0), _case(clients, outage, backoff, bucket_millis / 1000.0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--outage', type=float, default=1.0, help='seconds the server refuses connections')
+    parser.add_argument('--delay-millis', type=int, default=250, help='reconnect_delay_millis')
+    parser.add_argument('--max-delay-millis', type=int, default=4000, help='reconnect_max_delay_millis')
+    parser.add_argument('--jitter', type=float, default=0.5, help='reconnect_jitter')
+    parser.add_argument('--bucket-millis', type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(run(args.clients, args.outage, args.delay_millis, args.max_delay_millis, args.jitter, args.bucket_millis), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Measures the publish/subscribe throughput and the end-to-end latency of the Python MQTT engine
+(``backend='python'``) against the stand-in broker, for all combinations of QoS, payload size,
+``message_queue_size`` of the source, and ``batch_size`` of the sink. Runs entirely offline::
+
+    python -m streamsx.mqtt.tests.benchmark_suite --output results-1.0.3.json
+
+The results are written as JSON. To detect regressions between releases, compare them with
+the results of a previous run; the exit code is 1 when a case got slower by more than the tolerance::
+
+    python -m streamsx.mqtt.tests.benchmark_suite --compare results-1.0.2.json --tolerance 0.2
+
+Every payload carries its publish time, so that the receiver measures the latency of each tuple.
+With batching, the latency does not include the time to fill a batch, which depends on the tuple rate
+and ``batch_timeout_ms`` of the application.
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import math
+import platform
+import struct
+import sys
+import threading
+import time
+
+import streamsx.mqtt
+from streamsx.mqtt._engine import _EngineSink, _EngineSource
+from streamsx.mqtt._functions import _Batch, _Decode
+from streamsx.mqtt.tests.broker import StandInBroker
+
+_STAMP = struct.Struct('!d')
+_BATCH_FORMAT = 'length_prefixed'
+
+
+def _percentile(values, percent):
+    """
+    Returns the nearest-rank percentile of the sorted list `values`
+    """
+    if not values:
+        return None
+    rank = max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def _stamped(payload):
+    return _STAMP.pack(time.perf_counter()) + payload[_STAMP.size:]
+
+
+def _receive(receiver, tuples, unbatch, latencies, done):
+    messages = receiver()
+    while len(latencies) < tuples:
+        message = next(messages)
+        received = time.perf_counter()
+        payloads = unbatch({'data': message}) if unbatch else [message]
+        for payload in payloads:
+            latencies.append(received - _STAMP.unpack_from(payload)[0])
+    done.set()
+
+
+def _case(broker, topic, tuples, qos, payload_size, message_queue_size, batch_size, timeout):
+    params = {'server_uri': broker.server_uri}
+    receiver = _EngineSource(dict(params), 'binary', [topic], qos=qos, message_queue_size=message_queue_size)
+    receiver.__enter__()
+    payload = b'x' * max(payload_size, _STAMP.size)
+    if batch_size:
+        sink = _EngineSink(dict(params), 'struct', topic=topic, qos=qos)
+        batch = _Batch('binary', None, None, batch_size, _BATCH_FORMAT)
+        unbatch = _Decode('binary', 'data', None, batch_format=_BATCH_FORMAT)
+    else:
+        sink = _EngineSink(dict(params), 'binary', topic=topic, qos=qos)
+        unbatch = None
+    sink.__enter__()
+    latencies = []
+    done = threading.Event()
+    thread = threading.Thread(target=_receive, args=(receiver, tuples, unbatch, latencies, done), daemon=True)
+    thread.start()
+    published_before = broker.published
+    start = time.perf_counter()
+    if batch_size:
+        for offset in range(0, tuples, batch_size):
+            count = min(batch_size, tuples - offset)
+            for message in batch([_stamped(payload) for _ in range(count)]):
+                sink(message)
+    else:
+        for _ in range(tuples):
+            sink(_stamped(payload))
+    completed = done.wait(timeout)
+    elapsed = time.perf_counter() - start
+    sink.__exit__(None, None, None)
+    receiver.__exit__(None, None, None)
+    latencies = sorted(latencies[:tuples])
+    return {
+        'qos': qos,
+        'payload_bytes': len(payload),
+        'message_queue_size': message_queue_size,
+        'batch_size': batch_size,
+        'tuples': tuples,
+        'received': len(latencies),
+        'completed': completed,
+        'messages': broker.published - published_before,
+        'seconds': elapsed,
+        'tuples_per_second': len(latencies) / elapsed,
+        'megabytes_per_second': len(latencies) * len(payload) / elapsed / 1e6,
+        'latency_p50_ms': 1e3 * _percentile(latencies, 50) if latencies else None,
+        'latency_p99_ms': 1e3 * _percentile(latencies, 99) if latencies else None,
+        'latency_max_ms': 1e3 * latencies[-1] if latencies else None,
+    }
+
+
+def run(tuples, qos_levels, payload_sizes, message_queue_sizes, batch_sizes, timeout=60.0):
+    """
+    Runs all combinations of the settings against a new stand-in broker and returns the JSON document of the results
+    """
+    broker = StandInBroker().start()
+    results = []
+    try:
+        cases = itertools.product(qos_levels, payload_sizes, message_queue_sizes, batch_sizes)
+        for index, (qos, payload_size, message_queue_size, batch_size) in enumerate(cases):
+            topic = 'benchmark/' + str(index)
+            results.append(_case(broker, topic, tuples, qos, payload_size, message_queue_size, batch_size, timeout))
+    finally:
+        broker.stop()
+    return {
+        'version': streamsx.mqtt.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0).isoformat(),
+        'results': results,
+    }
+
+
+def _key(result):
+    return (result['qos'], result['payload_bytes'], result['message_queue_size'], result['batch_size'])
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Returns the regressions of the `current` results against the `baseline` results as list of dicts.
+    A case regresses when its throughput drops or its p99 latency increases by more than `tolerance`.
+    Cases that are not in both results are ignored.
+    """
+    previous = dict((_key(r), r) for r in baseline['results'])
+    regressions = []
+    for result in current['results']:
+        before = previous.get(_key(result))
+        if before is None:
+            continue
+        if result['tuples_per_second'] < before['tuples_per_second'] * (1.0 - tolerance):
+            regressions.append({'case': _key(result), 'metric': 'tuples_per_second',
+                                'baseline': before['tuples_per_second'], 'current': result['tuples_per_second']})
+        if before['latency_p99_ms'] is not None and result['latency_p99_ms'] is not None and \
+                result['latency_p99_ms'] > before['latency_p99_ms'] * (1.0 + tolerance):
+            regressions.append({'case': _key(result), 'metric': 'latency_p99_ms',
+                                'baseline': before['latency_p99_ms'], 'current': result['latency_p99_ms']})
+    return regressions
+
+
+def _batch_size(value):
+    return None if value in ('0', 'none', 'None') else int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tuples', type=int, default=2000, help='number of tuples per case')
+    parser.add_argument('--qos', type=int, nargs='+', default=[0, 1, 2], choices=[0, 1, 2])
+    parser.add_argument('--payload-sizes', type=int, nargs='+', default=[64, 1024, 16384])
+    parser.add_argument('--message-queue-sizes', type=int, nargs='+', default=[10, 1000])
+    parser.add_argument('--batch-sizes', type=_batch_size, nargs='+', default=[None, 100], help="'none' disables batching")
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for the tuples of a case')
+    parser.add_argument('--output', help='file for the JSON results, the default is stdout')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change that is reported as regression')
+    args = parser.parse_args()
+    results = run(args.tuples, args.qos, args.payload_sizes, args.message_queue_sizes, args.batch_sizes, args.timeout)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for regression in regressions:
+            print('regression {case}: {metric} {baseline:.3f} -> {current:.3f}'.format(**regression), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
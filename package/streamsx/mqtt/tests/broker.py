@@ -0,0 +1,238 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+
+"""
+Minimal asyncio MQTT 3.1.1 stand-in broker for tests and benchmarks.
+
+Supports QoS 0, 1, and 2 in both directions, the ``+`` and ``#`` wildcards,
+shared subscriptions (``$share/<group>/<filter>``), and persistent sessions of clients that connect
+with ``clean_session=False``. Run it in a background thread::
+
+    broker = StandInBroker()
+    broker.start()
+    uri = broker.server_uri
+    ...
+    broker.stop()
+"""
+
+import asyncio
+import struct
+import threading
+import time
+
+from streamsx.mqtt._engine import (CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP,
+                                   SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT,
+                                   _packet, _read_packet, _decode_str, _parse_publish, _publish_packet, _ack_packet)
+
+
+def topic_matches(topic_filter, topic):
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != '+' and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class _Session(object):
+    def __init__(self, broker, writer):
+        self.broker = broker
+        self.writer = writer
+        self.client_id = None
+        self.clean_session = True
+        self.subscriptions = dict()
+        self.next_id = 0
+        self.awaiting_rel = dict()
+        # QoS 1 and 2 messages for a persistent session while its client is disconnected
+        self.queued = []
+
+    def send(self, data):
+        self.writer.write(data)
+
+    def deliver(self, topic, payload, qos, retain=False):
+        if self.writer is None:
+            if qos:
+                self.queued.append((topic, payload, qos, retain))
+            return
+        packet_id = None
+        if qos:
+            self.next_id = self.next_id % 65535 + 1
+            packet_id = self.next_id
+        self.send(_publish_packet(topic, payload, qos, retain, packet_id))
+
+
+class StandInBroker(object):
+    """
+    MQTT server for tests. The broker counts the received PUBLISH packets in :py:attr:`published`,
+    the CONNECT packets in :py:attr:`connects`, and the SUBSCRIBE packets in :py:attr:`subscribes`.
+    :py:attr:`connect_times` has the ``time.monotonic()`` of each CONNECT packet.
+    With a server side `ssl_context`, the broker accepts TLS connections (``ssl://`` URI).
+    """
+    def __init__(self, host='127.0.0.1', port=0, ssl_context=None):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.sessions = set()
+        self.persistent_sessions = dict()
+        self.published = 0
+        self.connects = 0
+        self.subscribes = 0
+        self.connect_times = []
+        self._shared_next = dict()
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def server_uri(self):
+        return '{}://{}:{}'.format('ssl' if self.ssl_context else 'tcp', self.host, self.port)
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port, ssl=self.ssl_context))
+            self.port = self._server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='mqtt-stand-in-broker', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        async def close():
+            self._server.close()
+            for session in list(self.sessions):
+                session.writer.close()
+            await self._server.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def drop_connections(self):
+        """
+        Closes all client connections, as a broker restart would.
+        """
+        def close():
+            for session in list(self.sessions):
+                session.writer.close()
+        self._loop.call_soon_threadsafe(close)
+
+    def outage(self, seconds):
+        """
+        Simulates a restart of the broker: closes all client connections and refuses new connections
+        for `seconds`. Persistent sessions survive the outage. Returns a ``concurrent.futures.Future``
+        that is done when the broker accepts connections again.
+        """
+        async def restart():
+            self._server.close()
+            for session in list(self.sessions):
+                session.writer.close()
+            await self._server.wait_closed()
+            await asyncio.sleep(seconds)
+            self._server = await asyncio.start_server(self._handle, self.host, self.port, ssl=self.ssl_context)
+        return asyncio.run_coroutine_threadsafe(restart(), self._loop)
+
+    def _route(self, topic, payload, qos, retain=False):
+        shared = dict()
+        for session in list(self.sessions) + list(self.persistent_sessions.values()):
+            for topic_filter, sub_qos in session.subscriptions.items():
+                if topic_filter.startswith('$share/'):
+                    _, group, real_filter = topic_filter.split('/', 2)
+                    if topic_matches(real_filter, topic):
+                        shared.setdefault((group, real_filter), []).append((session, sub_qos))
+                elif topic_matches(topic_filter, topic):
+                    session.deliver(topic, payload, min(qos, sub_qos), retain)
+        for key, members in shared.items():
+            index = self._shared_next.get(key, 0) % len(members)
+            self._shared_next[key] = index + 1
+            session, sub_qos = members[index]
+            session.deliver(topic, payload, min(qos, sub_qos), retain)
+
+    async def _handle(self, reader, writer):
+        session = _Session(self, writer)
+        try:
+            packet_type, _, body = await _read_packet(reader)
+            if packet_type != CONNECT:
+                return
+            protocol, pos = _decode_str(body, 0)
+            connect_flags = body[pos + 1]
+            client_id, _ = _decode_str(body, pos + 4)
+            session.client_id = client_id
+            session.clean_session = bool(connect_flags & 0x02)
+            self.connects += 1
+            self.connect_times.append(time.monotonic())
+            previous = self.persistent_sessions.pop(client_id, None)
+            session_present = previous is not None and not session.clean_session
+            if session_present:
+                session.subscriptions = previous.subscriptions
+                session.next_id = previous.next_id
+            self.sessions.add(session)
+            session.send(_packet(CONNACK, 0, bytes([1 if session_present else 0, 0])))
+            if session_present:
+                for message in previous.queued:
+                    session.deliver(*message)
+            while True:
+                packet_type, flags, body = await _read_packet(reader)
+                if packet_type == PUBLISH:
+                    topic, payload, qos, packet_id, retain = _parse_publish(flags, body)
+                    self.published += 1
+                    if qos == 2:
+                        if packet_id not in session.awaiting_rel:
+                            session.awaiting_rel[packet_id] = (topic, payload)
+                        session.send(_ack_packet(PUBREC, packet_id))
+                        continue
+                    self._route(topic, payload, qos, retain)
+                    if qos == 1:
+                        session.send(_ack_packet(PUBACK, packet_id))
+                elif packet_type == PUBREL:
+                    packet_id = struct.unpack('!H', body)[0]
+                    message = session.awaiting_rel.pop(packet_id, None)
+                    if message is not None:
+                        self._route(message[0], message[1], 2)
+                    session.send(_ack_packet(PUBCOMP, packet_id))
+                elif packet_type == PUBREC:
+                    session.send(_ack_packet(PUBREL, struct.unpack('!H', body)[0]))
+                elif packet_type == SUBSCRIBE:
+                    self.subscribes += 1
+                    packet_id = struct.unpack_from('!H', body)[0]
+                    pos = 2
+                    granted = []
+                    while pos < len(body):
+                        topic_filter, pos = _decode_str(body, pos)
+                        qos = body[pos]
+                        pos += 1
+                        session.subscriptions[topic_filter] = qos
+                        granted.append(qos)
+                    session.send(_packet(SUBACK, 0, struct.pack('!H', packet_id) + bytes(granted)))
+                elif packet_type == UNSUBSCRIBE:
+                    packet_id = struct.unpack_from('!H', body)[0]
+                    pos = 2
+                    while pos < len(body):
+                        topic_filter, pos = _decode_str(body, pos)
+                        session.subscriptions.pop(topic_filter, None)
+                    session.send(_packet(UNSUBACK, 0, struct.pack('!H', packet_id)))
+                elif packet_type == PINGREQ:
+                    session.send(_packet(PINGRESP, 0))
+                elif packet_type == DISCONNECT:
+                    return
+                # PUBACK and PUBCOMP from subscribers need no action
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+            reconnected = any(s.client_id == session.client_id for s in self.sessions)
+            if session.client_id is not None and not session.clean_session and not reconnected:
+                session.writer = None
+                self.persistent_sessions[session.client_id] = session
@@ -1,4 +1,4 @@
-from streamsx.mqtt import MQTTSource, MQTTSink
+from streamsx.mqtt import BuildProfiler, MQTTConnection, MQTTSource, MQTTSink, PrometheusExporter, coalesce_subscriptions
 
 import typing
 from streamsx.topology.topology import Topology
@@ -6,14 +6,32 @@ from streamsx.topology.context import ContextTypes
 from streamsx.topology.tester import Tester
 from streamsx.topology.schema import CommonSchema, StreamSchema
 from streamsx.mqtt.tests.x509_certs import TRUSTED_CERT_PEM, PRIVATE_KEY_PEM, CLIENT_CERT_PEM, CLIENT_CA_CERT_PEM
+from streamsx.mqtt.tests.broker import StandInBroker
+from streamsx.mqtt.tests import benchmark_suite
 import streamsx.spl.op as op
 import streamsx.spl.toolkit
 import streamsx.rest as sr
 import unittest
+import asyncio
+import concurrent.futures
 import datetime
+import hashlib
 import os
 import pathlib
+import shutil
+import ssl
+import sys
+import time
 import json
+import tempfile
+import xml.etree.ElementTree as ET
+from unittest import mock
+from streamsx.mqtt._stores import StoreCache
+from streamsx.mqtt._connection import connection_document
+from streamsx.mqtt._subscriptions import filter_covers, minimal_cover
+from streamsx.mqtt._engine import _CongestionQueue, _EngineSink, _EngineSource
+import struct
+from streamsx.mqtt._functions import _Batch, _Decode, _Dedupe, _Encode, _Lane, _RateLimit, _Reassemble, _Route, TopicFilterTrie, chunk, compress, decompress
 from subprocess import call, Popen, PIPE
 
 def cloud_creds_env_var():
@@ -159,6 +177,1017 @@ class TestParams(unittest.TestCase):
         self.assertRaises(TypeError, xmlStream.for_each, MQTTSink(server_uri='tcp://server:1833', topic='t1'))
         
 
+    def test_MQTTSource_parallel(self):
+        topo = Topology('parallel_src')
+        s = MQTTSource(server_uri='tcp://server:1833', topics=['t1', '$share/g0/t2'], schema=CommonSchema.String, parallel_width=3, share_group='g1')
+        stream = topo.source(s)
+        self.assertListEqual(s._op.params['topics'], ['$share/g1/t1', '$share/g0/t2'])
+        self.assertEqual(str(s._op.params['clientID']), '"g1-" + (rstring)getChannel()')
+        self.assertTrue(s._op._op().config['parallel'])
+        self.assertEqual(s._op._op().config['width'], 3)
+        self.assertEqual(stream.oport.operator.kind, '$EndParallel$')
+
+        s = MQTTSource(server_uri='tcp://server:1833', topics='t1', schema=CommonSchema.String, parallel_width=2, client_id='cid')
+        Topology('parallel_src').source(s, name='Src')
+        self.assertListEqual(s._op.params['topics'], ['$share/parallel_src-Src/t1'])
+        self.assertEqual(str(s._op.params['clientID']), '"cid-" + (rstring)getChannel()')
+        # the client ID is escaped as SPL string literal
+        s = MQTTSource(server_uri='tcp://server:1833', topics='t1', schema=CommonSchema.String, parallel_width=2, client_id='a"b\\c')
+        Topology('parallel_src').source(s)
+        self.assertEqual(str(s._op.params['clientID']), '"a\\"b\\\\c-" + (rstring)getChannel()')
+
+        s = MQTTSource(server_uri='tcp://server:1833', topics='t1', schema=CommonSchema.String)
+        stream = Topology().source(s)
+        self.assertEqual(s._op.params['topics'], 't1')
+        self.assertNotIn('parallel', s._op._op().config)
+        with self.assertRaises(ValueError):
+            s.parallel_width = 0
+        with self.assertRaises(TypeError):
+            s.parallel_width = '2'
+        with self.assertRaises(ValueError):
+            s.share_group = 'a/b'
+
+    def test_MQTTSink_parallel(self):
+        topo = Topology('parallel_sink')
+        msgs = topo.source(['Hello', 'World!']).map(lambda s: {'topic_name': s, 'data': s}, schema='tuple<rstring topic_name, rstring data>')
+        s = MQTTSink(server_uri='tcp://server:1833', topic_attribute_name='topic_name', data_attribute_name='data', parallel_width=4, partition_by='topic')
+        msgs.for_each(s, name='Pub')
+        self.assertEqual(str(s._op.params['clientID']), '"parallel_sink-Pub-" + (rstring)getChannel()')
+        parallel_op = s._op._op().inputPorts[0].outputPorts[0].operator
+        self.assertEqual(parallel_op.kind, '$Parallel$')
+        oport = parallel_op.outputPorts[0]
+        self.assertEqual(oport.routing, 'KEY_PARTITIONED')
+        self.assertListEqual(oport.partitioned_keys, ['topic_name'])
+        self.assertEqual(oport.width, 4)
+
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t1', parallel_width=2, client_id='cid')
+        msgs.for_each(s)
+        self.assertEqual(str(s._op.params['clientID']), '"cid-" + (rstring)getChannel()')
+        self.assertEqual(s._op._op().inputPorts[0].outputPorts[0].routing, 'ROUND_ROBIN')
+
+        # partition by topic requires the topic attribute
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t1', parallel_width=2, partition_by='topic')
+        self.assertRaises(ValueError, msgs.for_each, s)
+        with self.assertRaises(ValueError):
+            s.parallel_width = 0
+        with self.assertRaises(TypeError):
+            s.partition_by = 1
+
+    def test_batching(self):
+        topo = Topology()
+        msgs = topo.source(['Hello']).map(lambda s: {'topic_name': 't', 'data': s}, schema='tuple<rstring topic_name, rstring data>')
+        s = MQTTSink(server_uri='tcp://server:1833', topic_attribute_name='topic_name', data_attribute_name='data', batch_size=10, batch_timeout_ms=100)
+        msgs.for_each(s)
+        self.assertEqual(s._op.params['dataAttributeName'], 'data')
+        self.assertEqual(str(s._op._op().inputPorts[0].schema), 'tuple<blob data, rstring topic_name>')
+        with self.assertRaises(ValueError):
+            s.batch_size = 0
+        with self.assertRaises(ValueError):
+            s.batch_format = 'xml'
+
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.String, unbatch=True)
+        stream = topo.source(src)
+        self.assertEqual(str(src._op.outputs[0].oport.schema), 'tuple<blob data>')
+        self.assertEqual(src._op.params['dataAttributeName'], 'data')
+        self.assertIs(stream.oport.schema, CommonSchema.String)
+
+        for batch_format in ['length_prefixed', 'json']:
+            batch = _Batch('struct', 'data', 'topic_name', 2, batch_format)
+            messages = batch([{'topic_name': 't', 'data': 'a'}, {'topic_name': 't', 'data': 'bc'}, {'topic_name': 't', 'data': ''}])
+            self.assertEqual(len(messages), 2)
+            self.assertEqual(messages[0]['topic_name'], 't')
+            unbatch = _Decode('struct', 'data', 'topic_name', batch_format=batch_format)
+            self.assertListEqual(unbatch(messages[0]) + unbatch(messages[1]),
+                                 [{'data': 'a', 'topic_name': 't'}, {'data': 'bc', 'topic_name': 't'}, {'data': '', 'topic_name': 't'}])
+        messages = _Batch('json', None, None, None, 'length_prefixed')([{'a': 1}, {'b': 2}])
+        self.assertEqual(len(messages), 1)
+        self.assertListEqual(_Decode('json', 'data', None, batch_format='length_prefixed')(messages[0]), [{'a': 1}, {'b': 2}])
+
+        # JSON batches of binary payloads are rejected
+        binary = topo.source([b'\xff']).map(lambda b: b, schema=CommonSchema.Binary)
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t', batch_size=10, batch_format='json')
+        self.assertRaises(TypeError, binary.for_each, s)
+        blobs = topo.source([b'\xff']).map(lambda b: {'data': b}, schema='tuple<blob data>')
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t', batch_size=10, batch_format='json')
+        self.assertRaises(TypeError, blobs.for_each, s)
+
+        # malformed messages are dropped and counted
+        unbatch = _Decode('string', 'data', None, batch_format='length_prefixed')
+        self.assertListEqual(unbatch({'data': b'\x00\x00\x00\x09ab'}), [])
+        self.assertListEqual(unbatch({'data': b'\x00\x00\x00\x02\xff\xfe\x00\x00\x00\x02ok'}), ['ok'])
+        unbatch = _Decode('struct', 'data', None, batch_format='json', decompress=True)
+        self.assertListEqual(unbatch({'data': b'[1, 2]'}), [])
+        self.assertListEqual(unbatch({'data': compress(b'x' * 100, 'zlib')[:10]}), [])
+        self.assertEqual(unbatch.malformed, 2)
+
+    def test_compression(self):
+        topo = Topology()
+        stream = topo.source(['Hello']).as_string()
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t1', compression='lzma', compression_min_bytes=100)
+        stream.for_each(s)
+        self.assertEqual(s._op.params['dataAttributeName'], 'data')
+        self.assertEqual(str(s._op._op().inputPorts[0].schema), 'tuple<blob data>')
+        with self.assertRaises(ValueError):
+            s.compression = 'zip'
+        with self.assertRaises(ValueError):
+            s.compression_min_bytes = -1
+
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.Json, decompress=True)
+        stream = topo.source(src)
+        self.assertEqual(str(src._op.outputs[0].oport.schema), 'tuple<blob data>')
+        self.assertIs(stream.oport.schema, CommonSchema.Json)
+
+        payload = json.dumps({'reading': [1.5] * 100}).encode('utf-8')
+        for compression in ['zlib', 'lzma', 'bz2']:
+            compressed = compress(payload, compression)
+            self.assertLess(len(compressed), len(payload))
+            self.assertEqual(decompress(compressed), payload)
+        # small and incompressible payloads are not compressed
+        self.assertEqual(compress(payload, 'zlib', min_bytes=len(payload) + 1), payload)
+        self.assertEqual(compress(b'abc', 'zlib'), b'abc')
+        self.assertEqual(decompress(b'abc'), b'abc')
+        decode = _Decode('json', 'data', None, decompress=True)
+        self.assertListEqual(decode({'data': compress(payload, 'zlib')}), [{'reading': [1.5] * 100}])
+        messages = _Batch('string', None, None, 10, 'json', 'bz2')(['a' * 100, 'b' * 100])
+        decode = _Decode('string', 'data', None, batch_format='json', decompress=True)
+        self.assertListEqual(decode(messages[0]), ['a' * 100, 'b' * 100])
+
+    def test_MQTTSource_topic_mapping(self):
+        topo = Topology()
+        src = MQTTSource(server_uri='tcp://server:1833', topics={
+            'sensors/+/temperature': ('temperature', 'tuple<rstring data, rstring topic>'),
+            'alerts/#': CommonSchema.Json}, topic_attribute_name='topic', qos=1)
+        stream = topo.source(src)
+        self.assertListEqual(src._op.params['topics'], ['sensors/+/temperature', 'alerts/#'])
+        self.assertEqual(src._op.params['topicOutAttrName'], 'topic')
+        self.assertEqual(str(src._op.outputs[0].oport.schema), 'tuple<blob data, rstring topic>')
+        self.assertListEqual(list(src.streams.keys()), ['temperature', 'alerts/#'])
+        self.assertIs(stream, src.streams['temperature'])
+        self.assertIs(src.streams['alerts/#'].oport.schema, CommonSchema.Json)
+        # a single connection
+        self.assertEqual(len([op for op in topo.graph.operators if op.kind == 'com.ibm.streamsx.mqtt::MQTTSource']), 1)
+
+        # the topic is routed internally, also when it is not part of the output schemas
+        src = MQTTSource(server_uri='tcp://server:1833', topics={'a/#': CommonSchema.String, 'b': CommonSchema.String})
+        topo.source(src)
+        self.assertEqual(src._op.params['topicOutAttrName'], 'topic')
+
+        with self.assertRaises(ValueError):
+            MQTTSource(server_uri='tcp://server:1833', topics={'a/#': CommonSchema.String}, schema=CommonSchema.String)
+        with self.assertRaises(ValueError):
+            MQTTSource(server_uri='tcp://server:1833', topics={'a/#/b': CommonSchema.String})
+        with self.assertRaises(ValueError):
+            MQTTSource(server_uri='tcp://server:1833', topics={'a/b+': CommonSchema.String})
+
+        trie = TopicFilterTrie()
+        for topic_filter in ['a/+/c', 'a/#', '#', 'a/b/c', '$SYS/#']:
+            trie.add(topic_filter, topic_filter)
+        self.assertListEqual(trie.match('a/b/c'), ['a/+/c', 'a/#', '#', 'a/b/c'])
+        self.assertListEqual(trie.match('a'), ['a/#', '#'])
+        self.assertListEqual(trie.match('x/y'), ['#'])
+        self.assertListEqual(trie.match('$SYS/broker'), ['$SYS/#'])
+        route = _Route(['sensors/+/temperature', 'alerts/#'], 'topic')
+        self.assertEqual(route({'topic': 'sensors/s1/temperature'}), 0)
+        self.assertEqual(route({'topic': 'alerts'}), 1)
+        self.assertEqual(route({'topic': 'sensors/s1/humidity'}), -1)
+
+    def _placements(self, topo):
+        graph = topo.graph.generateSPLGraph()
+        return [(op['kind'], op['config'].get('placement', {})) for op in graph['operators']]
+
+    def test_congestion_policy(self):
+        topo = Topology()
+        sink = MQTTSink('tcp://server:1833', topic='t', queue_size=1000, congestion_policy='drop_first')
+        topo.source(['a']).as_string().for_each(sink)
+        queues = [op['config'].get('queue') for op in topo.graph.generateSPLGraph()['operators']]
+        self.assertDictEqual(queues[-1], {'inputPortName': 'as_string', 'congestionPolicy': 'Sys.DropFirst', 'queueSize': '1000'})
+        with self.assertRaises(ValueError):
+            MQTTSink('tcp://server:1833', topic='t', congestion_policy='drop')
+        with self.assertRaises(ValueError):
+            MQTTSink('tcp://server:1833', topic='t', queue_size=0)
+
+        for policy, expected in [('drop_first', [2, 3]), ('drop_last', [0, 1])]:
+            queue = _CongestionQueue(2, policy)
+            for i in range(4):
+                queue.put(i)
+            self.assertEqual(queue.dropped, 2)
+            self.assertListEqual([queue.get_nowait(), queue.get_nowait()], expected)
+            self.assertIsNone(queue.get_nowait())
+
+    def test_lanes(self):
+        topo = Topology()
+        stream = topo.source([('a', 't', 'critical', 2)]).map(schema='tuple<rstring data, rstring topic, rstring priority, int32 qos>')
+        sink = MQTTSink('tcp://server:1833', topic_attribute_name='topic', qos_attribute_name='qos', compression='zlib')
+        stream.for_each(sink)
+        self.assertEqual(sink._op.params['qosAttributeName'], 'qos')
+        self.assertEqual(str(sink._op._op().inputPorts[0].schema), 'tuple<blob data, rstring topic, int32 qos>')
+        with self.assertRaises(ValueError):
+            stream.for_each(MQTTSink('tcp://server:1833', topic='t', qos=1, qos_attribute_name='qos'))
+        with self.assertRaises(ValueError):
+            stream.for_each(MQTTSink('tcp://server:1833', topic='t', qos_attribute_name='qos', batch_size=10))
+
+        sink = MQTTSink('tcp://server:1833', topic_attribute_name='topic', client_id='ingest', lane_attribute_name='priority', lanes={
+            'critical': {'qos': 2, 'queue_size': 100},
+            'bulk': {'qos': 0, 'queue_size': 100000, 'congestion_policy': 'drop_first'}})
+        stream.for_each(sink)
+        critical = sink._lane_sinks['critical']._op
+        bulk = sink._lane_sinks['bulk']._op
+        self.assertIsNot(critical, bulk)
+        self.assertEqual(critical.params['qos'], 2)
+        self.assertEqual(bulk.params['qos'], 0)
+        self.assertEqual(critical.params['clientID'], 'ingest-critical')
+        self.assertEqual(bulk.params['clientID'], 'ingest-bulk')
+        self.assertEqual(critical._op().config['queue']['queueSize'], '100')
+        self.assertEqual(bulk._op().config['queue']['congestionPolicy'], 'Sys.DropFirst')
+        # the lanes are not changed by the copies
+        self.assertIsNone(sink.qos)
+        self.assertEqual(sink.client_id, 'ingest')
+
+        lane = _Lane(['critical', 'bulk'], 'priority')
+        self.assertEqual(lane({'priority': 'critical'}), 0)
+        self.assertEqual(lane({'priority': 'bulk'}), 1)
+        self.assertEqual(lane({'priority': 'unknown'}), 1)
+        with self.assertRaises(ValueError):
+            MQTTSink('tcp://server:1833', topic='t', lanes={'critical': {'topic_attribute': 'x'}})
+        with self.assertRaises(ValueError):
+            stream.for_each(MQTTSink('tcp://server:1833', topic='t', lanes={'critical': {'qos': 2}}))
+
+    @staticmethod
+    def _rest_metric(name, value, kind):
+        metric = mock.Mock(value=value, metricKind=kind)
+        metric.name = name
+        return metric
+
+    def _rest_operator(self, name, metrics, port_metrics):
+        operator = mock.Mock(operatorKind='com.ibm.streamsx.mqtt::MQTTSink')
+        operator.name = name
+        operator.get_metrics.return_value = [self._rest_metric(*m) for m in metrics]
+        port = mock.Mock()
+        port.get_metrics.return_value = [self._rest_metric(*m) for m in port_metrics]
+        operator.get_input_ports.return_value = [port]
+        return operator
+
+    def test_metrics(self):
+        topo = Topology()
+        sink = MQTTSink('tcp://server:1833', topic='t', queue_size=1000, parallel_width=2)
+        with self.assertRaises(ValueError):
+            sink.metrics(mock.Mock())
+        topo.source(['a']).as_string().for_each(sink, name='publish')
+        self.assertListEqual(sink._operator_names(), ['publish'])
+
+        operators = [self._rest_operator('publish[' + str(i) + ']', [('isConnected', 1, 'gauge')],
+                                         [('queueSize', 1000, 'gauge'), ('nTuplesDropped', 3 * i, 'counter')]) for i in range(2)]
+        job = mock.Mock()
+        job.name = 'app::job'
+        job.get_operators.return_value = operators
+        snapshots = sink.metrics(job)
+        pattern = job.get_operators.call_args[1]['name']
+        self.assertRegex('publish[1]', pattern)
+        self.assertNotRegex('publish_2', pattern)
+        self.assertListEqual([s.channel for s in snapshots], [0, 1])
+        self.assertDictEqual(snapshots[1].metrics, {'isConnected': 1})
+        self.assertDictEqual(snapshots[1].input_ports[0], {'queueSize': 1000, 'nTuplesDropped': 3})
+
+        sink = MQTTSink('tcp://server:1833', topic_attribute_name='topic', lane_attribute_name='priority',
+                        lanes={'critical': {'qos': 2}, 'bulk': {'qos': 0}})
+        topo.source([('a', 't', 'bulk')]).map(schema='tuple<rstring data, rstring topic, rstring priority>').for_each(sink, name='lanes')
+        self.assertListEqual(sink._operator_names(), ['lanes_critical', 'lanes_bulk'])
+        source = MQTTSource('tcp://server:1833', 'a/b', CommonSchema.String, backend='python')
+        topo.source(source, name='subscribe')
+        self.assertListEqual(source._operator_names(), ['subscribe'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'mqtt.prom')
+            with self.assertRaises(ValueError):
+                PrometheusExporter(job, [sink], path, interval=0)
+            job.get_operators.return_value = operators[:1]
+            exporter = PrometheusExporter(job, [source], path)
+            exporter.poll()
+            with open(path) as f:
+                text = f.read()
+            self.assertListEqual(os.listdir(directory), ['mqtt.prom'])
+        self.assertIn('# TYPE streams_mqtt_nTuplesDropped counter\n', text)
+        self.assertIn('# TYPE streams_mqtt_queueSize gauge\n', text)
+        self.assertIn('streams_mqtt_queueSize{job="app::job",operator="publish[0]",channel="0",port="0"} 1000\n', text)
+        self.assertIn('streams_mqtt_isConnected{job="app::job",operator="publish[0]",channel="0"} 1\n', text)
+
+    def test_template(self):
+        topo = Topology()
+        stream = topo.source(['a']).as_string()
+        template = MQTTSink.template('tcp://server:1833', qos=1, client_id='publisher', queue_size=100)
+        self.assertFalse(hasattr(template, 'qos'))
+        with self.assertRaises(ValueError):
+            template.clone()
+        with self.assertRaises(ValueError):
+            template.clone(topic='t', topic_attribute_name='topic')
+        with self.assertRaises(ValueError):
+            template.clone(topic='t', unknown=1)
+        with self.assertRaises(ValueError):
+            MQTTSink.template('tcp://server:1833', truststore='/ts.jks')
+        sinks = [template.clone(topic='devices/' + str(i)) for i in range(3)]
+        sinks.append(template.clone(topic='devices/x', qos=2, client_id='x'))
+        for sink in sinks:
+            self.assertIsInstance(sink, MQTTSink)
+            stream.for_each(sink)
+        self.assertEqual(sinks[0].qos, 1)
+        self.assertEqual(sinks[3].qos, 2)
+        self.assertLess(len(sinks[0].__dict__), len(MQTTSink('tcp://server:1833', topic='t').__dict__))
+        ops = [op for op in topo.graph.generateSPLGraph()['operators'] if op['kind'] == 'com.ibm.streamsx.mqtt::MQTTSink']
+        self.assertListEqual([op['parameters']['topic']['value'] for op in ops], ['devices/0', 'devices/1', 'devices/2', 'devices/x'])
+        self.assertListEqual([op['parameters']['qos']['value'] for op in ops], [1, 1, 1, 2])
+        self.assertEqual(ops[0]['parameters']['clientID']['value'], 'publisher')
+        self.assertEqual(ops[3]['parameters']['clientID']['value'], 'x')
+        self.assertEqual(ops[1]['config']['queue']['queueSize'], '100')
+
+        template = MQTTSink.template('tcp://server:1833', topic_attribute_name='topic')
+        sink = template.clone()
+        topo.source([('a', 't')]).map(schema='tuple<rstring data, rstring topic>').for_each(sink)
+        self.assertEqual(sink._op.params['topicAttributeName'], 'topic')
+
+        # the clones do not share the lists and dicts of the template
+        template = MQTTSink.template('tcp://server:1833', topic='t', vm_arg=['-Xmx1g'], resource_tags=['a'], colocate_with=[stream],
+                                     lanes={'fast': {'qos': 0}}, lane_attribute_name='lane')
+        sinks = [template.clone(), template.clone()]
+        sinks[0].vm_arg.append('-Xss1m')
+        sinks[0].lanes['fast']['qos'] = 1
+        self.assertListEqual(sinks[1].vm_arg, ['-Xmx1g'])
+        self.assertDictEqual(sinks[1].lanes, {'fast': {'qos': 0}})
+        self.assertListEqual(template.clone().vm_arg, ['-Xmx1g'])
+        self.assertIs(sinks[1].colocate_with[0], stream)
+        # the topic check is not an option of the constructor
+        with self.assertRaises(ValueError):
+            MQTTSink('tcp://server:1833', _template=True)
+
+    def test_build_profiler(self):
+        topo = Topology()
+        stream = topo.source(['a']).as_string()
+        for i in range(4):
+            stream.for_each(MQTTSink('tcp://server:1833', topic='t'))
+            stream.for_each(MQTTSink('tcp://server:1833', topic='t'), name='publish')
+        stream.for_each(MQTTSink('tcp://server:1833', topic='t'), name='MQTTSink_7')
+        with BuildProfiler() as profiler:
+            stream.for_each(MQTTSink('tcp://server:1833', topic='t'))
+            topo.source(MQTTSource('tcp://server:1833', 'a/b', CommonSchema.String))
+        # the names are the names that Topology creates
+        names = [op.name for op in topo.graph.operators if op.kind == 'com.ibm.streamsx.mqtt::MQTTSink']
+        self.assertListEqual(names, ['MQTTSink', 'publish', 'MQTTSink_2', 'publish_2', 'MQTTSink_3', 'publish_3',
+                                     'MQTTSink_4', 'publish_4', 'MQTTSink_7', 'MQTTSink_5'])
+        stats = profiler.stats()
+        self.assertEqual(stats['populate']['calls'], 2)
+        for phase in ('validate', 'params', 'operator', 'transform'):
+            self.assertIn(phase, stats)
+            self.assertLessEqual(stats[phase]['seconds'], stats['populate']['seconds'])
+        self.assertIn('populate', profiler.report())
+        stream.for_each(MQTTSink('tcp://server:1833', topic='t'))
+        self.assertEqual(profiler.stats()['populate']['calls'], 2)
+
+    def test_overflow_policy(self):
+        topo = Topology()
+        src = MQTTSource('tcp://server:1833', 'a/#', CommonSchema.String, message_queue_size=1000, overflow_policy='drop_oldest')
+        stream = topo.source(src, name='telemetry')
+        ops = topo.graph.generateSPLGraph()['operators']
+        buffer = [op for op in ops if op['kind'] == 'spl.relational::Filter']
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(buffer[0]['config']['queue']['congestionPolicy'], 'Sys.DropFirst')
+        self.assertEqual(buffer[0]['config']['queue']['queueSize'], '1000')
+        self.assertEqual(str(stream.oport.schema), str(CommonSchema.String))
+        self.assertListEqual(src._operator_names(), ['telemetry', 'telemetry_buffer'])
+        src = MQTTSource('tcp://server:1833', 'a/#', CommonSchema.String)
+        topo.source(src)
+        self.assertEqual(src.overflow_policy, 'block')
+        self.assertEqual(len([op for op in topo.graph.operators if op.kind == 'spl.relational::Filter']), 1)
+        with self.assertRaises(ValueError):
+            MQTTSource('tcp://server:1833', 'a/#', CommonSchema.String, overflow_policy='drop_first')
+
+        coalesce_subscriptions(topo)
+        src = MQTTSource('tcp://server:1833', 'b/#', CommonSchema.String, overflow_policy='drop_newest')
+        self.assertFalse(src._coalescable())
+
+    def test_placement(self):
+        topo = Topology()
+        src = MQTTSource('tcp://server:1833', 'sensors/#', CommonSchema.String, host_pool='ingest', resource_tags=['dmz'], isolate=True)
+        readings = topo.source(src)
+        alerts = readings.filter(lambda r: 'alert' in r)
+        alerts.for_each(MQTTSink('tcp://server:1833', topic='alerts', colocate_with=alerts))
+        placements = self._placements(topo)
+        self.assertEqual(placements[0][0], 'com.ibm.streamsx.mqtt::MQTTSource')
+        self.assertSetEqual(set(placements[0][1]['resourceTags']), {'dmz', 'ingest'})
+        self.assertEqual(placements[1][0], '$Isolate$')
+        self.assertEqual(placements[3][0], 'com.ibm.streamsx.mqtt::MQTTSink')
+        self.assertListEqual(placements[3][1]['colocateTags'], placements[2][1]['colocateTags'])
+
+        # python backend and the transformations of the composite
+        topo = Topology()
+        src = MQTTSource('tcp://server:1833', 'sensors/#', CommonSchema.String, decompress=True, resource_tags='dmz', backend='python')
+        readings = topo.source(src)
+        readings.for_each(MQTTSink('tcp://server:1833', topic='t', compression='zlib', isolate=True, colocate_with=readings, backend='python'))
+        placements = self._placements(topo)
+        self.assertListEqual(placements[0][1]['resourceTags'], ['dmz'])
+        self.assertIn('$Isolate$', [kind for kind, _ in placements])
+        self.assertIn('colocateTags', placements[-1][1])
+
+        with self.assertRaises(TypeError):
+            MQTTSink('tcp://server:1833', topic='t', colocate_with='stream')
+        with self.assertRaises(TypeError):
+            MQTTSink('tcp://server:1833', topic='t', resource_tags=[1])
+        with self.assertRaises(ValueError):
+            MQTTSink('tcp://server:1833', topic='t', host_pool='')
+
+    def test_connection(self):
+        topo = Topology()
+        conn = MQTTConnection('broker', 'tcp://server:1833', username='user', password='a"b&c', command_timeout_millis=500)
+        src = MQTTSource(None, 'sensors/#', CommonSchema.String, connection=conn, client_id='c1')
+        stream = topo.source(src)
+        sinks = [MQTTSink(None, topic='t' + str(i), connection=conn) for i in range(3)]
+        for sink in sinks:
+            stream.for_each(sink)
+        self.assertEqual(src._op.params['connection'], 'broker')
+        self.assertEqual(src._op.params['clientID'], 'c1')
+        document_path = src._op.params['connectionDocument']
+        for sink in sinks:
+            self.assertIs(sink._op.params['connectionDocument'], document_path)
+            for param_name in ['serverURI', 'userID', 'password', 'keepAliveInterval']:
+                self.assertNotIn(param_name, sink._op.params)
+            # not defined by the connection document schema
+            self.assertEqual(sink._op.params['commandTimeout'].spl_json()['value'], 500)
+            self.assertEqual(sink._op.params['reconnectionBound'], -1)
+        self.assertEqual(len([f for f in topo._files['etc'] if 'mqtt-connections' in f]), 1)
+        document = connection_document(topo)
+        first_path = document_path.spl_json()['value']
+        self.assertRegex(first_path, r'^etc/mqtt-connections/connections-[0-9a-f]{16}\.xml$')
+        mqtt = ET.parse(document.path).getroot().find('connection_specifications/connection_specification[@name="broker"]/MQTT')
+        self.assertEqual(mqtt.get('serverURI'), 'tcp://server:1833')
+        self.assertEqual(mqtt.get('password'), 'a"b&c')
+        for attribute in ['commandTimeout', 'reconnectionBound', 'period']:
+            self.assertIsNone(mqtt.get(attribute))
+        # the file name is the hash of the content
+        with open(document.path) as f:
+            content = f.read()
+        self.assertIn(hashlib.sha256(content.encode('utf-8')).hexdigest()[:16], first_path)
+
+        # a second connection is added to the same document, which is renamed
+        conn2 = MQTTConnection('backup', 'tcp://backup:1833')
+        stream.for_each(MQTTSink(None, topic='t', connection=conn2))
+        names = [c.get('name') for c in ET.parse(document.path).getroot().iter('connection_specification')]
+        self.assertListEqual(names, ['broker', 'backup'])
+        self.assertNotEqual(document_path.spl_json()['value'], first_path)
+        self.assertListEqual(os.listdir(os.path.dirname(document.path)), [os.path.basename(document.path)])
+        # the same content has the same name
+        src2 = MQTTSource(None, 'sensors/#', CommonSchema.String, connection=conn, client_id='c1')
+        Topology().source(src2)
+        self.assertEqual(src2._op.params['connectionDocument'].spl_json()['value'], first_path)
+        with self.assertRaises(ValueError):
+            stream.for_each(MQTTSink(None, topic='t', connection=MQTTConnection('broker', 'tcp://other:1833')))
+
+        with self.assertRaises(ValueError):
+            MQTTSink(None, topic='t')
+        with self.assertRaises(TypeError):
+            MQTTSink(None, topic='t', connection='broker')
+        sink = MQTTSink(None, topic='t', connection=conn, client_id='c2', backend='python')
+        self.assertEqual(sink._engine_params()['server_uri'], 'tcp://server:1833')
+        self.assertEqual(sink._engine_params()['client_id'], 'c2')
+
+    def test_coalesce_subscriptions(self):
+        topo = Topology()
+        coalesce_subscriptions(topo)
+        s1 = MQTTSource(server_uri='tcp://server:1833', topics='plant/+/temp', schema=CommonSchema.String)
+        s2 = MQTTSource(server_uri='tcp://server:1833', topics=['plant/#'], schema='tuple<rstring data, rstring t>', topic_attribute_name='t', message_queue_size=1000)
+        s3 = MQTTSource(server_uri='tcp://server:1833', topics={'office/+/temp': CommonSchema.Json, 'plant/a/temp': CommonSchema.String})
+        s6 = MQTTSource(server_uri='tcp://server:1833', topics='office/#', schema=CommonSchema.Binary, isolate=True)
+        # different connection settings
+        s4 = MQTTSource(server_uri='tcp://server:1833', topics='plant/#', schema=CommonSchema.String, client_id='c4')
+        # not coalesced
+        s5 = MQTTSource(server_uri='tcp://server:1833', topics='plant/#', schema=CommonSchema.String, parallel_width=2)
+        # different placement
+        s7 = MQTTSource(server_uri='tcp://server:1833', topics='plant/#', schema=CommonSchema.String, resource_tags=['t7'])
+        streams = [topo.source(s) for s in [s1, s2, s3, s4, s5, s6, s7]]
+        self.assertIs(s1._op, s2._op)
+        self.assertIs(s3._op, s6._op)
+        self.assertIsNot(s1._op, s3._op)
+        self.assertIsNot(s1._op, s4._op)
+        self.assertIsNot(s1._op, s5._op)
+        self.assertIsNot(s1._op, s7._op)
+        # the subscriptions are resolved when the SPL graph is generated
+        self.assertDictEqual(s1._op.params['topics'].spl_json(), {'value': ['plant/#']})
+        self.assertDictEqual(s1._op.params['messageQueueSize'].spl_json(), {'value': 1000})
+        self.assertDictEqual(s3._op.params['topics'].spl_json(), {'value': ['plant/a/temp', 'office/#']})
+        self.assertEqual(str(s1._op.outputs[0].oport.schema), 'tuple<rstring data, rstring topic>')
+        self.assertEqual(str(s3._op.outputs[0].oport.schema), 'tuple<blob data, rstring topic>')
+        self.assertDictEqual(s4._op.params['topics'].spl_json(), {'value': ['plant/#']})
+        self.assertIs(streams[0].oport.schema, CommonSchema.String)
+        self.assertEqual(str(streams[1].oport.schema), 'tuple<rstring data, rstring t>')
+        self.assertIs(streams[5].oport.schema, CommonSchema.Binary)
+        self.assertIs(s3.streams['office/+/temp'].oport.schema, CommonSchema.Json)
+        self.assertEqual(len([op for op in topo.graph.operators if op.kind == 'com.ibm.streamsx.mqtt::MQTTSource']), 5)
+        # the sources with schemas of the shared operator select their messages with an SPL Functor
+        functors = [op for op in topo.graph.operators if op.kind == 'spl.relational::Functor']
+        self.assertEqual(len(functors), 5)
+        filters = [op.params['filter'].spl_json()['value'] for op in functors]
+        self.assertEqual(filters[0], '(size(regexMatch(topic, "^plant/[^/]*/temp$")) > 0)')
+        self.assertEqual(filters[1], '(size(regexMatch(topic, "^plant(/.*)?$")) > 0)')
+        self.assertEqual(filters[3], '(size(regexMatch(topic, "^office(/.*)?$")) > 0)')
+        # only the demultiplexed source s3 decodes with Python operators
+        self.assertEqual(len([op for op in topo.graph.operators if op.kind.startswith('com.ibm.streamsx.topology.functional.python')]), 5)
+        graph = topo.graph.generateSPLGraph()
+        sources = [op for op in graph['operators'] if op['kind'] == 'com.ibm.streamsx.mqtt::MQTTSource']
+        self.assertDictEqual(sources[0]['parameters']['topics'], {'value': ['plant/#']})
+        # the isolation of s6 is behind its own Functor, the shared operator has no isolation marker
+        self.assertEqual(len([op for op in graph['operators'] if op['kind'] == '$Isolate$']), 1)
+
+        # disabled by default
+        topo = Topology()
+        s1 = MQTTSource(server_uri='tcp://server:1833', topics='a', schema=CommonSchema.String)
+        s2 = MQTTSource(server_uri='tcp://server:1833', topics='a', schema=CommonSchema.String)
+        topo.source(s1)
+        topo.source(s2)
+        self.assertIsNot(s1._op, s2._op)
+
+        # the sources colocated with the same operators share the operator
+        topo = Topology()
+        coalesce_subscriptions(topo)
+        a = topo.source(['a'])
+        b = topo.source(['b'])
+        sources = [MQTTSource(server_uri='tcp://server:1833', topics=t, schema=CommonSchema.String, colocate_with=c)
+                   for t, c in [('a', [a, b]), ('b', [b, a]), ('c', [a]), ('d', a)]]
+        for source in sources:
+            topo.source(source)
+        self.assertIs(sources[0]._op, sources[1]._op)
+        self.assertIsNot(sources[0]._op, sources[2]._op)
+        self.assertIs(sources[2]._op, sources[3]._op)
+
+        self.assertTrue(filter_covers('plant/#', 'plant/+/temp'))
+        self.assertTrue(filter_covers('plant/#', 'plant'))
+        self.assertTrue(filter_covers('plant/+/temp', 'plant/a/temp'))
+        self.assertTrue(filter_covers('+/+/temp', 'plant/+/temp'))
+        self.assertFalse(filter_covers('plant/+/temp', 'plant/#'))
+        self.assertFalse(filter_covers('plant/+', 'plant/a/temp'))
+        self.assertFalse(filter_covers('#', '$SYS/broker'))
+        self.assertListEqual(minimal_cover(['a/+/c', 'a/#', 'b', 'a/#', 'b/c']), ['a/#', 'b', 'b/c'])
+
+    def test_payload_format(self):
+        schema = 'tuple<rstring id, int64 ts, float64 value, rstring[4] unit, rstring topic>'
+        topo = Topology()
+        stream = topo.source([('s1', 1580000000, 21.5, 'C', 't1')]).map(schema=schema)
+        s = MQTTSink(server_uri='tcp://server:1833', topic_attribute_name='topic', payload_format='json', fields=['ts', 'value'])
+        stream.for_each(s)
+        self.assertEqual(s._op.params['dataAttributeName'], 'data')
+        self.assertEqual(str(s._op._op().inputPorts[0].schema), 'tuple<blob data, rstring topic>')
+        encoder = s._encoder(stream.oport.schema)
+        tuple_ = {'id': 's1', 'ts': 1580000000, 'value': 21.5, 'unit': 'C', 'topic': 't1'}
+        self.assertDictEqual(json.loads(encoder(tuple_).decode('utf-8')), {'ts': 1580000000, 'value': 21.5})
+
+        s = MQTTSink(server_uri='tcp://server:1833', topic_attribute_name='topic', payload_format='struct', fields=['ts', 'value', 'unit'])
+        self.assertEqual(s._encoder(stream.oport.schema)(tuple_), struct.pack('!qd4s', 1580000000, 21.5, b'C'))
+        # unbounded strings have no fixed layout
+        s = MQTTSink(server_uri='tcp://server:1833', topic_attribute_name='topic', payload_format='struct')
+        self.assertRaises(TypeError, s._encoder, stream.oport.schema)
+        # all attributes except the topic
+        s = MQTTSink(server_uri='tcp://server:1833', topic_attribute_name='topic', payload_format='json')
+        self.assertDictEqual(json.loads(s._encoder(stream.oport.schema)(tuple_).decode('utf-8')), {'id': 's1', 'ts': 1580000000, 'value': 21.5, 'unit': 'C'})
+        # serialization and batching are done in the batch aggregation
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t1', payload_format='json', batch_size=10)
+        stream.for_each(s)
+        self.assertEqual(str(s._op._op().inputPorts[0].schema), 'tuple<blob data>')
+
+        with self.assertRaises(ValueError):
+            MQTTSink(server_uri='tcp://server:1833', topic='t1', payload_format='xml')
+        with self.assertRaises(TypeError):
+            MQTTSink(server_uri='tcp://server:1833', topic='t1', payload_format='json', fields='ts')
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t1', payload_format='json', fields=['unknown'])
+        self.assertRaises(ValueError, stream.for_each, s)
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t1', fields=['ts'])
+        self.assertRaises(ValueError, stream.for_each, s)
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t1', payload_format='json', data_attribute_name='id')
+        self.assertRaises(ValueError, stream.for_each, s)
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t1', payload_format='json')
+        self.assertRaises(TypeError, topo.source(['x']).as_string().for_each, s)
+
+    def test_source_payload_format(self):
+        schema = 'tuple<rstring id, int64 ts, float64 value, boolean ok, list<int32> codes, rstring topic>'
+        topo = Topology()
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, topic_attribute_name='topic',
+                         payload_format='json', field_map={'value': 'reading.value', 'ok': 'reading.ok'})
+        stream = topo.source(src)
+        # the Java operator receives the payload as blob
+        self.assertEqual(str(src._op.outputs[0].oport.schema), 'tuple<blob data, rstring topic>')
+        self.assertEqual(str(stream.oport.schema), schema)
+
+        decoder = src._decoder(stream.oport.schema)
+        self.assertDictEqual(decoder(b'{"id": "s1", "ts": 7, "reading": {"value": 2.5, "ok": true}, "codes": [1, 2]}'),
+                             {'id': 's1', 'ts': 7, 'value': 2.5, 'ok': True, 'codes': [1, 2]})
+        # missing values get the defaults of the attribute types
+        self.assertDictEqual(decoder(b'{"ts": 7}'), {'id': '', 'ts': 7, 'value': 0.0, 'ok': False, 'codes': []})
+        for malformed in [b'{"ts": ', b'[1, 2]', b'\xff', b'{"ts": "seven"}', b'{"reading": {"ok": 1}}']:
+            self.assertIsNone(decoder(malformed))
+        decode = _Decode('struct', 'data', 'topic', decoder=decoder)
+        self.assertListEqual(decode({'data': b'{"id": "s1"}', 'topic': 't'}),
+                             [{'id': 's1', 'ts': 0, 'value': 0.0, 'ok': False, 'codes': [], 'topic': 't'}])
+        self.assertListEqual(decode({'data': b'not json', 'topic': 't'}), [])
+        self.assertEqual(decode.malformed, 1)
+
+        # the JSONToTuple operator parses payloads without a field_map that renames keys
+        topo = Topology()
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, topic_attribute_name='topic',
+                         payload_format='json', field_map={'ts': 'ts'})
+        stream = topo.source(src)
+        self.assertEqual(str(src._op.outputs[0].oport.schema), 'tuple<rstring jsonString, rstring topic>')
+        self.assertEqual(src._op.params['dataAttributeName'], 'jsonString')
+        self.assertEqual(str(stream.oport.schema), schema)
+        kinds = [op.kind for op in topo.graph.operators]
+        self.assertListEqual(kinds, ['com.ibm.streamsx.mqtt::MQTTSource', 'com.ibm.streamsx.json::JSONToTuple',
+                                     'com.ibm.streamsx.topology.functional.python::ForEach'])
+        self.assertIn('com.ibm.streamsx.json', [tk['name'] for tk in topo.graph._spl_toolkits])
+
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema='tuple<int64 ts, float64 value, rstring[4] unit>', payload_format='struct')
+        topo.source(src)
+        decoder = src._decoder(StreamSchema('tuple<int64 ts, float64 value, rstring[4] unit>'))
+        self.assertDictEqual(decoder(struct.pack('!qd4s', 7, 2.5, b'C')), {'ts': 7, 'value': 2.5, 'unit': 'C'})
+        self.assertIsNone(decoder(b'short'))
+
+        with self.assertRaises(ValueError):
+            MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, payload_format='xml')
+        with self.assertRaises(TypeError):
+            MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, payload_format='json', field_map=['value'])
+        with self.assertRaises(ValueError):
+            MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, payload_format='json', field_map={'value': 'reading..value'})
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, payload_format='json', field_map={'unknown': 'x'})
+        self.assertRaises(ValueError, topo.source, src)
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, field_map={'value': 'x'})
+        self.assertRaises(ValueError, topo.source, src)
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, payload_format='struct', field_map={'value': 'x'})
+        self.assertRaises(ValueError, topo.source, src)
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, payload_format='json', data_attribute_name='id')
+        self.assertRaises(ValueError, topo.source, src)
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.Json, payload_format='json')
+        self.assertRaises(TypeError, topo.source, src)
+
+    def test_dedupe(self):
+        topo = Topology()
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.Json, qos=1, dedupe_window=1000)
+        stream = topo.source(src)
+        self.assertIsNot(stream, src._op.outputs[0])
+        self.assertIs(stream.oport.schema, CommonSchema.Json)
+        self.assertListEqual(src._operator_names(), [src._operator_name, src._operator_name + '_dedupe'])
+        schema = 'tuple<rstring id, rstring data, rstring topic>'
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, topic_attribute_name='topic', dedupe_seconds=60, dedupe_key='id')
+        self.assertEqual(str(topo.source(src).oport.schema), schema)
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, dedupe_window=10, dedupe_key='unknown')
+        self.assertRaises(ValueError, topo.source, src)
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.String, dedupe_window=10, dedupe_key='id')
+        self.assertRaises(TypeError, topo.source, src)
+        with self.assertRaises(ValueError):
+            MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, dedupe_window=0)
+        with self.assertRaises(TypeError):
+            MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, dedupe_window=1.5)
+        with self.assertRaises(ValueError):
+            MQTTSource(server_uri='tcp://server:1833', topics='t', schema=schema, dedupe_seconds=0)
+
+        # size eviction
+        dedupe = _Dedupe(2)
+        self.assertListEqual([dedupe(p) for p in ['a', 'b', 'a', 'c', 'a', 'c']], [True, True, False, True, True, False])
+        self.assertEqual(dedupe.duplicates, 2)
+        self.assertEqual(len(dedupe._seen), 2)
+        # time eviction
+        now = [0.0]
+        dedupe = _Dedupe(100, 10.0, attribute_name='id', clock=lambda: now[0])
+        self.assertTrue(dedupe({'id': 'm1', 'data': 'x'}))
+        now[0] = 5.0
+        self.assertFalse(dedupe({'id': 'm1', 'data': 'y'}))
+        self.assertTrue(dedupe({'id': 'm2', 'data': 'x'}))
+        now[0] = 12.0
+        self.assertTrue(dedupe({'id': 'm1', 'data': 'x'}))
+        self.assertFalse(dedupe({'id': 'm2', 'data': 'x'}))
+        # JSON objects are compared by value
+        dedupe = _Dedupe(10)
+        self.assertTrue(dedupe({'a': 1, 'b': [1, 2]}))
+        self.assertFalse(dedupe({'b': [1, 2], 'a': 1}))
+        self.assertTrue(dedupe(memoryview(b'x')))
+        self.assertFalse(dedupe(b'x'))
+        # distinct keys with the same built-in hash are no duplicates
+        dedupe = _Dedupe(100, attribute_name='id')
+        ids = [-1, -2, 5, 5 + 2 ** 61 - 1]
+        self.assertListEqual([dedupe({'id': i}) for i in ids], [True, True, True, True])
+        self.assertListEqual([dedupe({'id': i}) for i in ids], [False, False, False, False])
+
+    def test_chunking(self):
+        topo = Topology()
+        stream = topo.source(['Hello']).as_string()
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t1', max_message_bytes=1024)
+        stream.for_each(s)
+        self.assertEqual(s._op.params['dataAttributeName'], 'data')
+        self.assertEqual(str(s._op._op().inputPorts[0].schema), 'tuple<blob data>')
+        with self.assertRaises(ValueError):
+            s.max_message_bytes = 20
+        with self.assertRaises(TypeError):
+            s.max_message_bytes = 1024.0
+
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.Json, reassemble=True)
+        stream = topo.source(src)
+        self.assertEqual(str(src._op.outputs[0].oport.schema), 'tuple<blob data>')
+        self.assertIs(stream.oport.schema, CommonSchema.Json)
+        src = MQTTSource(server_uri='tcp://server:1833', topics='$share/g/t', schema=CommonSchema.Json, reassemble=True)
+        self.assertRaises(ValueError, topo.source, src)
+        with self.assertRaises(ValueError):
+            MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.Json, reassembly_max_bytes=0)
+        with self.assertRaises(ValueError):
+            MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.Json, reassembly_timeout_seconds=0)
+
+        payload = os.urandom(1000)
+        chunks = chunk(payload, 100)
+        self.assertEqual(len(chunks), 13)
+        self.assertTrue(all(len(c) <= 100 for c in chunks))
+        self.assertListEqual(chunk(b'abc', 100), [b'abc'])
+        reassemble = _Reassemble(10000, 60.0)
+        # chunks in any order, with redeliveries
+        results = [reassemble(c) for c in reversed(chunks[1:])] + [reassemble(chunks[5]), reassemble(chunks[0])]
+        self.assertTrue(all(r is None for r in results[:-1]))
+        self.assertEqual(results[-1], payload)
+        self.assertEqual((reassemble.reassembled, reassemble.evicted, reassemble.bytes), (1, 0, 0))
+        self.assertEqual(reassemble(b'abc'), b'abc')
+        # memory bound, the oldest incomplete message is evicted
+        reassemble = _Reassemble(1500, 60.0)
+        first, second = chunk(payload, 100), chunk(payload, 100)
+        for c in first[:10] + second[:10]:
+            self.assertIsNone(reassemble(c))
+        self.assertEqual(reassemble.evicted, 1)
+        self.assertLessEqual(reassemble.bytes, 1500)
+        self.assertIsNone(reassemble(first[12]))
+        self.assertListEqual([reassemble(c) for c in second[10:]], [None, None, payload])
+        # timeout
+        now = [0.0]
+        reassemble = _Reassemble(10000, 10.0, clock=lambda: now[0])
+        self.assertIsNone(reassemble(first[0]))
+        now[0] = 11.0
+        self.assertIsNone(reassemble(second[0]))
+        self.assertEqual(reassemble.evicted, 1)
+        self.assertListEqual([reassemble(c) for c in first[1:]], [None] * 12)
+
+        # chunking after compression and batching
+        message = {'reading': [1.5] * 1000}
+        messages = _Encode('json', None, None, compression='zlib', max_bytes=30)(message)
+        self.assertGreater(len(messages), 1)
+        decode = _Decode('json', 'data', None, decompress=True, reassembler=_Reassemble(10000, 60.0))
+        decoded = [decode(m) for m in messages]
+        self.assertListEqual(decoded, [[]] * (len(messages) - 1) + [[message]])
+        messages = _Batch('string', None, None, 10, 'length_prefixed', max_bytes=64)(['a' * 100, 'b' * 100])
+        self.assertEqual(len(messages), 5)
+        decode = _Decode('string', 'data', None, batch_format='length_prefixed', reassembler=_Reassemble(10000, 60.0))
+        self.assertListEqual([t for m in messages for t in decode(m)], ['a' * 100, 'b' * 100])
+
+    def test_rate_limit(self):
+        topo = Topology()
+        stream = topo.source([{'topic': 't', 'data': 'x'}]).map(schema='tuple<rstring topic, rstring data>')
+        s = MQTTSink(server_uri='tcp://server:1833', topic_attribute_name='topic', max_rate=100, burst=10, per_topic_rate=5.5)
+        stream.for_each(s)
+        self.assertListEqual(s._operator_names(), [s._operator_name, s._rate_operator_name])
+        self.assertEqual(str(s._op._op().inputPorts[0].schema), 'tuple<rstring topic, rstring data>')
+        rate_op = [o for o in topo.graph.operators if o.name == s._rate_operator_name][0]
+        self.assertEqual(rate_op.config['queue']['queueSize'], '1000')
+        self.assertEqual(rate_op.config['queue']['congestionPolicy'], 'Sys.Wait')
+        s = MQTTSink(server_uri='tcp://server:1833', topic_attribute_name='topic', max_rate=100, rate_limit_policy='drop')
+        stream.for_each(s)
+        rate_op = [o for o in topo.graph.operators if o.name == s._rate_operator_name][0]
+        self.assertNotIn('queue', rate_op.config)
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t', burst=10)
+        self.assertRaises(ValueError, stream.for_each, s)
+        s = MQTTSink(server_uri='tcp://server:1833', topic='t', per_topic_rate=10)
+        self.assertRaises(ValueError, stream.for_each, s)
+        with self.assertRaises(ValueError):
+            MQTTSink(server_uri='tcp://server:1833', topic='t', max_rate=0)
+        with self.assertRaises(TypeError):
+            MQTTSink(server_uri='tcp://server:1833', topic='t', per_topic_rate='10')
+        with self.assertRaises(TypeError):
+            MQTTSink(server_uri='tcp://server:1833', topic='t', max_rate=10, burst=1.5)
+        with self.assertRaises(ValueError):
+            MQTTSink(server_uri='tcp://server:1833', topic='t', max_rate=10, rate_limit_policy='block')
+
+        now = [0.0]
+        def sleep(seconds):
+            now[0] += seconds
+        # the burst passes, then the messages are delayed to the rate
+        rate_limit = _RateLimit(10, burst=5, clock=lambda: now[0], sleep=sleep)
+        self.assertTrue(all(rate_limit('m') for _ in range(25)))
+        self.assertEqual(rate_limit.delayed, 20)
+        self.assertAlmostEqual(now[0], 2.0)
+        now[0] += 1.0
+        self.assertTrue(all(rate_limit('m') for _ in range(10)))
+        self.assertEqual(rate_limit.delayed, 25)
+        # drop policy with per-topic buckets
+        now[0] = 0.0
+        rate_limit = _RateLimit(topic_rate=1, topic_attribute_name='topic', policy='drop', clock=lambda: now[0], sleep=sleep)
+        passed = [rate_limit({'topic': t}) for t in ['a', 'a', 'b', 'b', 'a']]
+        self.assertListEqual(passed, [True, False, True, False, False])
+        self.assertEqual(rate_limit.dropped, 3)
+        now[0] = 1.0
+        self.assertTrue(rate_limit({'topic': 'a'}))
+        # the connection bucket limits all topics
+        rate_limit = _RateLimit(2, topic_rate=10, topic_attribute_name='topic', policy='drop', clock=lambda: now[0])
+        self.assertListEqual([rate_limit({'topic': t}) for t in ['a', 'b', 'c']], [True, True, False])
+        # the buckets of the least recently used topics are evicted
+        rate_limit = _RateLimit(topic_rate=1, topic_attribute_name='topic', policy='drop', max_topics=2, clock=lambda: now[0])
+        self.assertListEqual([rate_limit({'topic': t}) for t in ['a', 'b', 'a', 'c', 'a', 'b']], [True, True, False, True, False, True])
+        self.assertListEqual(list(rate_limit._topics), ['a', 'b'])
+
+    def test_reconnect_backoff(self):
+        options = {'reconnect_delay_millis': 1000, 'reconnect_max_delay_millis': 60000}
+        periods = set()
+        for i in range(2):
+            topo = Topology('App', 'ns')
+            sinks = [MQTTSink(server_uri='tcp://server:1833', topic='t', **options) for _ in range(20)]
+            stream = topo.source(['x']).as_string()
+            with self.assertWarns(UserWarning):
+                for sink in sinks:
+                    stream.for_each(sink)
+            periods.add(tuple(int(str(sink._op.params['period'])) for sink in sinks))
+        # stable between builds, but different between the operators
+        self.assertEqual(len(periods), 1)
+        periods = periods.pop()
+        self.assertGreater(len(set(periods)), 10)
+        self.assertTrue(all(1000 <= p <= 60000 for p in periods))
+        sink = MQTTSink(server_uri='tcp://server:1833', topic='t')
+        topo.source(['x']).as_string().for_each(sink)
+        self.assertEqual(int(str(sink._op.params['period'])), 30)
+        # the period of an operator with a connection specification
+        conn = MQTTConnection('conn1', 'tcp://server:1833')
+        sink = MQTTSink(None, topic='t', connection=conn, **options)
+        with self.assertWarns(UserWarning):
+            topo.source(['x']).as_string().for_each(sink)
+        self.assertTrue(1000 <= int(str(sink._op.params['period'])) <= 60000)
+
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.String, clean_session=False, backend='python')
+        Topology('App', 'ns').source(src)
+        client_id = src._op._params['client_id']
+        self.assertFalse(src._op._params['clean_session'])
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.String, clean_session=False, backend='python')
+        Topology('App', 'ns').source(src)
+        self.assertEqual(src._op._params['client_id'], client_id)
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.String, clean_session=False, client_id='c1', backend='python')
+        Topology('App', 'ns').source(src)
+        self.assertEqual(src._op._params['client_id'], 'c1')
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.String, clean_session=False)
+        self.assertRaises(ValueError, Topology().source, src)
+        src = MQTTSource(server_uri='tcp://server:1833', topics='t', schema=CommonSchema.String, reconnect_delay_millis=100, reconnect_max_delay_millis=10)
+        self.assertRaises(ValueError, Topology().source, src)
+        with self.assertRaises(ValueError):
+            MQTTSink(server_uri='tcp://server:1833', topic='t', reconnect_jitter=1.5)
+        with self.assertRaises(TypeError):
+            MQTTSink(server_uri='tcp://server:1833', topic='t', reconnect_max_delay_millis=1.5)
+
+        engine = _EngineSink({'server_uri': 'tcp://server:1833', 'reconnect_delay_millis': 100,
+                              'reconnect_max_delay_millis': 1000, 'reconnect_jitter': 0.5}, 'string', topic='t')
+        with mock.patch('random.random', return_value=0.0):
+            self.assertListEqual([engine._reconnect_delay(n) for n in range(6)], [0.1, 0.2, 0.4, 0.8, 1.0, 1.0])
+        with mock.patch('random.random', return_value=1.0):
+            self.assertListEqual([engine._reconnect_delay(n) for n in range(6)], [0.05, 0.1, 0.2, 0.4, 0.5, 0.5])
+
+    def test_ssl_options(self):
+        topo = Topology()
+        sink = MQTTSink(server_uri='ssl://server:8883', topic='t', ssl_protocols=['TLSv1.3', 'TLSv1.2'],
+                        ssl_ciphers=['TLS_ECDHE_RSA_WITH_AES_128_GCM_SHA256'], ssl_debug='handshake', vm_arg='-Xmx1G')
+        topo.source(['x']).as_string().for_each(sink)
+        self.assertEqual(sink._op.params['sslProtocol'], 'TLS')
+        self.assertListEqual(sink._op.params['vmArg'], ['-Xmx1G', '-Djavax.net.debug=ssl:handshake',
+                                                        '-Djdk.tls.client.protocols=TLSv1.3,TLSv1.2',
+                                                        '-Djdk.tls.client.cipherSuites=TLS_ECDHE_RSA_WITH_AES_128_GCM_SHA256'])
+        sink = MQTTSink(server_uri='ssl://server:8883', topic='t', ssl_debug=True)
+        topo.source(['x']).as_string().for_each(sink)
+        self.assertListEqual(sink._op.params['vmArg'], ['-Djavax.net.debug=all'])
+        sink = MQTTSink(server_uri='ssl://server:8883', topic='t', ssl_protocol='TLSv1.2', ssl_protocols=['TLSv1.3'])
+        self.assertRaises(ValueError, topo.source(['x']).as_string().for_each, sink)
+        with self.assertRaises(ValueError):
+            MQTTSink(server_uri='ssl://server:8883', topic='t', ssl_protocols=['SSLv3'])
+        with self.assertRaises(ValueError):
+            MQTTSink(server_uri='ssl://server:8883', topic='t', ssl_debug='verbose')
+        with self.assertRaises(TypeError):
+            MQTTSink(server_uri='ssl://server:8883', topic='t', ssl_ciphers=[1])
+
+        from streamsx.mqtt._engine import _ResumingContext, _create_ssl_context
+        ctx = _create_ssl_context({'ssl_protocols': ['TLSv1.3', 'TLSv1.2'], 'ssl_ciphers': ['ECDHE-RSA-AES128-GCM-SHA256']})
+        self.assertIsInstance(ctx, _ResumingContext)
+        self.assertEqual(ctx.minimum_version, ssl.TLSVersion.TLSv1_2)
+        self.assertEqual(ctx.maximum_version, ssl.TLSVersion.TLSv1_3)
+        self.assertIn('ECDHE-RSA-AES128-GCM-SHA256', [c['name'] for c in ctx.get_ciphers()])
+        self.assertTrue(ctx.check_hostname)
+        self.assertNotIsInstance(_create_ssl_context({'ssl_session_reuse': False}), _ResumingContext)
+        self.assertRaises(ValueError, _create_ssl_context, {'ssl_ciphers': ['NO-SUCH-CIPHER']})
+
+    _IMPORT_PROBE = """
+import sys
+from streamsx.topology.topology import Topology
+from streamsx.topology.schema import CommonSchema
+from streamsx.mqtt import MQTTSink, MQTTSource
+topo = Topology()
+topo.source(MQTTSource('tcp://server:1883', 'a/#', CommonSchema.String)).for_each(MQTTSink('tcp://server:1883', topic='b'))
+print(','.join(m for m in sys.modules if m.startswith('streamsx.mqtt') or m in ('streamsx.toolkits', 'jks', 'OpenSSL')))
+"""
+    # budget in microseconds for the modules of streamsx.mqtt, not including streamsx.topology
+    _IMPORT_BUDGET_US = 100000
+
+    def test_import_time(self):
+        process = Popen([sys.executable, '-X', 'importtime', '-c', self._IMPORT_PROBE], stdout=PIPE, stderr=PIPE)
+        out, err = process.communicate()
+        self.assertEqual(process.returncode, 0, err.decode('utf-8'))
+        modules = out.decode('utf-8').strip().split(',')
+        # keystore tooling, the python engine, and the modules of unused features are loaded on first use only
+        for module in ('streamsx.toolkits', 'jks', 'OpenSSL', 'streamsx.mqtt._engine', 'streamsx.mqtt._functions',
+                       'streamsx.mqtt._metrics', 'streamsx.mqtt._subscriptions', 'streamsx.mqtt._connection'):
+            self.assertNotIn(module, modules)
+        own = 0
+        for line in err.decode('utf-8').splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip().startswith('streamsx.mqtt'):
+                own += int(fields[0].split(':')[1])
+        self.assertGreater(own, 0)
+        self.assertLess(own, self._IMPORT_BUDGET_US)
+
+    def test_store_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with mock.patch.dict(os.environ, {'STREAMSX_MQTT_CACHE_DIR': cache_dir}):
+                params = []
+                for _ in range(2):
+                    topo = Topology()
+                    s = MQTTSource(server_uri='ssl://server:8883', topics='t1', schema=CommonSchema.String,
+                                   trusted_certs=TRUSTED_CERT_PEM, client_cert=CLIENT_CERT_PEM, client_private_key=PRIVATE_KEY_PEM)
+                    topo.source(s)
+                    params.append(s._op.params)
+                self.assertEqual(params[0]['trustStore'], params[1]['trustStore'])
+                self.assertEqual(params[0]['trustStorePassword'], params[1]['trustStorePassword'])
+                self.assertEqual(params[0]['keyStore'], params[1]['keyStore'])
+                self.assertRegex(params[0]['trustStore'], r'^etc/truststore-[0-9a-f]{32}\.jks$')
+                # the cache directory also has the lock file .lock
+                self.assertEqual(sorted(f for f in os.listdir(cache_dir) if f != '.lock'), sorted([os.path.basename(params[0]['trustStore']), os.path.basename(params[0]['trustStore']) + '.pass',
+                                                                        os.path.basename(params[0]['keyStore']), os.path.basename(params[0]['keyStore']) + '.pass']))
+                # opt-out creates new stores in the temp directory
+                s = MQTTSource(server_uri='ssl://server:8883', topics='t1', schema=CommonSchema.String, trusted_certs=TRUSTED_CERT_PEM, store_cache=False)
+                Topology().source(s)
+                self.assertNotEqual(s._op.params['trustStore'], params[0]['trustStore'])
+                self.assertEqual(len(os.listdir(cache_dir)), 5)
+
+    def test_shared_credentials(self):
+        topo = Topology()
+        stream = topo.source(['Hello']).as_string()
+        with mock.patch('streamsx.toolkits.create_truststore', return_value='tpass') as create_ts, \
+             mock.patch('streamsx.toolkits.create_keystore', return_value='kpass') as create_ks, \
+             mock.patch.object(topo, 'add_file_dependency', side_effect=lambda path, location: location + '/' + os.path.basename(path)) as add_dep:
+            sinks = []
+            for i in range(20):
+                s = MQTTSink(server_uri='ssl://server:8883', topic='t' + str(i), trusted_certs=TRUSTED_CERT_PEM,
+                             client_cert=CLIENT_CERT_PEM, client_private_key=PRIVATE_KEY_PEM, store_cache=False)
+                stream.for_each(s)
+                sinks.append(s)
+            s = MQTTSink(server_uri='ssl://server:8883', topic='other', trusted_certs=CLIENT_CA_CERT_PEM, store_cache=False)
+            stream.for_each(s)
+            sinks.append(s)
+        self.assertEqual(create_ts.call_count, 2)
+        self.assertEqual(create_ks.call_count, 1)
+        self.assertEqual(add_dep.call_count, 3)
+        self.assertEqual(len(set(s._op.params['trustStore'] for s in sinks[:20])), 1)
+        self.assertEqual(len(set(s._op.params['keyStore'] for s in sinks[:20])), 1)
+        self.assertNotEqual(sinks[-1]._op.params['trustStore'], sinks[0]._op.params['trustStore'])
+        self.assertEqual(sinks[0]._op.params['trustStorePassword'], 'tpass')
+
+    def test_store_cache_eviction(self):
+        def create(path):
+            with open(path, 'w') as f:
+                f.write(path)
+            return 'passwd'
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = StoreCache(cache_dir, max_entries=2)
+            copies = [cache.get('truststore', [cert], create)[0] for cert in ['cert1', 'cert2']]
+            p1, p2 = [os.path.join(cache_dir, os.path.basename(copy)) for copy in copies]
+            os.utime(p2, (0, 0))
+            # cache hit refreshes the last use of p1, p2 is least recently used
+            self.assertEqual(cache.get('truststore', ['cert1'], create), (copies[0], 'passwd'))
+            p3 = os.path.join(cache_dir, os.path.basename(cache.get('truststore', ['cert3'], create)[0]))
+            self.assertTrue(os.path.exists(p1))
+            self.assertFalse(os.path.exists(p2))
+            self.assertFalse(os.path.exists(p2 + '.pass'))
+            self.assertTrue(os.path.exists(p3))
+            # the store referenced by a build is not removed by the eviction
+            self.assertTrue(os.path.exists(copies[1]))
+            self.assertNotEqual(os.path.dirname(copies[1]), cache_dir)
+
+    def test_store_cache_concurrency(self):
+        def create(path):
+            # every creation gets another password, which is written into the store
+            password = os.urandom(8).hex()
+            with open(path, 'w') as f:
+                f.write(password)
+            time.sleep(0.01)
+            return password
+        def get(cache_dir):
+            results = []
+            for i in range(20):
+                path, password = StoreCache(cache_dir, max_entries=2).get('truststore', ['cert' + str(i % 3)], create)
+                with open(path) as f:
+                    results.append(f.read() == password)
+            return results
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with concurrent.futures.ThreadPoolExecutor(8) as executor:
+                results = [r for f in [executor.submit(get, cache_dir) for _ in range(8)] for r in f.result()]
+            self.assertTrue(all(results))
+            self.assertListEqual([f for f in os.listdir(cache_dir) if f.endswith('.tmp')], [])
+
     def test_options_kwargs_MQTTSink(self):
         print ('\n---------'+str(self))
         sink = MQTTSink(server_uri='tcp://server:1833',
@@ -257,6 +1286,421 @@ class TestParams(unittest.TestCase):
         self.assertEqual(src.message_queue_size, 122)
     
     
+class TestPythonBackend(unittest.TestCase):
+    def setUp(self):
+        self.broker = StandInBroker().start()
+
+    def tearDown(self):
+        self.broker.stop()
+
+    def test_populate(self):
+        topo = Topology()
+        src = MQTTSource(server_uri=self.broker.server_uri, topics='t1', schema='tuple<blob data, rstring topic>', topic_attribute_name='topic', backend='python')
+        stream = topo.source(src)
+        self.assertEqual(str(stream.oport.schema), 'tuple<blob data, rstring topic>')
+        self.assertEqual(src._op._style, 'struct')
+        self.assertTrue(src._op._data_as_blob)
+
+        sink = MQTTSink(server_uri=self.broker.server_uri, topic_attribute_name='topic', qos=1, backend='python')
+        stream.for_each(sink)
+        self.assertEqual(sink._op._qos, 1)
+        self.assertEqual(sink._op._topic_attribute_name, 'topic')
+
+        with self.assertRaises(ValueError):
+            sink.backend = 'rust'
+        sink = MQTTSink(server_uri=self.broker.server_uri, topic='t1', backend='python', truststore='/ts.jks', truststore_password='p')
+        self.assertRaises(ValueError, stream.for_each, sink)
+
+    def _roundtrip(self, qos):
+        src = MQTTSource(server_uri=self.broker.server_uri, topics='dev/+/temp', schema='tuple<rstring data, rstring topic>', topic_attribute_name='topic', qos=qos, backend='python')
+        Topology().source(src)
+        sink = MQTTSink(server_uri=self.broker.server_uri, topic_attribute_name='topic', data_attribute_name='data', qos=qos, backend='python')
+        Topology().source(['x']).map(schema='tuple<rstring data, rstring topic>').for_each(sink)
+        receiver = src._op
+        publisher = sink._op
+        receiver.__enter__()
+        publisher.__enter__()
+        for i in range(200):
+            publisher({'data': str(i), 'topic': 'dev/' + str(i % 3) + '/temp'})
+        publisher.__exit__(None, None, None)
+        messages = receiver()
+        received = [next(messages) for _ in range(200)]
+        receiver.__exit__(None, None, None)
+        self.assertListEqual([m['data'] for m in received], [str(i) for i in range(200)])
+        self.assertEqual(received[4]['topic'], 'dev/1/temp')
+
+    def test_roundtrip_qos0(self):
+        self._roundtrip(0)
+
+    def test_roundtrip_qos1(self):
+        self._roundtrip(1)
+
+    def test_roundtrip_qos2(self):
+        self._roundtrip(2)
+
+    def test_payload_format(self):
+        src = MQTTSource(server_uri=self.broker.server_uri, topics='telemetry', schema=CommonSchema.Json, backend='python')
+        Topology().source(src)
+        sink = MQTTSink(server_uri=self.broker.server_uri, topic='telemetry', payload_format='json', fields=['ts', 'value'], backend='python')
+        Topology().source([('s1', 1, 2.5)]).map(schema='tuple<rstring id, int64 ts, float64 value>').for_each(sink)
+        receiver = src._op
+        publisher = sink._op
+        receiver.__enter__()
+        publisher.__enter__()
+        publisher({'id': 's1', 'ts': 1, 'value': 2.5})
+        publisher.__exit__(None, None, None)
+        message = next(receiver())
+        receiver.__exit__(None, None, None)
+        self.assertDictEqual(message, {'ts': 1, 'value': 2.5})
+
+    def test_source_payload_format(self):
+        schema = 'tuple<rstring id, float64 value, rstring topic>'
+        src = MQTTSource(server_uri=self.broker.server_uri, topics='readings', schema=schema, topic_attribute_name='topic',
+                         payload_format='json', field_map={'value': 'reading.value'}, backend='python')
+        Topology().source(src)
+        sink = MQTTSink(server_uri=self.broker.server_uri, topic='readings', backend='python')
+        Topology().source(['x']).as_string().for_each(sink)
+        receiver = src._op
+        publisher = sink._op
+        receiver.__enter__()
+        publisher.__enter__()
+        publisher('{"id": "s1", "reading": {"value": 2.5}}')
+        publisher('{"id": ')
+        publisher('{"id": "s2"}')
+        publisher.__exit__(None, None, None)
+        messages = receiver()
+        received = [next(messages), next(messages)]
+        receiver.__exit__(None, None, None)
+        self.assertListEqual(received, [{'id': 's1', 'value': 2.5, 'topic': 'readings'},
+                                        {'id': 's2', 'value': 0.0, 'topic': 'readings'}])
+        self.assertEqual(receiver.malformed, 1)
+
+    def test_chunking(self):
+        src = MQTTSource(server_uri=self.broker.server_uri, topics='images', schema=CommonSchema.Binary, reassemble=True, backend='python')
+        received = Topology().source(src)
+        sink = MQTTSink(server_uri=self.broker.server_uri, topic='images', max_message_bytes=100, backend='python')
+        stream = Topology().source([b'x']).map(lambda x: x, schema=CommonSchema.Binary)
+        stream.for_each(sink)
+        receiver = src._op
+        publisher = sink._op
+        # the chunks are created in front of the sink and reassembled behind the source
+        encode = [op.function for op in stream.topology.graph.operators if isinstance(op.function, _Encode)][0]
+        decode = [op.function for op in received.topology.graph.operators if isinstance(op.function, _Decode)][0]
+        payloads = [os.urandom(250), b'small']
+        receiver.__enter__()
+        publisher.__enter__()
+        for payload in payloads:
+            for message in encode(payload):
+                publisher(message)
+        publisher.__exit__(None, None, None)
+        messages = receiver()
+        chunks = [next(messages) for _ in range(5)]
+        receiver.__exit__(None, None, None)
+        self.assertTrue(all(len(c['data']) <= 100 for c in chunks))
+        self.assertListEqual([t for c in chunks for t in decode(c)], payloads)
+
+    def test_rate_limit(self):
+        src = MQTTSource(server_uri=self.broker.server_uri, topics='telemetry', schema=CommonSchema.String, backend='python')
+        Topology().source(src)
+        sink = MQTTSink(server_uri=self.broker.server_uri, topic='telemetry', max_rate=20, burst=2, backend='python')
+        stream = Topology().source(['x']).as_string()
+        stream.for_each(sink)
+        rate_limit = [op.function for op in stream.topology.graph.operators if isinstance(op.function, _RateLimit)][0]
+        receiver = src._op
+        publisher = sink._op
+        receiver.__enter__()
+        publisher.__enter__()
+        start = time.monotonic()
+        for i in range(6):
+            if rate_limit(str(i)):
+                publisher(str(i))
+        elapsed = time.monotonic() - start
+        publisher.__exit__(None, None, None)
+        messages = receiver()
+        received = [next(messages) for _ in range(6)]
+        receiver.__exit__(None, None, None)
+        self.assertListEqual(received, [str(i) for i in range(6)])
+        self.assertEqual(rate_limit.delayed, 4)
+        self.assertGreaterEqual(elapsed, 0.19)
+
+    def test_qos_attribute_name(self):
+        src = MQTTSource(server_uri=self.broker.server_uri, topics='t', schema=CommonSchema.String, qos=2, backend='python')
+        Topology().source(src)
+        sink = MQTTSink(server_uri=self.broker.server_uri, topic='t', data_attribute_name='data', qos_attribute_name='qos', backend='python')
+        Topology().source(['x']).map(schema='tuple<rstring data, int32 qos>').for_each(sink)
+        receiver = src._op
+        publisher = sink._op
+        receiver.__enter__()
+        publisher.__enter__()
+        for i in range(30):
+            publisher({'data': str(i), 'qos': i % 3})
+        publisher.__exit__(None, None, None)
+        messages = receiver()
+        received = [next(messages) for _ in range(30)]
+        receiver.__exit__(None, None, None)
+        self.assertListEqual(sorted(received, key=int), [str(i) for i in range(30)])
+
+    def test_congestion_policy(self):
+        src = MQTTSource(server_uri=self.broker.server_uri, topics='t', schema=CommonSchema.String, backend='python')
+        Topology().source(src)
+        sink = MQTTSink(server_uri=self.broker.server_uri, topic='t', qos=1, queue_size=10, congestion_policy='wait', backend='python')
+        Topology().source(['x']).as_string().for_each(sink)
+        receiver = src._op
+        publisher = sink._op
+        receiver.__enter__()
+        publisher.__enter__()
+        for i in range(100):
+            publisher(str(i))
+        # the queued messages are published on exit
+        publisher.__exit__(None, None, None)
+        messages = receiver()
+        received = [next(messages) for _ in range(100)]
+        receiver.__exit__(None, None, None)
+        self.assertListEqual(received, [str(i) for i in range(100)])
+        self.assertEqual(publisher.dropped, 0)
+
+    def test_coalesce_subscriptions(self):
+        topo = Topology()
+        coalesce_subscriptions(topo)
+        s1 = MQTTSource(server_uri=self.broker.server_uri, topics='plant/+/temp', schema=CommonSchema.String, backend='python')
+        s2 = MQTTSource(server_uri=self.broker.server_uri, topics='plant/#', schema=CommonSchema.String, backend='python')
+        topo.source(s1)
+        topo.source(s2)
+        # each source has its own operator, the sources of a process share the connection
+        self.assertIsNot(s1._op, s2._op)
+        s1._op.__enter__()
+        s2._op.__enter__()
+        self.assertIs(s1._op._shared, s2._op._shared)
+        self.assertListEqual(s1._op._shared._subscribed, ['plant/#'])
+        sink = MQTTSink(server_uri=self.broker.server_uri, topic_attribute_name='topic', data_attribute_name='data', qos=1, backend='python')
+        Topology().source(['x']).map(schema='tuple<rstring data, rstring topic>').for_each(sink)
+        publisher = sink._op
+        publisher.__enter__()
+        publisher({'data': 'a', 'topic': 'plant/1/temp'})
+        publisher({'data': 'b', 'topic': 'plant/1/humidity'})
+        publisher.__exit__(None, None, None)
+        messages = s2._op()
+        self.assertListEqual([next(messages) for _ in range(2)], ['a', 'b'])
+        s2._op.__exit__(None, None, None)
+        # the last source subscribes to its own filter only
+        self.assertListEqual(s1._op._shared._subscribed, ['plant/+/temp'])
+        messages = s1._op()
+        self.assertEqual(next(messages), 'a')
+        self.assertTrue(s1._op._queue.empty())
+        s1._op.__exit__(None, None, None)
+        self.assertFalse(s1._op._shared._loop._thread.is_alive())
+
+    def test_benchmark_suite(self):
+        results = benchmark_suite.run(20, [1], [16], [5], [None, 10], timeout=10.0)
+        self.assertEqual(len(results['results']), 2)
+        for result in results['results']:
+            self.assertTrue(result['completed'])
+            self.assertEqual(result['received'], 20)
+            self.assertLessEqual(result['latency_p50_ms'], result['latency_p99_ms'])
+        self.assertEqual(results['results'][1]['messages'], 2)
+        self.assertListEqual(benchmark_suite.compare(results, results), [])
+        slower = json.loads(json.dumps(results))
+        slower['results'][0]['tuples_per_second'] /= 2
+        self.assertListEqual([r['metric'] for r in benchmark_suite.compare(results, slower)], ['tuples_per_second'])
+        self.assertEqual(benchmark_suite._percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(benchmark_suite._percentile(list(range(100)), 99), 98)
+
+    def _overflow(self, policy):
+        receiver = _EngineSource({'server_uri': self.broker.server_uri}, 'string', ['overflow'], qos=1,
+                                 message_queue_size=5, overflow_policy=policy)
+        publisher = _EngineSink({'server_uri': self.broker.server_uri}, 'string', topic='overflow', qos=1)
+        receiver.__enter__()
+        publisher.__enter__()
+        for i in range(20):
+            publisher(str(i))
+        publisher.__exit__(None, None, None)
+        for _ in range(100):
+            if receiver.dropped == 15:
+                break
+            time.sleep(0.05)
+        messages = receiver()
+        received = [next(messages) for _ in range(5)]
+        receiver.__exit__(None, None, None)
+        self.assertEqual(receiver.dropped, 15)
+        self.assertEqual(receiver.max_queued, 5)
+        return received
+
+    def test_overflow_policy(self):
+        self.assertListEqual(self._overflow('drop_oldest'), [str(i) for i in range(15, 20)])
+        self.assertListEqual(self._overflow('drop_newest'), [str(i) for i in range(5)])
+
+    def test_broker_outage(self):
+        options = {'reconnect_delay_millis': 50, 'reconnect_max_delay_millis': 400, 'reconnect_jitter': 0.5, 'backend': 'python'}
+        src = MQTTSource(server_uri=self.broker.server_uri, topics='outage', schema=CommonSchema.String, qos=1, clean_session=False, **options)
+        Topology('OutageApp').source(src)
+        receiver = src._op
+        sinks = []
+        for i in range(10):
+            sink = MQTTSink(server_uri=self.broker.server_uri, topic='other', **options)
+            Topology().source(['x']).as_string().for_each(sink)
+            sinks.append(sink._op)
+        receiver.__enter__()
+        for sink in sinks:
+            sink.__enter__()
+        self.assertEqual(self.broker.subscribes, 1)
+        connects = len(self.broker.connect_times)
+        self.broker.outage(0.3).result()
+        for _ in range(100):
+            if len(self.broker.connect_times) >= connects + 11:
+                break
+            time.sleep(0.05)
+        reconnects = sorted(self.broker.connect_times[connects:])
+        self.assertEqual(len(reconnects), 11)
+        # the jitter spreads the reconnects
+        self.assertGreater(reconnects[-1] - reconnects[0], 0.02)
+        # the persistent session kept the subscription
+        self.assertEqual(self.broker.subscribes, 1)
+        for sink in sinks:
+            sink.__exit__(None, None, None)
+
+        # the server queues the messages for the disconnected client
+        receiver.__exit__(None, None, None)
+        publisher = _EngineSink({'server_uri': self.broker.server_uri}, 'string', topic='outage', qos=1)
+        publisher.__enter__()
+        for i in range(3):
+            publisher(str(i))
+        publisher.__exit__(None, None, None)
+        receiver = _EngineSource(receiver._params, 'string', ['outage'], qos=1)
+        receiver.__enter__()
+        messages = receiver()
+        received = [next(messages) for _ in range(3)]
+        receiver.__exit__(None, None, None)
+        self.assertListEqual(received, ['0', '1', '2'])
+
+    @unittest.skipUnless(shutil.which('openssl'), 'openssl is required to create the server certificate')
+    def test_tls_session_resumption(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cert = os.path.join(directory, 'cert.pem')
+            key = os.path.join(directory, 'key.pem')
+            call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=127.0.0.1',
+                  '-addext', 'subjectAltName=IP:127.0.0.1', '-keyout', key, '-out', cert], stdout=PIPE, stderr=PIPE)
+            server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            server_context.load_cert_chain(cert, key)
+            broker = StandInBroker(ssl_context=server_context).start()
+            try:
+                for protocol in ['TLSv1.2', 'TLSv1.3']:
+                    sink = MQTTSink(server_uri=broker.server_uri, topic='t', trusted_certs=cert, ssl_protocols=[protocol],
+                                    ssl_debug='handshake', backend='python')
+                    Topology().source(['x']).as_string().for_each(sink)
+                    publisher = sink._op
+                    with self.assertLogs('streamsx.mqtt._engine', level='INFO') as logs:
+                        publisher.__enter__()
+                        self.assertFalse(publisher._client.session_reused)
+                        connects = broker.connects
+                        broker.drop_connections()
+                        for _ in range(100):
+                            if broker.connects > connects and publisher._client.connected:
+                                break
+                            time.sleep(0.05)
+                        self.assertTrue(publisher._client.session_reused)
+                        publisher('x')
+                        publisher.__exit__(None, None, None)
+                    self.assertIn(protocol, logs.output[0])
+                    self.assertIn('session reused: True', logs.output[-1])
+                sink = MQTTSink(server_uri=broker.server_uri, topic='t', trusted_certs=cert, ssl_session_reuse=False, backend='python')
+                Topology().source(['x']).as_string().for_each(sink)
+                publisher = sink._op
+                publisher.__enter__()
+                broker.drop_connections()
+                time.sleep(0.3)
+                self.assertTrue(publisher._client.connected)
+                self.assertFalse(publisher._client.session_reused)
+                publisher.__exit__(None, None, None)
+            finally:
+                broker.stop()
+
+    def test_malformed_payloads(self):
+        publisher = _EngineSink({'server_uri': self.broker.server_uri}, 'binary', topic='malformed', qos=1)
+        receivers = [_EngineSource({'server_uri': self.broker.server_uri}, style, ['malformed'], qos=1) for style in ['string', 'json']]
+        for receiver in receivers:
+            receiver.__enter__()
+        publisher.__enter__()
+        for payload in [b'\xff\xfe', b'{"a": ', b'"ok"']:
+            publisher(payload)
+        publisher.__exit__(None, None, None)
+        received = []
+        for receiver, count in zip(receivers, [2, 1]):
+            messages = receiver()
+            received.extend(next(messages) for _ in range(count))
+            receiver.__exit__(None, None, None)
+        self.assertListEqual(received, ['{"a": ', '"ok"', 'ok'])
+        self.assertListEqual([receiver.malformed for receiver in receivers], [1, 2])
+
+    def test_malformed_packet(self):
+        from streamsx.mqtt._engine import _MqttClient
+        async def read(data):
+            client = _MqttClient('127.0.0.1', 1883, 'c1')
+            client._reader = asyncio.StreamReader()
+            client._reader.feed_data(data)
+            client._closed = asyncio.get_running_loop().create_future()
+            await client._read_loop()
+            return client._closed.result()
+        # PUBACK with a truncated packet id
+        self.assertIsInstance(asyncio.run(read(bytes([0x40, 0x01, 0x00]))), ConnectionError)
+
+    def test_reconnection_bound_exhausted(self):
+        for queue_size in [None, 10]:
+            broker = StandInBroker().start()
+            sink = MQTTSink(server_uri=broker.server_uri, topic='t1', reconnection_bound=1, reconnect_delay_millis=10,
+                            queue_size=queue_size, backend='python')
+            Topology().source(['x']).as_string().for_each(sink)
+            publisher = sink._op
+            publisher.__enter__()
+            publisher('a')
+            broker.stop()
+            for _ in range(100):
+                if publisher.failure is not None:
+                    break
+                time.sleep(0.05)
+            self.assertIsNotNone(publisher.failure)
+            with self.assertRaises(ConnectionError):
+                for _ in range(20):
+                    publisher('b')
+            publisher.__exit__(None, None, None)
+        broker = StandInBroker().start()
+        src = MQTTSource(server_uri=broker.server_uri, topics='t1', schema=CommonSchema.String, reconnection_bound=1,
+                         reconnect_delay_millis=10, backend='python')
+        Topology().source(src)
+        receiver = src._op
+        receiver.__enter__()
+        messages = receiver()
+        broker.stop()
+        with self.assertRaises(ConnectionError):
+            next(messages)
+        self.assertIsNotNone(receiver.failure)
+        receiver.__exit__(None, None, None)
+
+    def test_keep_alive_timeout(self):
+        from streamsx.mqtt._engine import _MqttClient
+        async def silent_server(reader, writer):
+            # accepts the connection, but answers no PINGREQ
+            await reader.read(1024)
+            writer.write(bytes([0x20, 0x02, 0x00, 0x00]))
+            while await reader.read(1024):
+                pass
+        async def connect():
+            server = await asyncio.start_server(silent_server, '127.0.0.1', 0)
+            client = _MqttClient('127.0.0.1', server.sockets[0].getsockname()[1], 'c1', keep_alive_seconds=1)
+            await client.connect()
+            start = asyncio.get_running_loop().time()
+            await asyncio.wait_for(client.wait_closed(), 10)
+            server.close()
+            return client._closed.result(), asyncio.get_running_loop().time() - start
+        error, seconds = asyncio.run(connect())
+        self.assertIsInstance(error, TimeoutError)
+        self.assertGreaterEqual(seconds, 2.4)
+
+    def test_connect_failure(self):
+        sink = MQTTSink(server_uri='tcp://127.0.0.1:1', topic='t1', reconnection_bound=0, backend='python')
+        Topology().source(['x']).as_string().for_each(sink)
+        self.assertRaises(OSError, sink._op.__enter__)
+
+
 class Test(unittest.TestCase):
 
     @classmethod